@@ -0,0 +1,28 @@
+"""Added backfilled_to to fx_tracking_pairs
+
+Revision ID: 4c7d2a9e61f3
+Revises: b076c1f9e2b2
+Create Date: 2026-10-18 16:20:41.512093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7d2a9e61f3'
+down_revision: Union[str, None] = 'b076c1f9e2b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('fx_tracking_pairs', sa.Column('backfilled_to', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('fx_tracking_pairs', 'backfilled_to')
@@ -0,0 +1,35 @@
+"""Added fx_filled_rates
+
+Revision ID: 7a2c94e05b1d
+Revises: d51f08a3b7e4
+Create Date: 2026-10-18 20:26:09.471822
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2c94e05b1d'
+down_revision: Union[str, None] = 'd51f08a3b7e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fx_filled_rates',
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('currency_code_from', sa.String(length=3), nullable=False),
+    sa.Column('currency_code_to', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('filled', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('currency_code_from', 'currency_code_to', 'date', name='fx_filled_rates_unique_idx')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fx_filled_rates')
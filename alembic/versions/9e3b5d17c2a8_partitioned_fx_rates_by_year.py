@@ -0,0 +1,114 @@
+"""Partitioned fx_rates by year
+
+Revision ID: 9e3b5d17c2a8
+Revises: 4c7d2a9e61f3
+Create Date: 2026-10-18 18:02:37.284105
+
+Creates `fx_rates_partitioned`, which is range-partitioned by year, has a pair-leading primary key
+including `rate` and a BRIN index on `date`. A trigger mirrors writes of `fx_rates` into it.
+An empty `fx_rates` is replaced at once, otherwise rates are copied and the tables are swapped online
+with `python -m src.fx.partition_migration`.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3b5d17c2a8'
+down_revision: Union[str, None] = '4c7d2a9e61f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE fx_rates_partitioned (
+    date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    currency_code_from VARCHAR(3) NOT NULL,
+    currency_code_to VARCHAR(3) NOT NULL,
+    rate NUMERIC(38, 10) NOT NULL,
+    CONSTRAINT fx_rates_partitioned_unique_idx PRIMARY KEY (currency_code_from, currency_code_to, date) INCLUDE (rate)
+) PARTITION BY RANGE (date)
+"""
+
+# Partitions cover existing rates and the next year, writers create further ones on demand
+_CREATE_PARTITIONS_SQL = """
+DO $$
+DECLARE
+    this_year int := extract(year FROM now())::int;
+    first_year int := coalesce(extract(year FROM (SELECT min(date) FROM fx_rates))::int, this_year);
+    last_year int := greatest(extract(year FROM (SELECT max(date) FROM fx_rates))::int, this_year + 1);
+BEGIN
+    FOR y IN first_year..last_year LOOP
+        EXECUTE format('CREATE TABLE fx_rates_y%s PARTITION OF fx_rates_partitioned FOR VALUES FROM (%L) TO (%L)',
+                       y, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+    END LOOP;
+END $$
+"""
+
+_CREATE_MIRROR_SQL = """
+CREATE FUNCTION fx_rates_mirror() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM fx_rates_partitioned
+        WHERE currency_code_from = OLD.currency_code_from
+          AND currency_code_to = OLD.currency_code_to
+          AND date = OLD.date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO fx_rates_partitioned (date, currency_code_from, currency_code_to, rate)
+        VALUES (NEW.date, NEW.currency_code_from, NEW.currency_code_to, NEW.rate)
+        ON CONFLICT (currency_code_from, currency_code_to, date) DO UPDATE SET rate = EXCLUDED.rate;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql
+"""
+
+_SWAP_SQL = [
+    'DROP TRIGGER fx_rates_mirror_trigger ON fx_rates',
+    'DROP FUNCTION fx_rates_mirror()',
+    'DROP TABLE fx_rates',
+    'ALTER TABLE fx_rates_partitioned RENAME TO fx_rates',
+    'ALTER TABLE fx_rates RENAME CONSTRAINT fx_rates_partitioned_unique_idx TO fx_rates_unique_idx',
+    'ALTER INDEX fx_rates_partitioned_date_brin_idx RENAME TO fx_rates_date_brin_idx',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(_CREATE_TABLE_SQL)
+    op.execute('CREATE INDEX fx_rates_partitioned_date_brin_idx ON fx_rates_partitioned USING brin (date)')
+    op.execute(_CREATE_PARTITIONS_SQL)
+    op.execute(_CREATE_MIRROR_SQL)
+    op.execute('CREATE TRIGGER fx_rates_mirror_trigger AFTER INSERT OR UPDATE OR DELETE ON fx_rates '
+               'FOR EACH ROW EXECUTE FUNCTION fx_rates_mirror()')
+    if not op.get_bind().execute(sa.text('SELECT EXISTS (SELECT 1 FROM fx_rates)')).scalar():
+        for sql in _SWAP_SQL:
+            op.execute(sql)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    swapped = bind.execute(sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                   "WHERE partrelid = 'fx_rates'::regclass)")).scalar()
+    if not swapped:
+        op.execute('DROP TRIGGER fx_rates_mirror_trigger ON fx_rates')
+        op.execute('DROP FUNCTION fx_rates_mirror()')
+        op.execute('DROP TABLE fx_rates_partitioned')
+        return
+    op.execute('DROP TABLE IF EXISTS fx_rates_legacy')
+    op.execute('ALTER TABLE fx_rates RENAME TO fx_rates_partitioned')
+    op.execute('ALTER TABLE fx_rates_partitioned '
+               'RENAME CONSTRAINT fx_rates_unique_idx TO fx_rates_partitioned_unique_idx')
+    op.create_table('fx_rates',
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('currency_code_from', sa.String(length=3), nullable=False),
+    sa.Column('currency_code_to', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'currency_code_from', 'currency_code_to', name='fx_rates_unique_idx')
+    )
+    op.execute('INSERT INTO fx_rates (date, currency_code_from, currency_code_to, rate) '
+               'SELECT date, currency_code_from, currency_code_to, rate FROM fx_rates_partitioned')
+    op.execute('DROP TABLE fx_rates_partitioned')
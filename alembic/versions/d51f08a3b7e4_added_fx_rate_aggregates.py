@@ -0,0 +1,41 @@
+"""Added fx_rate_aggregates
+
+Revision ID: d51f08a3b7e4
+Revises: 9e3b5d17c2a8
+Create Date: 2026-10-18 19:11:52.630417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd51f08a3b7e4'
+down_revision: Union[str, None] = '9e3b5d17c2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fx_rate_aggregates',
+    sa.Column('currency_code_from', sa.String(length=3), nullable=False),
+    sa.Column('currency_code_to', sa.String(length=3), nullable=False),
+    sa.Column('period', sa.String(length=5), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('open', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('high', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('low', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('close', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('mean', sa.Numeric(precision=38, scale=10), nullable=False),
+    sa.Column('rate_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('currency_code_from', 'currency_code_to', 'period', 'period_start',
+                            name='fx_rate_aggregates_unique_idx')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fx_rate_aggregates')
@@ -0,0 +1,30 @@
+"""Added backfilled_from to fx_tracking_pairs
+
+Revision ID: e83f1c6a2d94
+Revises: 7a2c94e05b1d
+Create Date: 2026-10-18 21:14:52.631470
+
+Checkpoints written before it have no start, so backfills of such pairs aren't resumed once.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e83f1c6a2d94'
+down_revision: Union[str, None] = '7a2c94e05b1d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('fx_tracking_pairs', sa.Column('backfilled_from', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('fx_tracking_pairs', 'backfilled_from')
@@ -0,0 +1,73 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Path in a scenario result and whether a higher value is better
+METRICS = [
+    (('fetch', 'rows_per_second'), True),
+    (('persist', 'rows_per_second'), True),
+    (('api', 'p50_ms'), False),
+    (('api', 'p99_ms'), False),
+    (('peak_rss_mb',), False),
+]
+
+_ScenarioKey = Tuple[str, int, int]
+
+
+def find_regressions(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) \
+        -> List[Tuple[_ScenarioKey, str, float, float, float]]:
+    """
+    Returns (scenario, metric, baseline value, current value, relative change) of metrics,
+    which became worse by more than `threshold`, e.g. 0.1 for 10%
+    """
+    baseline_scenarios = {_key(s): s for s in baseline['scenarios']}
+    regressions = []
+    for scenario in current['scenarios']:
+        previous = baseline_scenarios.get(_key(scenario))
+        if previous is None:
+            continue
+        for path, higher_is_better in METRICS:
+            old, new = _get(previous, path), _get(scenario, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((_key(scenario), '.'.join(path), old, new, change))
+    return regressions
+
+
+def _key(scenario: Dict[str, Any]) -> _ScenarioKey:
+    return scenario['provider'], scenario['pairs'], scenario['rows_per_pair']
+
+
+def _get(scenario: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value = scenario
+    for name in path:
+        if value is None:
+            return None
+        value = value.get(name)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares two benchmark results, exits with 1 on regressions')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative slowdown, 0.1 by default')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = find_regressions(baseline, current, args.threshold)
+    for (provider, pairs, rows), metric, old, new, change in regressions:
+        print(f'{provider} pairs={pairs} rows={rows}: {metric} {old:.2f} -> {new:.2f} ({change:+.1%})')
+    if regressions:
+        sys.exit(1)
+    print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+import httpx
+import polars as pl
+from currency_codes import get_fiat_currencies
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import delete, tuple_
+
+from benchmarks.stub_server import ProviderStub, END_DATE
+from src.config import AlphavantageConfig, DatabaseConfig, PolygonConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.cache import FxRatesCache
+from src.fx.models import FxRate
+from src.fx.rate_store import FxRateStore
+from src.fx.repository import FxRateRepository
+from src.fx.router import router as fx_router
+from src.fx.service import FxRatesService
+from src.fx.source.alphavantage import AlphavantageFiatExchangeRatesSource, PROVIDER as ALPHAVANTAGE
+from src.fx.source.polygon import PolygonFiatExchangeRatesSource, PROVIDER as POLYGON
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROWS = (10, 1000, 20_000)
+DEFAULT_PAIRS = (1, 50, 500)
+PROVIDERS = (POLYGON, ALPHAVANTAGE)
+
+# Length of ranges requested from the API
+_API_RANGE_DAYS = 30
+
+
+@dataclass(frozen=True)
+class Scenario:
+    provider: str
+    pairs: int
+    rows_per_pair: int
+
+
+@dataclass(frozen=True)
+class Options:
+    concurrency: int = 16
+    api_requests: int = 500
+    stream_responses: bool = False
+    database_url: Optional[str] = None
+    seed: int = 0
+
+
+def benchmark_pairs(count: int) -> List[Tuple[str, str]]:
+    codes = sorted({c.code.upper() for c in get_fiat_currencies() if c.code})
+    return list(itertools.islice(itertools.permutations(codes, 2), count))
+
+
+async def run_scenario(scenario: Scenario, options: Options) -> Dict[str, Any]:
+    """
+    Fetches rates of all pairs from the stub, persists them, if the database is set, and queries `/fx/rates`.
+    Without the database the API is served from the rate store.
+    """
+    pairs = benchmark_pairs(scenario.pairs)
+    stub = ProviderStub(scenario.rows_per_pair, options.seed)
+    await stub.start()
+    try:
+        async with aiohttp.ClientSession() as client_session:
+            fetch, rates = await _fetch(scenario, options, stub, client_session, pairs)
+    finally:
+        await stub.stop()
+
+    engine = create_db_engine(DatabaseConfig(options.database_url)) if options.database_url else None
+    try:
+        if engine is not None:
+            repository = FxRateRepository(create_session_factory(engine))
+            persist = await _persist(engine, repository, rates, pairs, options)
+            service = FxRatesService(repository, FxRatesCache(1))
+        else:
+            persist = None
+            rate_store = FxRateStore()
+            rate_store.load(rates)
+            service = FxRatesService(None, FxRatesCache(1), rate_store=rate_store)
+        api = await _query_api(service, pairs, stub.first_date, options)
+    finally:
+        if engine is not None:
+            await engine.dispose()
+    return {
+        **asdict(scenario),
+        'fetch': fetch,
+        'persist': persist,
+        'api': api,
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+
+async def _fetch(scenario: Scenario,
+                 options: Options,
+                 stub: ProviderStub,
+                 client_session,
+                 pairs: Sequence[Tuple[str, str]]) -> Tuple[Dict[str, Any], pl.DataFrame]:
+    if scenario.provider == POLYGON:
+        source = PolygonFiatExchangeRatesSource(PolygonConfig(stub.polygon_url_pattern, 'benchmark', True,
+                                                              stream_responses=options.stream_responses),
+                                                client_session)
+    else:
+        source = AlphavantageFiatExchangeRatesSource(AlphavantageConfig(stub.alphavantage_url_pattern, '',
+                                                                        'benchmark',
+                                                                        stream_responses=options.stream_responses),
+                                                     client_session)
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def fetch_pair(currency_code_from: str, currency_code_to: str) -> pl.DataFrame:
+        async with semaphore:
+            lf = await source.get_exchange_rates(currency_code_from, currency_code_to, stub.first_date, END_DATE)
+            return await lf.collect_async()
+
+    parse_seconds_before = _parse_seconds(scenario.provider)
+    started_at = time.perf_counter()
+    frames = await asyncio.gather(*(fetch_pair(f, t) for f, t in pairs))
+    seconds = time.perf_counter() - started_at
+    rates = pl.concat(frames)
+    return {
+        'seconds': seconds,
+        'rows': rates.height,
+        'rows_per_second': rates.height / seconds,
+        'requests': stub.requests,
+        # Streamed payloads are parsed while they're received, so their parse time is a part of fetch time only
+        'parse_seconds': _parse_seconds(scenario.provider) - parse_seconds_before
+    }, rates
+
+
+async def _persist(engine,
+                   repository: FxRateRepository,
+                   rates: pl.DataFrame,
+                   pairs: Sequence[Tuple[str, str]],
+                   options: Options) -> Dict[str, Any]:
+    # Rates of benchmark pairs are removed, so every run inserts the same rows
+    async with engine.begin() as connection:
+        await connection.execute(delete(FxRate).where(tuple_(FxRate.currency_code_from,
+                                                             FxRate.currency_code_to).in_(pairs)))
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def save_pair(df: pl.DataFrame):
+        async with semaphore:
+            return await repository.save_rates(df)
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(save_pair(df) for df in rates.partition_by(['currencyCodeFrom',
+                                                                                 'currencyCodeTo'])))
+    seconds = time.perf_counter() - started_at
+    return {
+        'seconds': seconds,
+        'rows_per_second': rates.height / seconds,
+        'inserted': sum(r.inserted for r in results),
+        'updated': sum(r.updated for r in results)
+    }
+
+
+async def _query_api(service: FxRatesService,
+                     pairs: Sequence[Tuple[str, str]],
+                     first_date,
+                     options: Options) -> Dict[str, Any]:
+    """
+    Requests random ranges of random pairs one by one. Cache of the service keeps one range,
+    so nearly every request is served by the rate store or by the database.
+    """
+    app = FastAPI()
+    app.include_router(fx_router)
+    app.state.fx_rates_service = service
+    rnd = random.Random(options.seed)
+    history_days = (END_DATE - first_date).days
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark') as client:
+        for _ in range(options.api_requests):
+            currency_code_from, currency_code_to = rnd.choice(pairs)
+            from_date = first_date + timedelta(days=rnd.randint(0, history_days))
+            params = {
+                'currency_code_from': currency_code_from,
+                'currency_code_to': currency_code_to,
+                'from_date': from_date.isoformat(),
+                'to_date': min(END_DATE, from_date + timedelta(days=_API_RANGE_DAYS - 1)).isoformat()
+            }
+            started_at = time.perf_counter()
+            response = await client.get('/fx/rates', params=params)
+            latencies.append(time.perf_counter() - started_at)
+            response.raise_for_status()
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000
+    }
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    # Nearest-rank percentile
+    idx = max(0, min(len(sorted_values) - 1, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[idx]
+
+
+def _parse_seconds(provider: str) -> float:
+    return REGISTRY.get_sample_value('fx_parse_duration_seconds_sum', {'provider': provider}) or 0.0
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _run_isolated(scenario: Scenario, options: Options) -> Dict[str, Any]:
+    return asyncio.run(run_scenario(scenario, options))
+
+
+def run_scenarios(scenarios: Sequence[Scenario], options: Options, isolated: bool = True) -> List[Dict[str, Any]]:
+    """
+    Every scenario runs in a fresh process, so its peak RSS isn't inflated by previous ones
+    """
+    results = []
+    for scenario in scenarios:
+        logger.info('Running %s', scenario)
+        if isolated:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(_run_isolated, scenario, options).result()
+        else:
+            result = _run_isolated(scenario, options)
+        logger.info('%s: %.0f rows/s fetched, API p50 %.2fms, p99 %.2fms, peak RSS %.0fMB', scenario,
+                    result['fetch']['rows_per_second'], result['api']['p50_ms'], result['api']['p99_ms'],
+                    result['peak_rss_mb'])
+        results.append(result)
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def _positive_ints(value: str) -> List[int]:
+    values = [int(v) for v in value.split(',')]
+    if any(v <= 0 for v in values):
+        raise argparse.ArgumentTypeError('Values must be positive')
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks fetch, parse, persist and API throughput '
+                                                 'against a local provider stub')
+    parser.add_argument('--provider', choices=PROVIDERS, action='append', help='May be repeated, all by default')
+    parser.add_argument('--rows', type=_positive_ints, default=list(DEFAULT_ROWS),
+                        help='Comma-separated rows per pair, e.g. 10,1000,20000')
+    parser.add_argument('--pairs', type=_positive_ints, default=list(DEFAULT_PAIRS),
+                        help='Comma-separated numbers of pairs, e.g. 1,50,500')
+    parser.add_argument('--concurrency', type=int, default=Options.concurrency)
+    parser.add_argument('--api-requests', type=int, default=Options.api_requests)
+    parser.add_argument('--stream-responses', action='store_true')
+    parser.add_argument('--database-url', help='Scratch database, rates of benchmark pairs are deleted there')
+    parser.add_argument('--seed', type=int, default=Options.seed)
+    parser.add_argument('--output', help='Result file, benchmarks/results/<commit>.json by default')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    options = Options(args.concurrency, args.api_requests, args.stream_responses, args.database_url, args.seed)
+    scenarios = [Scenario(provider, pairs, rows)
+                 for provider in (args.provider or PROVIDERS) for pairs in args.pairs for rows in args.rows]
+    env = environment()
+    results = run_scenarios(scenarios, options)
+    output = args.output or os.path.join('benchmarks', 'results', f"{env['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        # Database URL may contain credentials, only the fact of persisting is saved
+        json.dump({'environment': env,
+                   'options': {**asdict(options), 'database_url': None, 'persist': options.database_url is not None},
+                   'scenarios': results}, f, indent=2)
+    logger.info('Results are saved into %s', output)
+
+
+if __name__ == '__main__':
+    main()
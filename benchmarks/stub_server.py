@@ -0,0 +1,102 @@
+import json
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Tuple
+
+from aiohttp import web
+
+# The last day of synthetic history, fixed so payloads don't depend on the day of the run
+END_DATE = date(2024, 12, 31)
+
+
+class ProviderStub:
+    """
+    Serves synthetic Polygon aggregates and Alphavantage FX_DAILY payloads from the local event loop.
+    Alphavantage returns `rows_per_pair` days ending at END_DATE, Polygon returns a day per every day
+    of the requested window. Bodies are generated once per window with a seeded random walk,
+    so the server spends time on sending bytes, not on building them.
+    """
+
+    def __init__(self, rows_per_pair: int, seed: int = 0):
+        self._rows_per_pair = rows_per_pair
+        self._seed = seed
+        self._polygon_bodies: Dict[Tuple[str, str], bytes] = {}
+        self._alphavantage_body = None
+        self._runner = None
+        self._base_url = None
+        self.requests = 0
+
+    @property
+    def first_date(self) -> date:
+        return END_DATE - timedelta(days=self._rows_per_pair - 1)
+
+    @property
+    def polygon_url_pattern(self) -> str:
+        return self._base_url + '/v2/aggs/ticker/{ticker}/range/1/day/{from_dt}/{to_dt}?apiKey={api_key}'
+
+    @property
+    def alphavantage_url_pattern(self) -> str:
+        return (self._base_url + '/query?function=FX_DAILY&from_symbol={curr_from}&to_symbol={curr_to}'
+                                 '&apikey={key}&outputsize={output_size}')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/v2/aggs/ticker/{ticker}/range/1/day/{from_dt}/{to_dt}', self._polygon)
+        app.router.add_get('/query', self._alphavantage)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self._base_url = f'http://127.0.0.1:{port}'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _polygon(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        window = (request.match_info['from_dt'], request.match_info['to_dt'])
+        body = self._polygon_bodies.get(window)
+        if body is None:
+            body = self._polygon_bodies[window] = self._build_polygon_body(*window)
+        return web.Response(body=body, content_type='application/json')
+
+    async def _alphavantage(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self._alphavantage_body is None:
+            self._alphavantage_body = self._build_alphavantage_body()
+        return web.Response(body=self._alphavantage_body, content_type='application/json')
+
+    def _build_polygon_body(self, from_dt: str, to_dt: str) -> bytes:
+        days = _days(max(date.fromisoformat(from_dt), self.first_date), min(date.fromisoformat(to_dt), END_DATE))
+        closes = _random_walk(len(days), self._seed)
+        results = [{'v': 100, 'vw': close, 'o': close, 'c': close, 'h': close, 'l': close,
+                    't': int(datetime.combine(day, time.min, timezone.utc).timestamp() * 1000), 'n': 1}
+                   for day, close in zip(days, closes)]
+        return json.dumps({'queryCount': len(results), 'resultsCount': len(results), 'adjusted': True,
+                           'results': results, 'status': 'OK', 'request_id': 'benchmark',
+                           'count': len(results)}).encode()
+
+    def _build_alphavantage_body(self) -> bytes:
+        days = _days(self.first_date, END_DATE)
+        closes = _random_walk(len(days), self._seed)
+        # Alphavantage lists the latest day first
+        time_series = {day.isoformat(): {'1. open': '%.5f' % close, '2. high': '%.5f' % close,
+                                         '3. low': '%.5f' % close, '4. close': '%.5f' % close}
+                       for day, close in zip(reversed(days), reversed(closes))}
+        return json.dumps({'Meta Data': {'1. Information': 'Forex Daily Prices (open, high, low, close)'},
+                           'Time Series FX (Daily)': time_series}).encode()
+
+
+def _days(from_date: date, to_date: date):
+    return [from_date + timedelta(days=i) for i in range((to_date - from_date).days + 1)]
+
+
+def _random_walk(size: int, seed: int):
+    rnd = random.Random(seed)
+    value, values = 1.0, []
+    for _ in range(size):
+        value = max(0.0001, value * (1 + rnd.gauss(0, 0.005)))
+        values.append(round(value, 5))
+    return values
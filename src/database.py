@@ -0,0 +1,36 @@
+from sqlalchemy import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, async_sessionmaker, AsyncSession
+
+from src.config import DatabaseConfig
+
+_ASYNC_DRIVER = 'postgresql+asyncpg'
+
+
+def to_async_url(url: str) -> URL:
+    """
+    The same URL is shared with alembic, which uses psycopg2, so the driver is replaced here
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'postgresql':
+        return parsed.set(drivername=_ASYNC_DRIVER)
+    return parsed
+
+
+def to_asyncpg_dsn(url: str) -> str:
+    """
+    DSN for connections opened with asyncpg directly, e.g. ones waiting for notifications
+    """
+    return make_url(url).set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+def create_db_engine(config: DatabaseConfig) -> AsyncEngine:
+    return create_async_engine(to_async_url(config.url),
+                               pool_size=config.pool_size,
+                               max_overflow=config.max_overflow,
+                               pool_timeout=config.pool_timeout_seconds,
+                               pool_recycle=config.pool_recycle_seconds,
+                               pool_pre_ping=True)
+
+
+def create_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(engine, expire_on_commit=False)
@@ -0,0 +1,181 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+
+import polars as pl
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.fx.metrics import COLLECT_SECONDS, DB_QUERY_SECONDS
+from src.fx.models import FxRateAggregate
+from src.fx.repository import read_locked_history
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+
+PERIOD_WEEK = 'week'
+PERIOD_MONTH = 'month'
+PERIOD_YEAR = 'year'
+
+# Weeks start on Monday
+PERIODS: Dict[str, str] = {PERIOD_WEEK: '1w', PERIOD_MONTH: '1mo', PERIOD_YEAR: '1y'}
+
+AGGREGATE_SCHEMA = {
+    'periodStart': pl.Date,
+    'currencyCodeFrom': pl.String,
+    'currencyCodeTo': pl.String,
+    'period': pl.String,
+    'open': DECIMAL_MONEY_TYPE,
+    'high': DECIMAL_MONEY_TYPE,
+    'low': DECIMAL_MONEY_TYPE,
+    'close': DECIMAL_MONEY_TYPE,
+    'mean': DECIMAL_MONEY_TYPE,
+    'count': pl.UInt32,
+}
+
+_PAIR_COLUMNS = ['currencyCodeFrom', 'currencyCodeTo']
+
+_UPSERT_BATCH_ROWS = 1000
+
+_AGGREGATE_COLUMNS = (FxRateAggregate.period_start, FxRateAggregate.currency_code_from,
+                      FxRateAggregate.currency_code_to, FxRateAggregate.period, FxRateAggregate.open,
+                      FxRateAggregate.high, FxRateAggregate.low, FxRateAggregate.close, FxRateAggregate.mean,
+                      FxRateAggregate.rate_count)
+
+
+def aggregate_rates(rates: pl.LazyFrame, period: str) -> pl.LazyFrame:
+    """
+    OHLC and mean of every pair per period. Polars can't average decimals, so the mean is the sum
+    divided by the count and truncated to the money scale, as other decimal divisions are.
+    """
+    return (rates.sort(_PAIR_COLUMNS + ['date'])
+            .group_by_dynamic('date', every=PERIODS[period], group_by=_PAIR_COLUMNS)
+            .agg(open=pl.col('rate').first(),
+                 high=pl.col('rate').max(),
+                 low=pl.col('rate').min(),
+                 close=pl.col('rate').last(),
+                 mean=(pl.col('rate').sum() / pl.len().cast(pl.Decimal(38, 0))).cast(DECIMAL_MONEY_TYPE),
+                 count=pl.len())
+            .select(pl.col('date').alias('periodStart'),
+                    *_PAIR_COLUMNS,
+                    pl.lit(period).alias('period'),
+                    'open', 'high', 'low', 'close', 'mean', 'count'))
+
+
+def period_start(day: date, period: str) -> date:
+    return pl.select(pl.lit(day).dt.truncate(PERIODS[period])).item()
+
+
+def affected_range(from_date: date, to_date: date) -> Tuple[date, date]:
+    """
+    Dates of rates, which every period overlapping [from_date, to_date] is computed from.
+    A week may start in the previous year, so bounds of all periods are taken.
+    """
+    bounds = pl.select(
+        start=pl.min_horizontal(pl.lit(from_date).dt.truncate(every) for every in PERIODS.values()),
+        end=pl.max_horizontal(pl.lit(to_date).dt.truncate(every).dt.offset_by(every) for every in PERIODS.values()))
+    return bounds.item(0, 'start'), bounds.item(0, 'end') - timedelta(days=1)
+
+
+def affected_aggregates(history: pl.DataFrame, dates: pl.Series) -> pl.DataFrame:
+    """
+    Aggregates of periods containing `dates`. `history` must contain all rates of the pair in `affected_range`.
+    """
+    frames = [aggregate_rates(history.lazy(), period)
+              .filter(pl.col('periodStart').is_in(dates.dt.truncate(every).unique()))
+              for period, every in PERIODS.items()]
+    with COLLECT_SECONDS.labels(stage='aggregation').time():
+        return pl.concat(frames).collect()
+
+
+async def upsert_aggregates(session: AsyncSession, aggregates: pl.DataFrame):
+    if aggregates.is_empty():
+        return
+    # Every row takes 10 parameters of the 32767 allowed per statement
+    for offset in range(0, aggregates.height, _UPSERT_BATCH_ROWS):
+        await _upsert_batch(session, aggregates.slice(offset, _UPSERT_BATCH_ROWS))
+
+
+async def _upsert_batch(session: AsyncSession, aggregates: pl.DataFrame):
+    values = [{'period_start': datetime.combine(r['periodStart'], time.min),
+               'currency_code_from': r['currencyCodeFrom'],
+               'currency_code_to': r['currencyCodeTo'],
+               'period': r['period'],
+               'open': r['open'],
+               'high': r['high'],
+               'low': r['low'],
+               'close': r['close'],
+               'mean': r['mean'],
+               'rate_count': r['count']}
+              for r in aggregates.iter_rows(named=True)]
+    stmt = insert(FxRateAggregate).values(values)
+    await session.execute(stmt.on_conflict_do_update(
+        constraint='fx_rate_aggregates_unique_idx',
+        set_={column: stmt.excluded[column] for column in ('open', 'high', 'low', 'close', 'mean', 'rate_count')}))
+
+
+class FxRateAggregator:
+    """
+    Recomputes aggregates of the periods, which written rates fall into, from rates of those periods only.
+    Rates are read as `read_locked_history` describes.
+    """
+
+    def __init__(self, rate_repository=None):
+        self._rate_repository = rate_repository
+
+    async def refresh(self, session: AsyncSession, rates: pl.DataFrame):
+        if rates.is_empty():
+            return
+        # Pairs are locked in the same order by every transaction, so they can't deadlock
+        for pair_rates in rates.sort(_PAIR_COLUMNS).partition_by(_PAIR_COLUMNS, maintain_order=True):
+            dates = pair_rates.get_column('date')
+            from_date, to_date = affected_range(dates.min(), dates.max())
+            history = await read_locked_history(session, self._rate_repository, pair_rates, from_date, to_date)
+            await upsert_aggregates(session, affected_aggregates(history, dates))
+
+
+class FxRateAggregateRepository:
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+        self._session_factory = session_factory
+
+    async def get_aggregates(self,
+                             currency_code_from: str,
+                             currency_code_to: str,
+                             period: str,
+                             from_date: date,
+                             to_date: date) -> pl.DataFrame:
+        """
+        Returns aggregates of periods overlapping [from_date, to_date] with a range scan of the primary key
+        """
+        stmt = (select(*_AGGREGATE_COLUMNS)
+                .where(FxRateAggregate.currency_code_from == currency_code_from,
+                       FxRateAggregate.currency_code_to == currency_code_to,
+                       FxRateAggregate.period == period,
+                       FxRateAggregate.period_start >= datetime.combine(period_start(from_date, period), time.min),
+                       FxRateAggregate.period_start <= datetime.combine(to_date, time.min))
+                .order_by(FxRateAggregate.period_start))
+        with DB_QUERY_SECONDS.labels(query='aggregates').time():
+            async with self._session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+        return aggregates_to_df(rows)
+
+    async def rebuild(self, rate_repository, pairs: List[Tuple[str, str]]) -> int:
+        """
+        Recomputes all aggregates of `pairs` from their full history, e.g. after a snapshot import
+        """
+        written = 0
+        for currency_code_from, currency_code_to in pairs:
+            history = await rate_repository.get_rates(currency_code_from, currency_code_to, date.min, date.max)
+            if history.is_empty():
+                continue
+            aggregates = pl.concat([aggregate_rates(history.lazy(), period) for period in PERIODS]).collect()
+            async with self._session_factory.begin() as session:
+                await upsert_aggregates(session, aggregates)
+            written += aggregates.height
+        return written
+
+
+def aggregates_to_df(rows) -> pl.DataFrame:
+    return (pl.DataFrame(data=[tuple(r) for r in rows],
+                         schema={**AGGREGATE_SCHEMA, 'periodStart': pl.Datetime},
+                         orient='row')
+            .with_columns(pl.col('periodStart').dt.date()))
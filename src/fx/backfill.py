@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import polars as pl
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.models import FxTrackingPair
+from src.fx.repository import FxTrackingPairRepository, rows_to_df
+from src.fx.scraper import resolve_source, resolve_source_names
+from src.fx.snapshot import parse_pair
+from src.fx.source.factory import WHOLE_HISTORY_SOURCES, create_sources
+from src.fx.source.polygon import split_date_range
+from src.fx.source.upstream import UpstreamThrottledError
+from src.fx.storage import create_tracking_pair_repository, open_rate_repository
+from src.fx.stream import create_notifier
+from src.fx.sync import SYNC_STATUS_FAILED, SYNC_STATUS_NO_DATA, SYNC_STATUS_OK, SYNC_STATUS_THROTTLED
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+DEFAULT_WINDOW_DAYS = 365
+
+
+@dataclass(frozen=True)
+class BackfillUnit:
+    currency_code_from: str
+    currency_code_to: str
+    source_names: Tuple[str, ...]
+    from_date: date
+    to_date: date
+
+    @property
+    def pair(self) -> Pair:
+        return self.currency_code_from, self.currency_code_to
+
+
+@dataclass(frozen=True)
+class BackfillUnitResult:
+    unit: BackfillUnit
+    status: str
+    rates: pl.DataFrame
+
+
+@dataclass(frozen=True)
+class BackfillSummary:
+    units: int
+    failed: int
+    rows: int
+    inserted: int
+    updated: int
+
+
+def plan_units(tracking_pairs: Iterable[FxTrackingPair],
+               from_date: date,
+               to_date: date,
+               window_days: int = DEFAULT_WINDOW_DAYS,
+               resume: bool = True) -> List[BackfillUnit]:
+    """
+    Splits history of every pair into windows. If `resume` and the checkpoint of a pair covers `from_date`,
+    windows up to its end are skipped; a checkpoint starting later doesn't cover older history to load.
+    A pair with a source fetching whole history for any range, e.g. Alphavantage, is loaded as one unit,
+    since every window would fetch it again. Units are ordered by window, so all pairs progress together
+    and checkpoints move during the run.
+    """
+    units = []
+    for tracking_pair in tracking_pairs:
+        start = from_date
+        if resume and _checkpoint_covers(tracking_pair, from_date):
+            start = max(from_date, tracking_pair.backfilled_to.date() + timedelta(days=1))
+        source_names = tuple(resolve_source_names(tracking_pair))
+        if WHOLE_HISTORY_SOURCES.intersection(source_names):
+            windows = [(start, to_date)] if start <= to_date else []
+        else:
+            windows = split_date_range(start, to_date, window_days)
+        units.extend(BackfillUnit(tracking_pair.currency_code_from,
+                                  tracking_pair.currency_code_to,
+                                  source_names,
+                                  window_from,
+                                  window_to)
+                     for window_from, window_to in windows)
+    return sorted(units, key=lambda u: (u.from_date, u.pair))
+
+
+def _checkpoint_covers(tracking_pair: FxTrackingPair, from_date: date) -> bool:
+    return (tracking_pair.backfilled_from is not None
+            and tracking_pair.backfilled_to is not None
+            and tracking_pair.backfilled_from.date() <= from_date)
+
+
+class BackfillProgress:
+    """
+    Checkpoint of a pair is the end of its completed windows without gaps, so windows completed
+    out of order by other workers don't skip a failed one on resume
+    """
+
+    def __init__(self, units: Iterable[BackfillUnit]):
+        self._windows: Dict[Pair, List[BackfillUnit]] = {}
+        for unit in sorted(units, key=lambda u: u.from_date):
+            self._windows.setdefault(unit.pair, []).append(unit)
+        self._completed: set[BackfillUnit] = set()
+        self._next_window: Dict[Pair, int] = {pair: 0 for pair in self._windows}
+
+    def complete(self, unit: BackfillUnit) -> Optional[Tuple[date, date]]:
+        """
+        Returns the range of the pair loaded by this run without gaps, if its end has moved
+        """
+        self._completed.add(unit)
+        windows, idx = self._windows[unit.pair], self._next_window[unit.pair]
+        checkpoint = None
+        while idx < len(windows) and windows[idx] in self._completed:
+            checkpoint = windows[0].from_date, windows[idx].to_date
+            self._completed.discard(windows[idx])
+            idx += 1
+        self._next_window[unit.pair] = idx
+        return checkpoint
+
+
+class BackfillRunner:
+    """
+    Fetches units in `executor` and writes their rates with the bulk writer of the repository
+    in the calling event loop. At most `max_pending` units are fetched or waiting to be written.
+    """
+
+    def __init__(self,
+                 tracking_pair_repository: FxTrackingPairRepository,
+                 executor: Executor,
+                 max_pending: int,
+                 fetch_unit: Callable[[BackfillUnit], BackfillUnitResult] = None):
+        if max_pending <= 0:
+            raise ValueError('Max pending units must be positive')
+        self._tracking_pair_repository = tracking_pair_repository
+        self._executor = executor
+        self._max_pending = max_pending
+        self._fetch_unit = fetch_unit or fetch_unit_in_worker
+
+    async def run(self, units: List[BackfillUnit]) -> BackfillSummary:
+        loop = asyncio.get_running_loop()
+        progress = BackfillProgress(units)
+        queue = iter(units)
+        pending = set()
+
+        def submit():
+            unit = next(queue, None)
+            if unit is not None:
+                pending.add(loop.run_in_executor(self._executor, self._fetch_unit, unit))
+
+        for _ in range(self._max_pending):
+            submit()
+        failed, rows, inserted, updated = 0, 0, 0, 0
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result: BackfillUnitResult = future.result()
+                unit = result.unit
+                checkpoint = None
+                if result.status in (SYNC_STATUS_OK, SYNC_STATUS_NO_DATA):
+                    checkpoint = progress.complete(unit)
+                else:
+                    failed += 1
+                    logger.warning('Backfill of %s/%s from %s to %s ended with %s', unit.currency_code_from,
+                                   unit.currency_code_to, unit.from_date, unit.to_date, result.status)
+                if checkpoint is not None or not result.rates.is_empty():
+                    upsert_result = await self._tracking_pair_repository.save_backfill_result(
+                        unit.currency_code_from, unit.currency_code_to, result.rates, checkpoint)
+                    rows += result.rates.height
+                    inserted += upsert_result.inserted
+                    updated += upsert_result.updated
+                submit()
+        return BackfillSummary(len(units), failed, rows, inserted, updated)
+
+
+@dataclass
+class _Worker:
+    loop: asyncio.AbstractEventLoop
+    client_session: aiohttp.ClientSession
+    sources: dict
+    hedge_delay_seconds: Optional[float]
+
+
+_worker: Optional[_Worker] = None
+
+
+def init_worker(quota_share: float):
+    """
+    Runs in every worker process: it gets its own event loop, HTTP session and `quota_share` of provider quotas
+    """
+    global _worker
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client_session = loop.run_until_complete(_create_client_session())
+    _worker = _Worker(loop,
+                      client_session,
+                      create_sources(config, client_session, quota_share),
+                      config.failover_cfg().hedge_delay_seconds)
+    # atexit handlers don't run in pool workers, which leave with os._exit(), multiprocessing finalizers do
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+async def _create_client_session() -> aiohttp.ClientSession:
+    return aiohttp.ClientSession()
+
+
+def _close_worker():
+    _worker.loop.run_until_complete(_worker.client_session.close())
+    _worker.loop.close()
+
+
+def fetch_unit_in_worker(unit: BackfillUnit) -> BackfillUnitResult:
+    return _worker.loop.run_until_complete(_fetch(_worker, unit))
+
+
+async def _fetch(worker: _Worker, unit: BackfillUnit) -> BackfillUnitResult:
+    tracking_pair = FxTrackingPair(currency_code_from=unit.currency_code_from,
+                                   currency_code_to=unit.currency_code_to,
+                                   sources_config={'sources': list(unit.source_names)})
+    source = resolve_source(worker.sources, tracking_pair, worker.hedge_delay_seconds)
+    if source is None:
+        logger.warning('No source configured for %s/%s', unit.currency_code_from, unit.currency_code_to)
+        return BackfillUnitResult(unit, SYNC_STATUS_FAILED, rows_to_df([]))
+    try:
+        pldf = await source.get_exchange_rates(unit.currency_code_from, unit.currency_code_to,
+                                               unit.from_date, unit.to_date)
+        rates = await pldf.collect_async()
+    except UpstreamThrottledError:
+        return BackfillUnitResult(unit, SYNC_STATUS_THROTTLED, rows_to_df([]))
+    except Exception:
+        logger.exception('Failed to fetch rates for %s/%s from %s to %s',
+                         unit.currency_code_from, unit.currency_code_to, unit.from_date, unit.to_date)
+        return BackfillUnitResult(unit, SYNC_STATUS_FAILED, rows_to_df([]))
+    return BackfillUnitResult(unit, SYNC_STATUS_OK if not rates.is_empty() else SYNC_STATUS_NO_DATA, rates)
+
+
+async def _backfill(args: argparse.Namespace, tracking_pair_repository: FxTrackingPairRepository):
+    tracking_pairs = [p for p in await tracking_pair_repository.get_all()
+                      if args.pair is None or (p.currency_code_from, p.currency_code_to) in args.pair]
+    units = plan_units(tracking_pairs, args.from_date, args.to_date, args.window_days, not args.restart)
+    logger.info('Backfilling %d pairs in %d units with %d workers', len(tracking_pairs), len(units), args.workers)
+    # Every worker gets an equal share of provider quotas, so together they stay within them
+    with ProcessPoolExecutor(args.workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker,
+                             initargs=(1 / args.workers,)) as executor:
+        summary = await BackfillRunner(tracking_pair_repository, executor, args.workers * 2).run(units)
+    logger.info('Backfilled %d rows in %d units, %d failed: %d inserted, %d updated',
+                summary.rows, summary.units, summary.failed, summary.inserted, summary.updated)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Loads full history of tracking pairs with a pool of processes')
+    parser.add_argument('--from-date', type=date.fromisoformat, required=True)
+    parser.add_argument('--to-date', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--pair', type=parse_pair, action='append', help='e.g. USD/EUR, may be repeated')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--window-days', type=int, default=DEFAULT_WINDOW_DAYS)
+    parser.add_argument('--restart', action='store_true', help='Ignore checkpoints of the previous run')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    engine = create_db_engine(config.database_cfg())
+    try:
+        async with aiohttp.ClientSession() as client_session:
+            session_factory = create_session_factory(engine)
+            async with open_rate_repository(config, session_factory, client_session) as rate_repository:
+                tracking_pair_repository = create_tracking_pair_repository(session_factory,
+                                                                           rate_repository,
+                                                                           config.gap_fill_cfg(),
+                                                                           create_notifier(config.stream_cfg()))
+                await _backfill(args, tracking_pair_repository)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
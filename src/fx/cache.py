@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import polars as pl
+
+from src.fx.metrics import CACHE_REQUESTS
+
+
+@dataclass(frozen=True)
+class FxRatesCacheKey:
+    currency_code_from: str
+    currency_code_to: str
+    from_date: date
+    to_date: date
+
+
+class FxRatesCache:
+    """
+    Size-bounded LRU cache of collected rate ranges. Entries are invalidated per pair,
+    so a write for one pair doesn't flush ranges of other pairs.
+    A range read while its pair is invalidated is stale, so `put` skips it, if the `generation`
+    of the pair taken before the read has changed since.
+    """
+
+    def __init__(self, max_size: int):
+        if max_size <= 0:
+            raise ValueError('Cache size must be positive')
+        self._max_size = max_size
+        self._entries: OrderedDict[FxRatesCacheKey, pl.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+        # Invalidations are numbered, a pair's generation is the number of its last invalidation or of the last clear
+        self._invalidations = 0
+        self._invalidated: Dict[Tuple[str, str], int] = {}
+        self._cleared = 0
+
+    def get(self, key: FxRatesCacheKey) -> Optional[pl.DataFrame]:
+        with self._lock:
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels(cache='rates', result='hit' if df is not None else 'miss').inc()
+        return df
+
+    def generation(self, currency_code_from: str, currency_code_to: str) -> int:
+        with self._lock:
+            return self._generation((currency_code_from, currency_code_to))
+
+    def put(self, key: FxRatesCacheKey, df: pl.DataFrame, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generation((key.currency_code_from,
+                                                                            key.currency_code_to)):
+                return
+            self._entries[key] = df
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_pair(self, currency_code_from: str, currency_code_to: str):
+        with self._lock:
+            self._invalidations += 1
+            self._invalidated[(currency_code_from, currency_code_to)] = self._invalidations
+            stale_keys = [k for k in self._entries
+                          if k.currency_code_from == currency_code_from and k.currency_code_to == currency_code_to]
+            for k in stale_keys:
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._cleared = self._invalidations
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _generation(self, pair: Tuple[str, str]) -> int:
+        return max(self._invalidated.get(pair, 0), self._cleared)
@@ -0,0 +1,52 @@
+import polars as pl
+
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+
+CONVERSION_SCHEMA = {
+    'amount': DECIMAL_MONEY_TYPE,
+    'currencyCode': pl.String,
+    'date': pl.Date
+}
+
+
+def convert_to_base(amounts: pl.LazyFrame,
+                    rates: pl.LazyFrame,
+                    base_currency_code: str,
+                    as_of: bool = False) -> pl.LazyFrame:
+    """
+    Converts every row of `amounts` (CONVERSION_SCHEMA) into `base_currency_code` with one join.
+    `rates` may contain both directions of a pair, a direct rate wins over an inverted one.
+    If `as_of` is set, the last known rate on or before the date is used, e.g. for weekends.
+    Rows without a rate get null `rate` and `convertedAmount`. Input order is kept.
+    """
+    direct = (rates.filter(pl.col('currencyCodeTo') == base_currency_code)
+              .select('date', pl.col('currencyCodeFrom').alias('currencyCode'), pl.col('rate').alias('directRate')))
+    inverted = (rates.filter(pl.col('currencyCodeFrom') == base_currency_code)
+                .select('date',
+                        pl.col('currencyCodeTo').alias('currencyCode'),
+                        pl.lit(1).truediv(pl.col('rate')).cast(DECIMAL_MONEY_TYPE).alias('invertedRate')))
+    if as_of:
+        amounts = amounts.with_row_index('idx').sort('date')
+        direct, inverted = direct.sort('date'), inverted.sort('date')
+    else:
+        amounts = amounts.with_row_index('idx')
+    return (amounts.with_columns(pl.col('currencyCode').str.to_uppercase())
+            .pipe(_join_rates, direct, as_of)
+            .pipe(_join_rates, inverted, as_of)
+            .with_columns(pl.when(pl.col('currencyCode') == base_currency_code)
+                          .then(pl.lit(1).cast(DECIMAL_MONEY_TYPE))
+                          .otherwise(pl.coalesce('directRate', 'invertedRate'))
+                          .alias('rate'))
+            .sort('idx')
+            .select('amount',
+                    'currencyCode',
+                    'date',
+                    'rate',
+                    (pl.col('amount') * pl.col('rate')).cast(DECIMAL_MONEY_TYPE).alias('convertedAmount')))
+
+
+def _join_rates(amounts: pl.LazyFrame, rates: pl.LazyFrame, as_of: bool) -> pl.LazyFrame:
+    if as_of:
+        # Both sides are sorted by date before, polars can't check it within `by` groups
+        return amounts.join_asof(rates, on='date', by='currencyCode', strategy='backward', check_sortedness=False)
+    return amounts.join(rates, on=['currencyCode', 'date'], how='left')
@@ -11,6 +11,10 @@ def is_fiat(code: str) -> bool:
     return CurrencyTypeResolver.is_fiat(code)
 
 
+def crypto_codes() -> set[str]:
+    return CurrencyTypeResolver.crypto_codes()
+
+
 def _resolve_3_letter_currency_codes(currencies: List[Currency]) -> set[str]:
     return {c.code.upper() for c in currencies if c.code}
 
@@ -25,6 +29,10 @@ class CurrencyTypeResolver:
             return False
         return code.upper() in CurrencyTypeResolver._CRYPTO_CURRENCIES_CODES
 
+    @classmethod
+    def crypto_codes(cls) -> set[str]:
+        return set(CurrencyTypeResolver._CRYPTO_CURRENCIES_CODES)
+
     @classmethod
     def is_fiat(cls, code: str) -> bool:
         if not code:
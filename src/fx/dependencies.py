@@ -0,0 +1,18 @@
+from fastapi import Request
+from fastapi.requests import HTTPConnection
+
+from src.fx.aggregates import FxRateAggregateRepository
+from src.fx.service import FxRatesService
+from src.fx.stream import FxRateBroker
+
+
+def get_fx_rates_service(request: Request) -> FxRatesService:
+    return request.app.state.fx_rates_service
+
+
+def get_fx_rate_aggregate_repository(request: Request) -> FxRateAggregateRepository:
+    return request.app.state.fx_rate_aggregate_repository
+
+
+def get_fx_rate_broker(connection: HTTPConnection) -> FxRateBroker:
+    return connection.app.state.fx_rate_broker
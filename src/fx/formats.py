@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, IO, List, Optional
+
+import polars as pl
+from fastapi.responses import StreamingResponse
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+# Rows per Arrow record batch or Parquet row group, the client gets the body in pieces of this size
+BATCH_ROWS = 64 * 1024
+
+_MAX_PENDING_CHUNKS = 8
+
+_JSON_MEDIA_RANGES = ('application/json', 'application/*', '*/*')
+
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """
+    Returns Arrow or Parquet media type if the client prefers it by q-value, None means JSON.
+    JSON wins ties, Arrow and Parquet are only served when they're named explicitly.
+    """
+    if not accept:
+        return None
+    weights: Dict[str, float] = {}
+    for value in accept.split(','):
+        media_type, *params = [part.strip() for part in value.split(';')]
+        weights[media_type.lower()] = max(weights.get(media_type.lower(), 0.0), _quality(params))
+    best_media_type = None
+    best_weight = max(weights.get(media_type, 0.0) for media_type in _JSON_MEDIA_RANGES)
+    for media_type in (ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE):
+        if weights.get(media_type, 0.0) > best_weight:
+            best_media_type, best_weight = media_type, weights[media_type]
+    return best_media_type
+
+
+def _quality(params: List[str]) -> float:
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return min(max(float(value), 0.0), 1.0)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def frame_response(df: pl.DataFrame, media_type: str) -> StreamingResponse:
+    """
+    Arrow stream is sent batch by batch, Parquet is sent once polars has written its footer
+    """
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        # Every chunk of the frame is written as a separate record batch
+        batches = pl.concat([df.slice(offset, BATCH_ROWS) for offset in range(0, df.height, BATCH_ROWS)]
+                            or [df], rechunk=False)
+        write = batches.write_ipc_stream
+    else:
+        def write(file: IO[bytes]):
+            df.write_parquet(file, row_group_size=BATCH_ROWS)
+    return StreamingResponse(stream_writes(write), media_type=media_type)
+
+
+async def stream_writes(write: Callable[[IO[bytes]], None]) -> AsyncIterator[bytes]:
+    """
+    Runs `write` in a thread and yields written bytes as soon as they're written.
+    The writer waits while the client is slower, so the body isn't buffered as a whole.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(_MAX_PENDING_CHUNKS)
+    writer = _QueueWriter(loop, queue)
+
+    def run():
+        try:
+            write(writer)
+        except Exception as e:
+            writer.put(e)
+        else:
+            writer.put(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        writer.closed.set()
+
+
+class _QueueWriter:
+    """
+    Write-only file, which passes written bytes into an asyncio queue
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self._loop = loop
+        self._queue = queue
+        self.closed = threading.Event()
+
+    def write(self, data) -> int:
+        if self.closed.is_set():
+            raise BrokenPipeError('Client has gone')
+        if len(data):
+            self.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def put(self, item):
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        # Waiting with timeout, so the thread notices that the consumer is gone
+        while not self.closed.is_set():
+            try:
+                future.result(timeout=1)
+                return
+            except TimeoutError:
+                continue
+        future.cancel()
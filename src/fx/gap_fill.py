@@ -0,0 +1,144 @@
+from datetime import date, datetime, time, timedelta
+
+import polars as pl
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import GapFillConfig
+from src.fx.currency_helpers import crypto_codes
+from src.fx.metrics import COLLECT_SECONDS, DB_QUERY_SECONDS
+from src.fx.models import FxFilledRate
+from src.fx.repository import read_locked_history
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+
+FILLED_COLUMN = 'filled'
+
+FILLED_SCHEMA = {
+    'date': pl.Date,
+    'currencyCodeFrom': pl.String,
+    'currencyCodeTo': pl.String,
+    'rate': DECIMAL_MONEY_TYPE,
+    FILLED_COLUMN: pl.Boolean,
+}
+
+_PAIR_COLUMNS = ['currencyCodeFrom', 'currencyCodeTo']
+
+_INSERT_BATCH_ROWS = 5000
+
+_FILLED_RATE_COLUMNS = (FxFilledRate.date, FxFilledRate.currency_code_from, FxFilledRate.currency_code_to,
+                        FxFilledRate.rate, FxFilledRate.filled)
+
+
+def lookback_start(from_date: date, config: GapFillConfig) -> date:
+    """
+    Rates from this date are needed to fill the first days of a range starting at `from_date`
+    """
+    return from_date - timedelta(days=max(config.fiat_max_staleness_days, config.crypto_max_staleness_days))
+
+
+def max_staleness_days(config: GapFillConfig) -> pl.Expr:
+    """
+    Pairs with a crypto currency trade every day, so they follow the crypto calendar
+    """
+    codes = list(crypto_codes())
+    is_crypto_pair = (pl.col('currencyCodeFrom').str.to_uppercase().is_in(codes)
+                      | pl.col('currencyCodeTo').str.to_uppercase().is_in(codes))
+    return (pl.when(is_crypto_pair)
+            .then(pl.lit(config.crypto_max_staleness_days))
+            .otherwise(pl.lit(config.fiat_max_staleness_days)))
+
+
+def fill_gaps(rates: pl.LazyFrame, from_date: date, to_date: date, config: GapFillConfig) -> pl.LazyFrame:
+    """
+    Densifies rates (SCHEMA columns) of every pair to days from `from_date` to `to_date`. A day without
+    a rate gets the last earlier rate, unless it's older than the staleness limit of the pair, then the day
+    stays missing. Filled days are flagged in the `filled` column. Rates should start at `lookback_start`,
+    so the first days of the range can be filled. The stage is lazy and can be piped onto any rates,
+    e.g. `(await source.get_exchange_rates(...)).pipe(fill_gaps, from_date, to_date, config)`.
+    """
+    calendar = (rates.group_by(_PAIR_COLUMNS)
+                .agg(pl.col('date').min().alias('firstDate'))
+                .select(*_PAIR_COLUMNS, pl.date_ranges('firstDate', pl.lit(to_date), '1d').alias('date'))
+                .explode('date'))
+    return (calendar.join(rates.select('date', *_PAIR_COLUMNS, 'rate', pl.col('date').alias('rateDate')),
+                          on=['date', *_PAIR_COLUMNS],
+                          how='left')
+            .sort(*_PAIR_COLUMNS, 'date')
+            .with_columns(pl.col('rate', 'rateDate').forward_fill().over(_PAIR_COLUMNS))
+            .filter(pl.col('date').is_between(from_date, to_date),
+                    (pl.col('date') - pl.col('rateDate')).dt.total_days() <= max_staleness_days(config))
+            .select('date', *_PAIR_COLUMNS, 'rate', (pl.col('date') != pl.col('rateDate')).alias(FILLED_COLUMN)))
+
+
+class FxFilledRateRefresher:
+    """
+    Keeps fx_filled_rates up to date with written rates. Days from the first written date up to
+    the staleness limit after the last one are recomputed, later days don't depend on them.
+    Rates are read as `read_locked_history` describes.
+    """
+
+    def __init__(self, config: GapFillConfig, rate_repository=None):
+        self._config = config
+        self._rate_repository = rate_repository
+
+    async def refresh(self, session: AsyncSession, rates: pl.DataFrame):
+        if rates.is_empty():
+            return
+        horizon = timedelta(days=max(self._config.fiat_max_staleness_days, self._config.crypto_max_staleness_days))
+        # Pairs are locked in the same order by every transaction, so they can't deadlock
+        for pair_rates in rates.sort(_PAIR_COLUMNS).partition_by(_PAIR_COLUMNS, maintain_order=True):
+            pair = pair_rates.row(0, named=True)
+            currency_code_from, currency_code_to = pair['currencyCodeFrom'], pair['currencyCodeTo']
+            from_date = pair_rates.get_column('date').min()
+            to_date = pair_rates.get_column('date').max() + horizon
+            history = await read_locked_history(session, self._rate_repository, pair_rates,
+                                                lookback_start(from_date, self._config), to_date)
+            with COLLECT_SECONDS.labels(stage='gap_fill').time():
+                filled = fill_gaps(history.lazy(), from_date, to_date, self._config).collect()
+            await session.execute(delete(FxFilledRate)
+                                  .where(FxFilledRate.currency_code_from == currency_code_from,
+                                         FxFilledRate.currency_code_to == currency_code_to,
+                                         FxFilledRate.date >= datetime.combine(from_date, time.min),
+                                         FxFilledRate.date <= datetime.combine(to_date, time.min)))
+            await _insert(session, filled)
+
+
+async def _insert(session: AsyncSession, filled: pl.DataFrame):
+    # Every row takes 5 parameters of the 32767 allowed per statement
+    for offset in range(0, filled.height, _INSERT_BATCH_ROWS):
+        batch = filled.slice(offset, _INSERT_BATCH_ROWS)
+        await session.execute(insert(FxFilledRate).values([
+            {'date': datetime.combine(r['date'], time.min),
+             'currency_code_from': r['currencyCodeFrom'],
+             'currency_code_to': r['currencyCodeTo'],
+             'rate': r['rate'],
+             'filled': r[FILLED_COLUMN]}
+            for r in batch.iter_rows(named=True)]))
+
+
+class FxFilledRateRepository:
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+        self._session_factory = session_factory
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        """
+        A single date is a primary key lookup, there's a row for every day of the filled series
+        """
+        stmt = (select(*_FILLED_RATE_COLUMNS)
+                .where(FxFilledRate.currency_code_from == currency_code_from,
+                       FxFilledRate.currency_code_to == currency_code_to,
+                       FxFilledRate.date >= datetime.combine(from_date, time.min),
+                       FxFilledRate.date <= datetime.combine(to_date, time.min))
+                .order_by(FxFilledRate.date))
+        with DB_QUERY_SECONDS.labels(query='filled_rates').time():
+            async with self._session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+        return (pl.DataFrame(data=[tuple(r) for r in rows],
+                             schema={**FILLED_SCHEMA, 'date': pl.Datetime},
+                             orient='row')
+                .with_columns(pl.col('date').dt.date()))
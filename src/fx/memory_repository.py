@@ -0,0 +1,71 @@
+from datetime import date
+from typing import List, Optional, Sequence, Tuple, Union
+
+import polars as pl
+
+from src.fx.repository import rows_to_df
+from src.fx.writer import UpsertResult
+
+_KEY_COLUMNS = ['date', 'currencyCodeFrom', 'currencyCodeTo']
+_PAIR_COLUMNS = ['currencyCodeFrom', 'currencyCodeTo']
+
+
+class InMemoryFxRateRepository:
+    """
+    Same interface as FxRateRepository over a frame in memory, e.g. for tests and local runs without a database
+    """
+
+    def __init__(self):
+        self._rates = rows_to_df([])
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        return self._filter([(currency_code_from, currency_code_to)], from_date, to_date).sort('date')
+
+    async def get_pairs(self) -> List[Tuple[str, str]]:
+        return list(self._rates.select(_PAIR_COLUMNS).unique().iter_rows())
+
+    async def get_all_rates(self) -> pl.DataFrame:
+        return self._rates.sort(_PAIR_COLUMNS + ['date'])
+
+    async def get_latest_rate(self,
+                              currency_code_from: str,
+                              currency_code_to: str,
+                              on_date: Optional[date] = None) -> pl.DataFrame:
+        df = self._filter([(currency_code_from, currency_code_to)], date.min, on_date or date.max)
+        return df.sort('date').tail(1)
+
+    async def get_rates_for_pairs(self,
+                                  pairs: Sequence[Tuple[str, str]],
+                                  from_date: date,
+                                  to_date: date) -> pl.DataFrame:
+        return self._filter(pairs, from_date, to_date)
+
+    async def get_rates_against(self,
+                                currency_codes: Sequence[str],
+                                base_currency_code: str,
+                                from_date: date,
+                                to_date: date) -> pl.DataFrame:
+        pairs = [pair for code in currency_codes for pair in ((code, base_currency_code), (base_currency_code, code))]
+        return self._filter(pairs, from_date, to_date)
+
+    async def save_rates(self, rates: Union[pl.LazyFrame, pl.DataFrame]) -> UpsertResult:
+        """
+        Counts and returns inserted and updated rows the same way as the bulk writer: unchanged rates are neither
+        """
+        df = await rates.lazy().select(self._rates.columns).unique(subset=_KEY_COLUMNS, keep='last').collect_async()
+        changed = df.join(self._rates, on=_KEY_COLUMNS, how='left', suffix='_current', nulls_equal=True) \
+            .filter(pl.col('rate_current').is_null() | (pl.col('rate_current') != pl.col('rate')))
+        inserted = changed.filter(pl.col('rate_current').is_null()).height
+        self._rates = pl.concat([self._rates, df]).unique(subset=_KEY_COLUMNS, keep='last', maintain_order=True)
+        return UpsertResult(inserted=inserted, updated=changed.height - inserted, changed=changed.select(df.columns))
+
+    def _filter(self, pairs: Sequence[Tuple[str, str]], from_date: date, to_date: date) -> pl.DataFrame:
+        if not pairs:
+            return rows_to_df([])
+        wanted = pl.DataFrame(list(pairs), schema=_PAIR_COLUMNS, orient='row')
+        return (self._rates.join(wanted, on=_PAIR_COLUMNS, how='semi')
+                .filter(pl.col('date').is_between(from_date, to_date)))
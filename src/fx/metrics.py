@@ -0,0 +1,53 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Seconds, from a cache hit to a slow provider page
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Upstream providers
+UPSTREAM_REQUEST_SECONDS = Histogram('fx_upstream_request_duration_seconds',
+                                     'Time until provider responded with status, per attempt',
+                                     ['provider', 'ticker', 'status'], buckets=_BUCKETS)
+UPSTREAM_RATE_LIMIT_WAIT_SECONDS = Histogram('fx_upstream_rate_limit_wait_seconds',
+                                             'Time spent waiting for the rate limiter', ['provider'],
+                                             buckets=_BUCKETS)
+UPSTREAM_FETCH_SECONDS = Histogram('fx_upstream_fetch_duration_seconds',
+                                   'Time to fetch and parse one response, including retries and cache lookups',
+                                   ['provider', 'ticker'], buckets=_BUCKETS)
+PARSE_SECONDS = Histogram('fx_parse_duration_seconds', 'Time spent building frames from decoded payloads',
+                          ['provider'], buckets=_BUCKETS)
+PARSED_ROWS = Counter('fx_parsed_rows_total', 'Rows parsed from provider payloads', ['provider'])
+
+# Failover
+FAILOVER_ATTEMPTS = Counter('fx_failover_attempts_total',
+                            'Requests to sources of failover chains by trigger: primary, hedge or fallback',
+                            ['source', 'trigger'])
+
+# Polars
+COLLECT_SECONDS = Histogram('fx_collect_duration_seconds', 'Time spent collecting lazy frames', ['stage'],
+                            buckets=_BUCKETS)
+
+# Database
+DB_QUERY_SECONDS = Histogram('fx_db_query_duration_seconds', 'Duration of fx_rates reads', ['query'],
+                             buckets=_BUCKETS)
+DB_WRITE_SECONDS = Histogram('fx_db_write_duration_seconds', 'Duration of fx_rates bulk writes', ['stage'],
+                             buckets=_BUCKETS)
+DB_WRITTEN_ROWS = Counter('fx_db_written_rows_total', 'Rows upserted into fx_rates', ['result'])
+
+# Caches
+CACHE_REQUESTS = Counter('fx_cache_requests_total', 'Lookups of in-process caches by result: hit or miss',
+                         ['cache', 'result'])
+RESPONSE_CACHE_REQUESTS = Counter('fx_response_cache_requests_total',
+                                  'Lookups of the provider response cache by result: fresh, revalidated or miss',
+                                  ['provider', 'result'])
+
+# Scraper
+SCRAPER_QUEUE_DEPTH = Gauge('fx_scraper_queue_depth', 'Pairs of the current run waiting for a free slot')
+SCRAPER_IN_FLIGHT = Gauge('fx_scraper_in_flight', 'Pairs of the current run being synced')
+
+# Streams
+STREAM_SUBSCRIBERS = Gauge('fx_stream_subscribers', 'Open subscriptions to streams of written rates')
+STREAM_DROPPED_SUBSCRIBERS = Counter('fx_stream_dropped_subscribers_total',
+                                     'Subscribers disconnected for lagging behind written rates')
+STREAM_NOTIFICATIONS = Counter('fx_stream_notifications_total',
+                               'Postgres notifications of written rates by direction: sent or received',
+                               ['direction'])
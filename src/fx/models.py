@@ -1,7 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
-from sqlalchemy import TIMESTAMP, String, Numeric, DateTime, PrimaryKeyConstraint
+from sqlalchemy import TIMESTAMP, String, Numeric, DateTime, PrimaryKeyConstraint, Index, Integer, Boolean
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped
 from sqlalchemy.testing.schema import mapped_column
@@ -10,6 +11,10 @@ from src.models import Base
 
 
 class FxRate(Base):
+    """
+    Partitioned by year of `date`. Primary key leads with the pair and includes `rate`
+    (added by the migration, SQLAlchemy can't express INCLUDE), so reads of a pair are index-only scans.
+    """
     __tablename__ = 'fx_rates'
 
     date: Mapped[datetime] = mapped_column(DateTime)
@@ -18,7 +23,9 @@ class FxRate(Base):
     rate: Mapped[Decimal] = mapped_column(Numeric(38, 10))
 
     __table_args__ = (
-        PrimaryKeyConstraint('date', 'currency_code_from', 'currency_code_to', name='fx_rates_unique_idx'),)
+        PrimaryKeyConstraint('currency_code_from', 'currency_code_to', 'date', name='fx_rates_unique_idx'),
+        Index('fx_rates_date_brin_idx', 'date', postgresql_using='brin'),
+        {'postgresql_partition_by': 'RANGE (date)'})
 
 class FxTrackingPair(Base):
     __tablename__ = 'fx_tracking_pairs'
@@ -29,6 +36,46 @@ class FxTrackingPair(Base):
     last_sync_date: Mapped[TIMESTAMP] = mapped_column(TIMESTAMP(True))
     last_sync_status: Mapped[str] = mapped_column(String(10))
     last_rate_date: Mapped[datetime] = mapped_column(DateTime)
+    # History from backfilled_from up to backfilled_to is loaded without gaps
+    backfilled_from: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    backfilled_to: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     __table_args__ = (
-        PrimaryKeyConstraint('currency_code_from', 'currency_code_to', name='fx_tracking_pairs_unique_idx'),)
\ No newline at end of file
+        PrimaryKeyConstraint('currency_code_from', 'currency_code_to', name='fx_tracking_pairs_unique_idx'),)
+
+class FxRateAggregate(Base):
+    """
+    OHLC and mean of rates of a pair over a week, month or year starting at `period_start`
+    """
+    __tablename__ = 'fx_rate_aggregates'
+
+    currency_code_from: Mapped[str] = mapped_column(String(3))
+    currency_code_to: Mapped[str] = mapped_column(String(3))
+    period: Mapped[str] = mapped_column(String(5))
+    period_start: Mapped[datetime] = mapped_column(DateTime)
+    open: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    high: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    low: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    close: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    mean: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    rate_count: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('currency_code_from', 'currency_code_to', 'period', 'period_start',
+                             name='fx_rate_aggregates_unique_idx'),)
+
+
+class FxFilledRate(Base):
+    """
+    Daily series of a pair, where days without rates carry the last rate forward and are marked as filled
+    """
+    __tablename__ = 'fx_filled_rates'
+
+    date: Mapped[datetime] = mapped_column(DateTime)
+    currency_code_from: Mapped[str] = mapped_column(String(3))
+    currency_code_to: Mapped[str] = mapped_column(String(3))
+    rate: Mapped[Decimal] = mapped_column(Numeric(38, 10))
+    filled: Mapped[bool] = mapped_column(Boolean)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('currency_code_from', 'currency_code_to', 'date', name='fx_filled_rates_unique_idx'),)
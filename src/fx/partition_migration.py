@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.partitions import SHADOW_TABLE, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = 'fx_rates_legacy'
+
+DEFAULT_BATCH_DAYS = 31
+
+# Rates written during the copy are mirrored by the trigger and are newer than copied ones, so they're kept
+_COPY_SQL = text(f"""
+INSERT INTO {SHADOW_TABLE} (date, currency_code_from, currency_code_to, rate)
+SELECT date, currency_code_from, currency_code_to, rate FROM fx_rates
+WHERE date >= :start AND date < :end
+ON CONFLICT (currency_code_from, currency_code_to, date) DO NOTHING
+""")
+
+_SWAP_SQL = [
+    'DROP TRIGGER fx_rates_mirror_trigger ON fx_rates',
+    'DROP FUNCTION fx_rates_mirror()',
+    f'ALTER TABLE fx_rates RENAME TO {LEGACY_TABLE}',
+    f'ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT fx_rates_unique_idx TO {LEGACY_TABLE}_unique_idx',
+    f'ALTER TABLE {SHADOW_TABLE} RENAME TO fx_rates',
+    f'ALTER TABLE fx_rates RENAME CONSTRAINT {SHADOW_TABLE}_unique_idx TO fx_rates_unique_idx',
+    f'ALTER INDEX {SHADOW_TABLE}_date_brin_idx RENAME TO fx_rates_date_brin_idx',
+]
+
+
+class PartitionMigrationError(Exception):
+    """
+    Tables aren't in the state the step expects
+    """
+
+
+async def copy_rates(session_factory: async_sessionmaker[AsyncSession],
+                     batch_days: int = DEFAULT_BATCH_DAYS,
+                     from_date: Optional[date] = None) -> int:
+    """
+    Copies rates of fx_rates into the partitioned table in date ranges of `batch_days`, every range
+    in its own short transaction, so writers are never blocked. Can be rerun or resumed from `from_date`.
+    """
+    if batch_days <= 0:
+        raise ValueError('Batch days must be positive')
+    async with session_factory() as session:
+        await _check_shadow_exists(session)
+        first, last = (await session.execute(text('SELECT min(date), max(date) FROM fx_rates'))).one()
+    if first is None:
+        return 0
+    start = datetime.combine(max(first.date(), from_date or date.min), time.min)
+    copied = 0
+    while start <= last:
+        end = start + timedelta(days=batch_days)
+        async with session_factory.begin() as session:
+            await ensure_partitions(session, range(start.year, end.year + 1))
+            rows = (await session.execute(_COPY_SQL, {'start': start, 'end': end})).rowcount
+        copied += rows
+        logger.info('Copied %d rates from %s to %s', rows, start.date(), end.date())
+        start = end
+    return copied
+
+
+async def swap_tables(session_factory: async_sessionmaker[AsyncSession], lock_timeout_seconds: int = 5):
+    """
+    Checks that both tables have the same number of rates and gives fx_rates name to the partitioned one.
+    Rates are counted before the lock, in one snapshot of both tables, the trigger keeps them equal after that,
+    so only renames hold the lock. The old table is kept as fx_rates_legacy.
+    """
+    async with session_factory() as session:
+        await session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        await _check_shadow_exists(session)
+        legacy_count = (await session.execute(text('SELECT count(*) FROM fx_rates'))).scalar()
+        shadow_count = (await session.execute(text(f'SELECT count(*) FROM {SHADOW_TABLE}'))).scalar()
+    if legacy_count != shadow_count:
+        raise PartitionMigrationError(f'fx_rates has {legacy_count} rates, {SHADOW_TABLE} has {shadow_count}, '
+                                      f'run copy first')
+    async with session_factory.begin() as session:
+        await _check_shadow_exists(session)
+        await session.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout_seconds)}s'"))
+        await session.execute(text(f'LOCK TABLE fx_rates, {SHADOW_TABLE} IN ACCESS EXCLUSIVE MODE'))
+        for sql in _SWAP_SQL:
+            await session.execute(text(sql))
+
+
+async def drop_legacy(session_factory: async_sessionmaker[AsyncSession]):
+    async with session_factory.begin() as session:
+        await session.execute(text(f'DROP TABLE IF EXISTS {LEGACY_TABLE}'))
+
+
+async def _check_shadow_exists(session: AsyncSession):
+    if not (await session.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': SHADOW_TABLE})).scalar():
+        raise PartitionMigrationError(f'{SHADOW_TABLE} doesn\'t exist, fx_rates is already partitioned '
+                                      f'or the migration isn\'t applied')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Moves fx_rates into the partitioned table without downtime')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    copy_parser = subparsers.add_parser('copy', help='Copy existing rates, new ones are mirrored by a trigger')
+    copy_parser.add_argument('--batch-days', type=int, default=DEFAULT_BATCH_DAYS)
+    copy_parser.add_argument('--from-date', type=date.fromisoformat, help='Resume copying from this date')
+    swap_parser = subparsers.add_parser('swap', help='Replace fx_rates with the partitioned table')
+    swap_parser.add_argument('--lock-timeout-seconds', type=int, default=5)
+    subparsers.add_parser('drop-legacy', help='Drop the old table after the swap')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    engine = create_db_engine(load_config().database_cfg())
+    try:
+        session_factory = create_session_factory(engine)
+        if args.command == 'copy':
+            copied = await copy_rates(session_factory, args.batch_days, args.from_date)
+            logger.info('Copied %d rates', copied)
+        elif args.command == 'swap':
+            await swap_tables(session_factory, args.lock_timeout_seconds)
+            logger.info('fx_rates is partitioned, the old table is kept as %s', LEGACY_TABLE)
+        else:
+            await drop_legacy(session_factory)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
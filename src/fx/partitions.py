@@ -0,0 +1,50 @@
+from typing import Iterable, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Partitioned copy of fx_rates, which takes its name after the online migration is finished
+SHADOW_TABLE = 'fx_rates_partitioned'
+
+_PARENT_TABLE_SQL = """
+SELECT c.relname
+FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+WHERE c.relname IN ('fx_rates', :shadow) AND c.relnamespace = current_schema()::regnamespace
+ORDER BY c.relname = 'fx_rates' DESC
+LIMIT 1
+"""
+
+# Partitions of the same database URL and year, which are known to exist
+_existing_partitions: Set[Tuple[str, int]] = set()
+
+
+def partition_name(year: int) -> str:
+    return f'fx_rates_y{year}'
+
+
+def create_partition_sql(parent: str, year: int) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')")
+
+
+async def ensure_partitions(session: AsyncSession, years: Iterable[int]):
+    """
+    Creates yearly partitions of fx_rates, which rates of `years` go to. Partitions are created under
+    an advisory lock in the current transaction, so concurrent writers don't race on the same year.
+    Only partitions found in the catalog are remembered, since the transaction creating one may roll back.
+    """
+    url = str((await session.connection()).engine.url)
+    missing = sorted(year for year in set(years) if (url, year) not in _existing_partitions)
+    if not missing:
+        return
+    parent: Optional[str] = (await session.execute(text(_PARENT_TABLE_SQL), {'shadow': SHADOW_TABLE})).scalar()
+    if parent is None:
+        # fx_rates isn't partitioned yet and isn't being migrated
+        return
+    for year in missing:
+        name = partition_name(year)
+        if (await session.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name})).scalar():
+            _existing_partitions.add((url, year))
+            continue
+        await session.execute(text('SELECT pg_advisory_xact_lock(hashtext(:name))'), {'name': name})
+        await session.execute(text(create_partition_sql(parent, year)))
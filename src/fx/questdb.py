@@ -0,0 +1,210 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+import asyncpg
+import polars as pl
+
+from src.config import QuestDbConfig
+from src.fx.metrics import DB_QUERY_SECONDS, DB_WRITE_SECONDS, DB_WRITTEN_ROWS
+from src.fx.repository import rows_to_df
+from src.fx.source.parsing import to_money
+from src.fx.writer import UpsertResult
+
+_KEY_COLUMNS = ['date', 'currencyCodeFrom', 'currencyCodeTo']
+
+# Rows with the same timestamp and pair replace each other, so ILP writes behave as upserts.
+# Rate is the text of its decimal, a double would round it to 15 significant digits.
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS fx_rates (
+    ts TIMESTAMP,
+    currency_code_from SYMBOL,
+    currency_code_to SYMBOL,
+    rate VARCHAR
+) TIMESTAMP(ts) PARTITION BY YEAR WAL
+DEDUP UPSERT KEYS(ts, currency_code_from, currency_code_to)
+"""
+
+# Rates of a day are sampled into its last value, so intraday rates are read as daily closes
+_DAILY_RATES_SQL = """
+SELECT ts, currency_code_from, currency_code_to, last(rate) AS rate
+FROM fx_rates
+WHERE {pairs}ts >= ${start} AND ts < ${end}
+SAMPLE BY 1d ALIGN TO CALENDAR
+"""
+
+_LATEST_RATE_SQL = """
+SELECT ts, currency_code_from, currency_code_to, rate
+FROM fx_rates
+WHERE currency_code_from = $1 AND currency_code_to = $2{before}
+LATEST ON ts PARTITION BY currency_code_from, currency_code_to
+"""
+
+_PAIRS_SQL = 'SELECT DISTINCT currency_code_from, currency_code_to FROM fx_rates'
+
+_NO_CONTENT_STATUS = 204
+
+
+class IlpWriteError(Exception):
+    """
+    QuestDB rejected a batch of ILP lines
+    """
+
+
+def to_ilp_lines(rates: pl.DataFrame) -> List[str]:
+    """
+    Rate is written as a string field with positional notation of its decimal,
+    timestamp is the start of the day in nanoseconds
+    """
+    return rates.select(pl.format('fx_rates,currency_code_from={},currency_code_to={} rate="{}" {}',
+                                  'currencyCodeFrom',
+                                  'currencyCodeTo',
+                                  pl.col('rate').cast(pl.String),
+                                  pl.col('date').cast(pl.Datetime('ns')).dt.epoch('ns'))).to_series().to_list()
+
+
+class IlpHttpWriter:
+    """
+    Sends ILP lines to `/write` of the QuestDB HTTP server, every batch is committed separately
+    """
+
+    def __init__(self, client_session, url: str, batch_rows: int):
+        if batch_rows <= 0:
+            raise ValueError('Batch rows must be positive')
+        self._client_session = client_session
+        self._url = url.rstrip('/') + '/write'
+        self._batch_rows = batch_rows
+
+    async def write(self, lines: Sequence[str]):
+        for offset in range(0, len(lines), self._batch_rows):
+            body = '\n'.join(lines[offset:offset + self._batch_rows]) + '\n'
+            async with self._client_session.post(self._url, data=body.encode(), params={'precision': 'n'}) \
+                    as response:
+                if response.status != _NO_CONTENT_STATUS:
+                    raise IlpWriteError(f'QuestDB responded with {response.status}: {await response.text()}')
+
+
+class QuestDbFxRateRepository:
+    """
+    Same interface as FxRateRepository, rates are kept in a QuestDB table deduplicated by timestamp and pair.
+    Writes go over ILP/HTTP in batches, reads go over PG-wire with SAMPLE BY and LATEST ON.
+    Rates are stored as text of their decimals, so they're read back exactly.
+    """
+
+    def __init__(self, pool, writer: IlpHttpWriter):
+        self._pool = pool
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, config: QuestDbConfig, client_session) -> 'QuestDbFxRateRepository':
+        pool = await asyncpg.create_pool(config.pg_url)
+        repository = cls(pool, IlpHttpWriter(client_session, config.ilp_url, config.batch_rows))
+        await repository.create_table()
+        return repository
+
+    async def close(self):
+        await self._pool.close()
+
+    async def create_table(self):
+        async with self._pool.acquire() as connection:
+            await connection.execute(_CREATE_TABLE_SQL)
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        df = await self._fetch_daily_rates('rates', [(currency_code_from, currency_code_to)], from_date, to_date)
+        return df.sort('date')
+
+    async def get_pairs(self) -> List[Tuple[str, str]]:
+        return [tuple(row) for row in await self._fetch('pairs', _PAIRS_SQL)]
+
+    async def get_all_rates(self) -> pl.DataFrame:
+        df = await self._fetch_daily_rates('all_rates', None, date.min, date.max)
+        return df.sort('currencyCodeFrom', 'currencyCodeTo', 'date')
+
+    async def get_latest_rate(self,
+                              currency_code_from: str,
+                              currency_code_to: str,
+                              on_date: Optional[date] = None) -> pl.DataFrame:
+        """
+        Returns the last known rate on or before `on_date`, or the latest one if the date isn't set
+        """
+        if on_date is None:
+            rows = await self._fetch('latest_rate', _LATEST_RATE_SQL.format(before=''),
+                                     currency_code_from, currency_code_to)
+        else:
+            rows = await self._fetch('latest_rate', _LATEST_RATE_SQL.format(before=' AND ts < $3'),
+                                     currency_code_from, currency_code_to, _day_start(on_date + timedelta(days=1)))
+        return _to_df(rows)
+
+    async def get_rates_for_pairs(self,
+                                  pairs: Sequence[Tuple[str, str]],
+                                  from_date: date,
+                                  to_date: date) -> pl.DataFrame:
+        return await self._fetch_daily_rates('rates_for_pairs', pairs, from_date, to_date)
+
+    async def get_rates_against(self,
+                                currency_codes: Sequence[str],
+                                base_currency_code: str,
+                                from_date: date,
+                                to_date: date) -> pl.DataFrame:
+        pairs = [pair for code in currency_codes for pair in ((code, base_currency_code), (base_currency_code, code))]
+        return await self._fetch_daily_rates('rates_against', pairs, from_date, to_date)
+
+    async def save_rates(self, rates: Union[pl.LazyFrame, pl.DataFrame]) -> UpsertResult:
+        """
+        QuestDB doesn't tell inserted rows from replaced ones, so all written rows are counted as inserted
+        """
+        df = await rates.lazy().unique(subset=_KEY_COLUMNS, keep='last').collect_async()
+        if df.is_empty():
+            return UpsertResult(0, 0)
+        with DB_WRITE_SECONDS.labels(stage='ilp').time():
+            await self._writer.write(to_ilp_lines(df))
+        DB_WRITTEN_ROWS.labels(result='inserted').inc(df.height)
+        return UpsertResult(inserted=df.height, updated=0)
+
+    async def _fetch_daily_rates(self,
+                                 query: str,
+                                 pairs: Optional[Sequence[Tuple[str, str]]],
+                                 from_date: date,
+                                 to_date: date) -> pl.DataFrame:
+        if pairs is not None and not pairs:
+            return rows_to_df([])
+        sql, args = daily_rates_query(pairs, from_date, to_date)
+        return _to_df(await self._fetch(query, sql, *args))
+
+    async def _fetch(self, query: str, sql: str, *args) -> List[Any]:
+        with DB_QUERY_SECONDS.labels(query=query).time():
+            async with self._pool.acquire() as connection:
+                return await connection.fetch(sql, *args)
+
+
+def daily_rates_query(pairs: Optional[Sequence[Tuple[str, str]]], from_date: date, to_date: date) \
+        -> Tuple[str, list]:
+    """
+    Reads rates of `pairs` or of all pairs. QuestDB has no row value comparison, so pairs are matched with a disjunction.
+    """
+    pairs = pairs or []
+    conditions = ' OR '.join(f'(currency_code_from = ${2 * i + 1} AND currency_code_to = ${2 * i + 2})'
+                             for i in range(len(pairs)))
+    args = [code for pair in pairs for code in pair]
+    # Designated timestamps start from the epoch, so open bounds like date.min are clamped
+    start = _day_start(max(from_date, date(1970, 1, 1)))
+    end = _day_start(min(to_date, date(9999, 12, 30)) + timedelta(days=1))
+    sql = _DAILY_RATES_SQL.format(pairs=f'({conditions}) AND ' if conditions else '', start=len(args) + 1, end=len(args) + 2)
+    return sql, args + [start, end]
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _to_df(rows: Sequence[Sequence[Any]]) -> pl.DataFrame:
+    if not rows:
+        return rows_to_df([])
+    df = pl.DataFrame(data=[tuple(r) for r in rows],
+                      schema={'date': pl.Datetime, 'currencyCodeFrom': pl.String, 'currencyCodeTo': pl.String,
+                              'rate': pl.String},
+                      orient='row')
+    return df.with_columns(pl.col('date').dt.date(), to_money(df.get_column('rate')))
@@ -0,0 +1,100 @@
+from datetime import date
+from typing import Dict, Tuple, Iterable, List, Set, Sequence
+
+import polars as pl
+
+from src.fx.repository import rows_to_df
+
+Pair = Tuple[str, str]
+
+_PAIR_COLUMNS = ['currencyCodeFrom', 'currencyCodeTo']
+
+
+class FxRateStore:
+    """
+    Resident copy of `fx_rates`, partitioned per pair, every partition is sorted by date.
+    Partitions are immutable frames and are replaced as a whole, so readers never see a partial update.
+    """
+
+    def __init__(self):
+        self._partitions: Dict[Pair, pl.DataFrame] = {}
+        self._stale: Set[Pair] = set()
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, rates: pl.DataFrame):
+        self._partitions = {pair: _sorted(df) for pair, df in _partition(rates).items()}
+        self._stale = set()
+        self._loaded = True
+
+    def upsert(self, rates: pl.DataFrame):
+        """
+        Merges written rates into their partitions, a new rate of an existing date replaces the old one
+        """
+        for pair, df in _partition(rates).items():
+            current = self._partitions.get(pair)
+            if current is not None:
+                df = pl.concat([current, df.select(current.columns)]).unique(subset=['date'], keep='last')
+            self._partitions[pair] = _sorted(df)
+
+    def invalidate_pair(self, currency_code_from: str, currency_code_to: str):
+        """
+        Marks the pair to be reloaded, when it's changed without passing its rates
+        """
+        self._stale.add((currency_code_from, currency_code_to))
+
+    def stale_pairs(self, pairs: Iterable[Pair]) -> List[Pair]:
+        return [pair for pair in pairs if pair in self._stale]
+
+    def replace_pair(self, currency_code_from: str, currency_code_to: str, rates: pl.DataFrame):
+        pair = (currency_code_from, currency_code_to)
+        self._partitions[pair] = _sorted(rates)
+        self._stale.discard(pair)
+
+    def get_rate_as_of(self, currency_code_from: str, currency_code_to: str, on_date: date) -> pl.DataFrame:
+        """
+        Returns the last known rate on or before `on_date` with binary search over the partition
+        """
+        partition = self._partitions.get((currency_code_from, currency_code_to))
+        if partition is None:
+            return rows_to_df([])
+        idx = partition.select(pl.col('date').search_sorted(on_date, side='right')).item()
+        return partition.slice(idx - 1, 1) if idx > 0 else partition.clear()
+
+    def get_rates(self,
+                  currency_code_from: str,
+                  currency_code_to: str,
+                  from_date: date,
+                  to_date: date) -> pl.DataFrame:
+        partition = self._partitions.get((currency_code_from, currency_code_to))
+        if partition is None:
+            return rows_to_df([])
+        start, end = partition.select(pl.col('date').search_sorted(from_date, side='left'),
+                                      pl.col('date').search_sorted(to_date, side='right').alias('end')).row(0)
+        return partition.slice(start, max(0, end - start))
+
+    def get_rates_against(self, currency_codes: Sequence[str], base_currency_code: str) -> pl.DataFrame:
+        """
+        Returns full history of every currency in `currency_codes` to and from `base_currency_code`
+        """
+        frames = [self._partitions[pair]
+                  for code in currency_codes
+                  for pair in ((code, base_currency_code), (base_currency_code, code))
+                  if pair in self._partitions]
+        return pl.concat(frames) if frames else rows_to_df([])
+
+    def __len__(self):
+        return sum(df.height for df in self._partitions.values())
+
+
+def _partition(rates: pl.DataFrame) -> Dict[Pair, pl.DataFrame]:
+    if rates.is_empty():
+        return {}
+    return rates.partition_by(_PAIR_COLUMNS, as_dict=True)
+
+
+def _sorted(df: pl.DataFrame) -> pl.DataFrame:
+    return df.sort('date').rechunk()
@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+import logging
+from datetime import date
+
+import aiohttp
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.aggregates import FxRateAggregateRepository
+from src.fx.gap_fill import FxFilledRateRefresher
+from src.fx.snapshot import parse_pair
+from src.fx.storage import open_rate_repository
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Recomputes weekly, monthly and yearly aggregates and persisted '
+                                                 'filled series from full history')
+    parser.add_argument('--pair', type=parse_pair, action='append', help='e.g. USD/EUR, may be repeated')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    engine = create_db_engine(config.database_cfg())
+    try:
+        session_factory = create_session_factory(engine)
+        async with aiohttp.ClientSession() as client_session:
+            async with open_rate_repository(config, session_factory, client_session) as rate_repository:
+                pairs = args.pair or await rate_repository.get_pairs()
+                written = await FxRateAggregateRepository(session_factory).rebuild(rate_repository, pairs)
+                logger.info('Wrote %d aggregates of %d pairs', written, len(pairs))
+                gap_fill_cfg = config.gap_fill_cfg()
+                if gap_fill_cfg.persist:
+                    refresher = FxFilledRateRefresher(gap_fill_cfg, rate_repository)
+                    for currency_code_from, currency_code_to in pairs:
+                        history = await rate_repository.get_rates(currency_code_from, currency_code_to,
+                                                                  date.min, date.max)
+                        async with session_factory.begin() as session:
+                            await refresher.refresh(session, history)
+                    logger.info('Rebuilt filled series of %d pairs', len(pairs))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
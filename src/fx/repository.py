@@ -0,0 +1,251 @@
+from datetime import date, datetime, time, timedelta
+from typing import Sequence, Any, Tuple, List, Optional, Union
+
+import polars as pl
+from sqlalchemy import select, or_, and_, tuple_, update, func, text, case
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from src.fx.metrics import DB_QUERY_SECONDS
+from src.fx.models import FxRate, FxTrackingPair
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+from src.fx.writer import bulk_upsert_rates, UpsertResult
+
+_DB_SCHEMA = {
+    'date': pl.Datetime,
+    'currencyCodeFrom': pl.String,
+    'currencyCodeTo': pl.String,
+    'rate': DECIMAL_MONEY_TYPE
+}
+
+_RATE_COLUMNS = (FxRate.date, FxRate.currency_code_from, FxRate.currency_code_to, FxRate.rate)
+
+# Skip scan over the pair-leading primary key: every step jumps to the next pair with one index probe
+# per partition instead of reading all rates
+_PAIRS_SQL = text("""
+WITH RECURSIVE pairs AS (
+    (SELECT currency_code_from, currency_code_to FROM fx_rates
+     ORDER BY currency_code_from, currency_code_to LIMIT 1)
+    UNION ALL
+    SELECT next.currency_code_from, next.currency_code_to
+    FROM pairs, LATERAL (
+        SELECT currency_code_from, currency_code_to FROM fx_rates
+        WHERE (currency_code_from, currency_code_to) > (pairs.currency_code_from, pairs.currency_code_to)
+        ORDER BY currency_code_from, currency_code_to LIMIT 1) AS next
+)
+SELECT currency_code_from, currency_code_to FROM pairs
+""")
+
+
+class FxRateRepository:
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+        self._session_factory = session_factory
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        return await self._fetch('rates', select_rates(currency_code_from, currency_code_to, from_date, to_date))
+
+    async def get_pairs(self) -> List[Tuple[str, str]]:
+        with DB_QUERY_SECONDS.labels(query='pairs').time():
+            async with self._session_factory() as session:
+                return [tuple(row) for row in (await session.execute(_PAIRS_SQL)).all()]
+
+    async def get_all_rates(self) -> pl.DataFrame:
+        stmt = select(*_RATE_COLUMNS).order_by(FxRate.currency_code_from, FxRate.currency_code_to, FxRate.date)
+        return await self._fetch('all_rates', stmt)
+
+    async def get_latest_rate(self,
+                              currency_code_from: str,
+                              currency_code_to: str,
+                              on_date: Optional[date] = None) -> pl.DataFrame:
+        """
+        Returns the last known rate on or before `on_date`, or the latest one if the date isn't set.
+        Partitions after `on_date` are pruned, the rest are scanned backwards from the latest one until a rate is found.
+        """
+        stmt = (select(*_RATE_COLUMNS)
+                .where(FxRate.currency_code_from == currency_code_from,
+                       FxRate.currency_code_to == currency_code_to)
+                .order_by(FxRate.date.desc())
+                .limit(1))
+        if on_date is not None:
+            stmt = stmt.where(FxRate.date <= datetime.combine(on_date, time.min))
+        return await self._fetch('latest_rate', stmt)
+
+    async def get_rates_for_pairs(self,
+                                  pairs: Sequence[Tuple[str, str]],
+                                  from_date: date,
+                                  to_date: date) -> pl.DataFrame:
+        stmt = (select(*_RATE_COLUMNS)
+                .where(tuple_(FxRate.currency_code_from, FxRate.currency_code_to).in_(pairs),
+                       FxRate.date >= datetime.combine(from_date, time.min),
+                       FxRate.date <= datetime.combine(to_date, time.min)))
+        return await self._fetch('rates_for_pairs', stmt)
+
+    async def get_rates_against(self,
+                                currency_codes: Sequence[str],
+                                base_currency_code: str,
+                                from_date: date,
+                                to_date: date) -> pl.DataFrame:
+        """
+        Loads rates of every currency in `currency_codes` to and from `base_currency_code` with one query
+        """
+        stmt = (select(*_RATE_COLUMNS)
+                .where(or_(and_(FxRate.currency_code_from.in_(currency_codes),
+                                FxRate.currency_code_to == base_currency_code),
+                           and_(FxRate.currency_code_from == base_currency_code,
+                                FxRate.currency_code_to.in_(currency_codes))),
+                       FxRate.date >= datetime.combine(from_date, time.min),
+                       FxRate.date <= datetime.combine(to_date, time.min)))
+        return await self._fetch('rates_against', stmt)
+
+    async def save_rates(self, rates: Union[pl.LazyFrame, pl.DataFrame]) -> UpsertResult:
+        async with self._session_factory.begin() as session:
+            return await bulk_upsert_rates(session, rates)
+
+    async def _fetch(self, query: str, stmt) -> pl.DataFrame:
+        with DB_QUERY_SECONDS.labels(query=query).time():
+            async with self._session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+        return rows_to_df(rows)
+
+
+class FxTrackingPairRepository:
+    """
+    Rates are written with the bulk writer in the same transaction as the state of the pair.
+    If `rate_repository` is set, e.g. a time-series store, rates are saved to it before the transaction,
+    so a failed state update only makes the rates to be fetched again.
+    Tables derived from rates, e.g. aggregates, are refreshed by `refreshers` in the same transaction
+    with the inserted and updated rates only.
+    """
+
+    def __init__(self,
+                 session_factory: async_sessionmaker[AsyncSession],
+                 rate_repository=None,
+                 refreshers: Sequence = ()):
+        self._session_factory = session_factory
+        self._rate_repository = rate_repository
+        self._refreshers = list(refreshers)
+
+    async def get_all(self) -> List[FxTrackingPair]:
+        async with self._session_factory() as session:
+            return list(await session.scalars(select(FxTrackingPair)))
+
+    async def save_sync_result(self,
+                               tracking_pair: FxTrackingPair,
+                               rates: pl.DataFrame,
+                               status: str,
+                               synced_at: datetime) -> UpsertResult:
+        """
+        Writes fetched rates and advances sync state of the pair in one transaction,
+        so a failed write never moves `last_rate_date` forward
+        """
+        last_rate_date: Optional[date] = rates.get_column('date').max() if not rates.is_empty() else None
+        values = {'last_sync_date': synced_at, 'last_sync_status': status}
+        if last_rate_date is not None:
+            values['last_rate_date'] = func.greatest(FxTrackingPair.last_rate_date,
+                                                     datetime.combine(last_rate_date, time.min))
+        external_result = await self._save_external_rates(rates)
+        async with self._session_factory.begin() as session:
+            result = external_result if external_result is not None else await bulk_upsert_rates(session, rates)
+            await self._refresh_derived(session, rates, result)
+            await session.execute(update(FxTrackingPair)
+                                  .where(FxTrackingPair.currency_code_from == tracking_pair.currency_code_from,
+                                         FxTrackingPair.currency_code_to == tracking_pair.currency_code_to)
+                                  .values(values))
+        return result
+
+    async def save_backfill_result(self,
+                                   currency_code_from: str,
+                                   currency_code_to: str,
+                                   rates: pl.DataFrame,
+                                   backfilled: Optional[Tuple[date, date]]) -> UpsertResult:
+        """
+        Writes backfilled rates and moves the backfill checkpoint of the pair in one transaction.
+        `backfilled` is the range loaded without gaps, it's merged into the checkpoint, if they overlap or adjoin,
+        otherwise it replaces the checkpoint.
+        """
+        values = {}
+        if not rates.is_empty():
+            values['last_rate_date'] = func.greatest(FxTrackingPair.last_rate_date,
+                                                     datetime.combine(rates.get_column('date').max(), time.min))
+        if backfilled is not None:
+            start, end = (datetime.combine(d, time.min) for d in backfilled)
+            adjoins = and_(FxTrackingPair.backfilled_from <= end + timedelta(days=1),
+                           FxTrackingPair.backfilled_to >= start - timedelta(days=1))
+            values['backfilled_from'] = case((adjoins, func.least(FxTrackingPair.backfilled_from, start)), else_=start)
+            values['backfilled_to'] = case((adjoins, func.greatest(FxTrackingPair.backfilled_to, end)), else_=end)
+        external_result = await self._save_external_rates(rates)
+        async with self._session_factory.begin() as session:
+            result = external_result if external_result is not None else await bulk_upsert_rates(session, rates)
+            await self._refresh_derived(session, rates, result)
+            if values:
+                await session.execute(update(FxTrackingPair)
+                                      .where(FxTrackingPair.currency_code_from == currency_code_from,
+                                             FxTrackingPair.currency_code_to == currency_code_to)
+                                      .values(values))
+        return result
+
+    async def save_rates(self, rates: pl.DataFrame) -> UpsertResult:
+        """
+        Writes rates, which aren't a result of a sync, e.g. of an imported snapshot, with refreshing derived tables.
+        State of pairs isn't changed.
+        """
+        external_result = await self._save_external_rates(rates)
+        async with self._session_factory.begin() as session:
+            result = external_result if external_result is not None else await bulk_upsert_rates(session, rates)
+            await self._refresh_derived(session, rates, result)
+        return result
+
+    async def _refresh_derived(self, session: AsyncSession, rates: pl.DataFrame, result: UpsertResult):
+        if result.inserted + result.updated == 0:
+            return
+        changed = result.changed_rates(rates)
+        for refresher in self._refreshers:
+            await refresher.refresh(session, changed)
+
+    async def _save_external_rates(self, rates: pl.DataFrame) -> Optional[UpsertResult]:
+        if self._rate_repository is None:
+            return None
+        return await self._rate_repository.save_rates(rates)
+
+
+async def read_locked_history(session: AsyncSession,
+                              rate_repository,
+                              written: pl.DataFrame,
+                              from_date: date,
+                              to_date: date) -> pl.DataFrame:
+    """
+    Reads rates of the pair of `written` from `from_date` to `to_date` to recompute tables derived from them.
+    The pair is locked until commit, so a concurrent transaction writing it reads history after this one
+    commits, instead of overwriting derived rows with ones computed from an older snapshot.
+    Rates are read in the transaction, or from `rate_repository`, if rates are kept elsewhere. Such a store,
+    e.g. QuestDB, may apply writes asynchronously, so `written` rates are merged into rates read from it.
+    """
+    pair = written.row(0, named=True)
+    currency_code_from, currency_code_to = pair['currencyCodeFrom'], pair['currencyCodeTo']
+    await session.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'),
+                          {'key': f'fx_rates:{currency_code_from}/{currency_code_to}'})
+    if rate_repository is None:
+        stmt = select_rates(currency_code_from, currency_code_to, from_date, to_date)
+        return rows_to_df((await session.execute(stmt)).all())
+    history = await rate_repository.get_rates(currency_code_from, currency_code_to, from_date, to_date)
+    return (pl.concat([history, written.select(history.columns).filter(pl.col('date').is_between(from_date, to_date))])
+            .unique(subset=['date'], keep='last')
+            .sort('date'))
+
+
+def select_rates(currency_code_from: str, currency_code_to: str, from_date: date, to_date: date):
+    return (select(*_RATE_COLUMNS)
+            .where(FxRate.currency_code_from == currency_code_from,
+                   FxRate.currency_code_to == currency_code_to,
+                   FxRate.date >= datetime.combine(from_date, time.min),
+                   FxRate.date <= datetime.combine(to_date, time.min))
+            .order_by(FxRate.date))
+
+
+def rows_to_df(rows: Sequence[Sequence[Any]]) -> pl.DataFrame:
+    return (pl.DataFrame(data=[tuple(r) for r in rows], schema=_DB_SCHEMA, orient='row')
+            .with_columns(pl.col('date').dt.date()))
@@ -1,3 +1,109 @@
-from fastapi import APIRouter
+from datetime import date
+from typing import List, Annotated, Optional, Literal
 
-router = APIRouter(prefix='/fx')
\ No newline at end of file
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, WebSocket, WebSocketException, status
+from fastapi.responses import StreamingResponse
+
+from src.fx.aggregates import FxRateAggregateRepository
+from src.fx.dependencies import get_fx_rates_service, get_fx_rate_aggregate_repository, get_fx_rate_broker
+from src.fx.formats import negotiate_media_type, frame_response, ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+from src.fx.schemas import FxRateDto, to_fx_rate_dtos, BatchConversionRequest, BatchConversionResponse, \
+    FxRateAggregateDto, to_fx_rate_aggregate_dtos
+from src.fx.service import FxRatesService
+from src.fx.stream import FxRateBroker, SSE_MEDIA_TYPE, parse_pairs, serve_websocket, sse_events
+
+router = APIRouter(prefix='/fx')
+
+CurrencyCode = Annotated[str, Query(min_length=3, max_length=3)]
+
+# Pairs as USD/EUR, the parameter is repeated for every pair
+StreamPairs = Annotated[List[str], Query(alias='pair', min_length=1)]
+
+
+@router.get('/rates',
+            response_model=List[FxRateDto],
+            response_model_exclude_none=True,
+            responses={200: {'content': {ARROW_STREAM_MEDIA_TYPE: {}, PARQUET_MEDIA_TYPE: {}}}})
+async def get_rates(currency_code_from: CurrencyCode,
+                    currency_code_to: CurrencyCode,
+                    from_date: date,
+                    to_date: date,
+                    fill: bool = False,
+                    accept: Annotated[Optional[str], Header()] = None,
+                    service: FxRatesService = Depends(get_fx_rates_service)):
+    if from_date > to_date:
+        raise HTTPException(status_code=422, detail='from_date must not be after to_date')
+    if fill:
+        df = await service.get_filled_rates(currency_code_from, currency_code_to, from_date, to_date)
+    else:
+        df = await service.get_rates(currency_code_from, currency_code_to, from_date, to_date)
+    # JSON is the default, Arrow and Parquet bodies are written straight from the frame
+    media_type = negotiate_media_type(accept)
+    if media_type is not None:
+        return frame_response(df, media_type)
+    return to_fx_rate_dtos(df)
+
+
+@router.get('/rates/aggregate', response_model=List[FxRateAggregateDto])
+async def get_rate_aggregates(currency_code_from: CurrencyCode,
+                              currency_code_to: CurrencyCode,
+                              period: Literal['week', 'month', 'year'],
+                              from_date: date,
+                              to_date: date,
+                              repository: FxRateAggregateRepository = Depends(get_fx_rate_aggregate_repository)):
+    if from_date > to_date:
+        raise HTTPException(status_code=422, detail='from_date must not be after to_date')
+    df = await repository.get_aggregates(currency_code_from.upper(), currency_code_to.upper(), period,
+                                         from_date, to_date)
+    return to_fx_rate_aggregate_dtos(df)
+
+
+@router.get('/rate', response_model=FxRateDto, response_model_exclude_none=True)
+async def get_rate(currency_code_from: CurrencyCode,
+                   currency_code_to: CurrencyCode,
+                   on_date: Annotated[date, Query(alias='date')],
+                   as_of: bool = False,
+                   fill: bool = False,
+                   service: FxRatesService = Depends(get_fx_rates_service)):
+    if fill:
+        df = await service.get_filled_rates(currency_code_from, currency_code_to, on_date, on_date)
+        df = None if df.is_empty() else df
+    elif as_of:
+        df = await service.get_rate_as_of(currency_code_from, currency_code_to, on_date)
+    else:
+        df = await service.get_rate(currency_code_from, currency_code_to, on_date)
+    if df is None:
+        raise HTTPException(status_code=404, detail='Rate not found')
+    return to_fx_rate_dtos(df)[0]
+
+
+@router.post('/convert/batch', response_model=BatchConversionResponse)
+async def convert_batch(request: BatchConversionRequest,
+                        service: FxRatesService = Depends(get_fx_rates_service)):
+    df = await service.convert_batch(request.to_df(), request.base_currency_code, request.as_of)
+    return BatchConversionResponse.from_df(request.base_currency_code, df)
+
+
+@router.get('/stream', response_class=StreamingResponse, responses={200: {'content': {SSE_MEDIA_TYPE: {}}}})
+async def stream_rates(pairs: StreamPairs, broker: FxRateBroker = Depends(get_fx_rate_broker)):
+    """
+    Server-sent events of rates of the pairs, as soon as they're written
+    """
+    try:
+        parsed_pairs = parse_pairs(pairs)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return StreamingResponse(sse_events(broker, parsed_pairs),
+                             media_type=SSE_MEDIA_TYPE,
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.websocket('/stream')
+async def stream_rates_ws(websocket: WebSocket,
+                          pairs: StreamPairs,
+                          broker: FxRateBroker = Depends(get_fx_rate_broker)):
+    try:
+        parsed_pairs = parse_pairs(pairs)
+    except ValueError as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+    await serve_websocket(websocket, broker, parsed_pairs)
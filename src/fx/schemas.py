@@ -0,0 +1,86 @@
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+import polars as pl
+from pydantic import BaseModel, Field, model_validator
+
+from src.fx.conversion import CONVERSION_SCHEMA
+
+
+class FxRateDto(BaseModel):
+    date: date
+    currency_code_from: str
+    currency_code_to: str
+    rate: Decimal
+    # Set only for gap-filled series, true if the rate is carried forward from an earlier day
+    filled: Optional[bool] = None
+
+
+def to_fx_rate_dtos(df: pl.DataFrame) -> List[FxRateDto]:
+    return [FxRateDto(date=r['date'],
+                      currency_code_from=r['currencyCodeFrom'],
+                      currency_code_to=r['currencyCodeTo'],
+                      rate=r['rate'],
+                      filled=r.get('filled'))
+            for r in df.iter_rows(named=True)]
+
+
+class FxRateAggregateDto(BaseModel):
+    period_start: date
+    currency_code_from: str
+    currency_code_to: str
+    period: str
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    mean: Decimal
+    count: int
+
+
+def to_fx_rate_aggregate_dtos(df: pl.DataFrame) -> List[FxRateAggregateDto]:
+    return [FxRateAggregateDto(period_start=r['periodStart'],
+                               currency_code_from=r['currencyCodeFrom'],
+                               currency_code_to=r['currencyCodeTo'],
+                               period=r['period'],
+                               open=r['open'],
+                               high=r['high'],
+                               low=r['low'],
+                               close=r['close'],
+                               mean=r['mean'],
+                               count=r['count'])
+            for r in df.iter_rows(named=True)]
+
+
+class BatchConversionRequest(BaseModel):
+    base_currency_code: str = Field(min_length=3, max_length=3)
+    amounts: List[Decimal]
+    currency_codes: List[str]
+    dates: List[date]
+    # If true, then the last known rate on or before the date is used
+    as_of: bool = False
+
+    @model_validator(mode='after')
+    def check_columns_have_same_length(self):
+        if not len(self.amounts) == len(self.currency_codes) == len(self.dates):
+            raise ValueError('amounts, currency_codes and dates must have the same length')
+        return self
+
+    def to_df(self) -> pl.DataFrame:
+        return pl.DataFrame({'amount': self.amounts,
+                             'currencyCode': self.currency_codes,
+                             'date': self.dates},
+                            schema=CONVERSION_SCHEMA)
+
+
+class BatchConversionResponse(BaseModel):
+    base_currency_code: str
+    rates: List[Optional[Decimal]]
+    converted_amounts: List[Optional[Decimal]]
+
+    @classmethod
+    def from_df(cls, base_currency_code: str, df: pl.DataFrame) -> 'BatchConversionResponse':
+        return cls(base_currency_code=base_currency_code.upper(),
+                   rates=df.get_column('rate').to_list(),
+                   converted_amounts=df.get_column('convertedAmount').to_list())
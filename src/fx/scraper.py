@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.metrics import SCRAPER_IN_FLIGHT, SCRAPER_QUEUE_DEPTH
+from src.fx.models import FxTrackingPair
+from src.fx.repository import FxTrackingPairRepository
+from src.fx.source.abstract_source import AbstractExchangeRatesSource
+from src.fx.source.factory import create_sources
+from src.fx.source.failover import FailoverExchangeRatesSource
+from src.fx.storage import create_tracking_pair_repository, open_rate_repository
+from src.fx.stream import create_notifier
+from src.fx.sync import PairSynchronizer, SyncResult, SYNC_STATUS_FAILED
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_source_names(tracking_pair: FxTrackingPair) -> List[str]:
+    """
+    `sources_config` keeps the ordered list of source names, e.g. {"sources": ["polygon_fiat", "alphavantage_fiat"]}
+    """
+    config = tracking_pair.sources_config or {}
+    return list(config.get('sources', []))
+
+
+def resolve_source(sources: Dict[str, AbstractExchangeRatesSource],
+                   tracking_pair: FxTrackingPair,
+                   hedge_delay_seconds: Optional[float] = None) -> Optional[AbstractExchangeRatesSource]:
+    """
+    Returns the only configured source supporting the pair, or a failover chain of them in the configured order
+    """
+    candidates = []
+    for name in resolve_source_names(tracking_pair):
+        source = sources.get(name)
+        if source is not None and source.is_pair_supported(tracking_pair.currency_code_from,
+                                                           tracking_pair.currency_code_to):
+            candidates.append((name, source))
+    if not candidates:
+        return None
+    if len(candidates) == 1:
+        return candidates[0][1]
+    return FailoverExchangeRatesSource(candidates, hedge_delay_seconds)
+
+
+class FxScraper:
+
+    def __init__(self,
+                 sources: Dict[str, AbstractExchangeRatesSource],
+                 tracking_pair_repository: FxTrackingPairRepository,
+                 synchronizer: PairSynchronizer,
+                 concurrency: int,
+                 hedge_delay_seconds: Optional[float] = None):
+        if concurrency <= 0:
+            raise ValueError('Concurrency must be positive')
+        self._sources = sources
+        self._tracking_pair_repository = tracking_pair_repository
+        self._synchronizer = synchronizer
+        self._concurrency = concurrency
+        self._hedge_delay_seconds = hedge_delay_seconds
+
+    async def run_once(self, today: Optional[date] = None) -> List[SyncResult]:
+        tracking_pairs = await self._tracking_pair_repository.get_all()
+        semaphore = asyncio.Semaphore(self._concurrency)
+        SCRAPER_QUEUE_DEPTH.set(len(tracking_pairs))
+
+        async def sync(tracking_pair: FxTrackingPair) -> SyncResult:
+            async with semaphore:
+                SCRAPER_QUEUE_DEPTH.dec()
+                SCRAPER_IN_FLIGHT.inc()
+                try:
+                    return await self._sync_pair(tracking_pair, today)
+                finally:
+                    SCRAPER_IN_FLIGHT.dec()
+
+        try:
+            results = await asyncio.gather(*(sync(p) for p in tracking_pairs))
+        finally:
+            SCRAPER_QUEUE_DEPTH.set(0)
+        failed = sum(1 for r in results if r.status == SYNC_STATUS_FAILED)
+        logger.info('Synced %d pairs, %d failed', len(results), failed)
+        return list(results)
+
+    async def run_forever(self, interval_seconds: int):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception('Scraper run failed')
+            await asyncio.sleep(interval_seconds)
+
+    async def _sync_pair(self, tracking_pair: FxTrackingPair, today: Optional[date]) -> SyncResult:
+        source = resolve_source(self._sources, tracking_pair, self._hedge_delay_seconds)
+        if source is None:
+            logger.warning('No source configured for %s/%s',
+                           tracking_pair.currency_code_from, tracking_pair.currency_code_to)
+            return SyncResult(tracking_pair.currency_code_from, tracking_pair.currency_code_to, SYNC_STATUS_FAILED, 0)
+        return await self._synchronizer.sync_pair(source, tracking_pair, today)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fetches rates of all tracking pairs')
+    parser.add_argument('--forever', action='store_true', help='Keep syncing with configured interval')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    engine = create_db_engine(config.database_cfg())
+    try:
+        async with aiohttp.ClientSession() as client_session:
+            session_factory = create_session_factory(engine)
+            async with open_rate_repository(config, session_factory, client_session) as rate_repository:
+                tracking_pair_repository = create_tracking_pair_repository(session_factory,
+                                                                           rate_repository,
+                                                                           config.gap_fill_cfg(),
+                                                                           create_notifier(config.stream_cfg()))
+                scraper = FxScraper(create_sources(config, client_session),
+                                    tracking_pair_repository,
+                                    PairSynchronizer(tracking_pair_repository),
+                                    config.scraper_cfg().concurrency,
+                                    config.failover_cfg().hedge_delay_seconds)
+                if args.forever:
+                    await scraper.run_forever(config.scraper_cfg().interval_seconds)
+                else:
+                    await scraper.run_once()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Iterable, Tuple, Optional
+
+import polars as pl
+
+from src.config import GapFillConfig
+from src.fx.cache import FxRatesCache, FxRatesCacheKey
+from src.fx.conversion import convert_to_base
+from src.fx.gap_fill import FxFilledRateRepository, fill_gaps, lookback_start
+from src.fx.metrics import COLLECT_SECONDS
+from src.fx.rate_store import FxRateStore
+from src.fx.repository import FxRateRepository, rows_to_df
+from src.fx.triangulation import TriangulationEngine
+
+
+class FxRatesService:
+
+    def __init__(self,
+                 repository: FxRateRepository,
+                 cache: FxRatesCache,
+                 triangulation: Optional[TriangulationEngine] = None,
+                 rate_store: Optional[FxRateStore] = None,
+                 gap_fill_cfg: GapFillConfig = GapFillConfig(),
+                 filled_rate_repository: Optional[FxFilledRateRepository] = None):
+        self._repository = repository
+        self._cache = cache
+        self._triangulation = triangulation
+        self._rate_store = rate_store
+        self._gap_fill_cfg = gap_fill_cfg
+        self._filled_rate_repository = filled_rate_repository
+
+    async def load_rate_store(self):
+        if self._rate_store is not None:
+            self._rate_store.load(await self._repository.get_all_rates())
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        key = FxRatesCacheKey(currency_code_from.upper(), currency_code_to.upper(), from_date, to_date)
+        df = self._cache.get(key)
+        if df is None:
+            generation = self._cache.generation(key.currency_code_from, key.currency_code_to)
+            if await self._rate_store_ready((key.currency_code_from, key.currency_code_to)):
+                df = self._rate_store.get_rates(key.currency_code_from, key.currency_code_to, from_date, to_date)
+            else:
+                df = await self._repository.get_rates(key.currency_code_from, key.currency_code_to,
+                                                      from_date, to_date)
+            if df.is_empty():
+                df = await self._get_cross_rates(key)
+            self._cache.put(key, df, generation)
+        return df
+
+    async def get_filled_rates(self,
+                               currency_code_from: str,
+                               currency_code_to: str,
+                               from_date: date,
+                               to_date: date) -> pl.DataFrame:
+        """
+        Daily rates, where days without a rate carry the last one forward up to the staleness limit
+        and are flagged as filled. Persisted series are read, if they're kept and have every day of the range,
+        otherwise, e.g. for cross rates or days past the staleness limit, rates are filled on the fly.
+        """
+        if self._filled_rate_repository is not None:
+            df = await self._filled_rate_repository.get_rates(currency_code_from.upper(), currency_code_to.upper(),
+                                                              from_date, to_date)
+            if df.height == (to_date - from_date).days + 1:
+                return df
+        rates = await self.get_rates(currency_code_from, currency_code_to,
+                                     lookback_start(from_date, self._gap_fill_cfg), to_date)
+        with COLLECT_SECONDS.labels(stage='gap_fill').time():
+            return await fill_gaps(rates.lazy(), from_date, to_date, self._gap_fill_cfg).collect_async()
+
+    async def get_rate(self,
+                       currency_code_from: str,
+                       currency_code_to: str,
+                       on_date: date) -> Optional[pl.DataFrame]:
+        df = await self.get_rates(currency_code_from, currency_code_to, on_date, on_date)
+        return None if df.is_empty() else df
+
+    async def get_rate_as_of(self,
+                             currency_code_from: str,
+                             currency_code_to: str,
+                             on_date: date) -> Optional[pl.DataFrame]:
+        """
+        Returns the last known rate on or before `on_date`, e.g. the Friday rate for a Sunday
+        """
+        currency_code_from, currency_code_to = currency_code_from.upper(), currency_code_to.upper()
+        if await self._rate_store_ready((currency_code_from, currency_code_to)):
+            df = self._rate_store.get_rate_as_of(currency_code_from, currency_code_to, on_date)
+        else:
+            df = await self._repository.get_latest_rate(currency_code_from, currency_code_to, on_date)
+        return None if df.is_empty() else df
+
+    def on_rates_written(self, pairs: Iterable[Tuple[str, str]], rates: Optional[pl.DataFrame] = None):
+        """
+        `rates` are the written rows of `pairs`, the rate store is reloaded lazily if they aren't passed
+        """
+        pairs = list(pairs)
+        if self._rate_store is not None:
+            if rates is not None:
+                self._rate_store.upsert(rates.with_columns(pl.col('currencyCodeFrom', 'currencyCodeTo')
+                                                           .str.to_uppercase()))
+            else:
+                for currency_code_from, currency_code_to in pairs:
+                    self._rate_store.invalidate_pair(currency_code_from.upper(), currency_code_to.upper())
+        for currency_code_from, currency_code_to in pairs:
+            self._cache.invalidate_pair(currency_code_from.upper(), currency_code_to.upper())
+            if self._triangulation is not None:
+                for dependent_from, dependent_to in self._triangulation.dependent_pairs(currency_code_from,
+                                                                                        currency_code_to):
+                    self._cache.invalidate_pair(dependent_from, dependent_to)
+
+    async def _get_cross_rates(self, key: FxRatesCacheKey) -> pl.DataFrame:
+        if self._triangulation is None:
+            return rows_to_df([])
+        path = self._triangulation.find_path(key.currency_code_from, key.currency_code_to)
+        if not path or (len(path) == 1 and not path[0].inverted):
+            return rows_to_df([])
+        legs = await self._repository.get_rates_for_pairs([hop.stored_pair() for hop in path], key.from_date, key.to_date)
+        with COLLECT_SECONDS.labels(stage='triangulation').time():
+            return await self._triangulation.derive_rates(path, legs.lazy()).sort('date').collect_async()
+
+    async def convert_batch(self, amounts: pl.DataFrame, base_currency_code: str, as_of: bool = False) \
+            -> pl.DataFrame:
+        base = base_currency_code.upper()
+        if amounts.is_empty():
+            return convert_to_base(amounts.lazy(), rows_to_df([]).lazy(), base, as_of).collect()
+        currency_codes = amounts.get_column('currencyCode').str.to_uppercase().unique().to_list()
+        pairs = [pair for code in currency_codes for pair in ((code, base), (base, code))]
+        if await self._rate_store_ready(*pairs):
+            rates = self._rate_store.get_rates_against(currency_codes, base)
+        else:
+            from_date = amounts.get_column('date').min()
+            rates = await self._repository.get_rates_against(currency_codes, base, from_date,
+                                                             amounts.get_column('date').max())
+            if as_of:
+                # As-of rates of a weekend or holiday at the start need the last rate before it,
+                # it's looked up per pair, so the history before the batch isn't read
+                previous = await asyncio.gather(*(self._repository.get_latest_rate(currency_code_from,
+                                                                                   currency_code_to,
+                                                                                   from_date - timedelta(days=1))
+                                                  for currency_code_from, currency_code_to in dict.fromkeys(pairs)))
+                rates = pl.concat([*previous, rates])
+        with COLLECT_SECONDS.labels(stage='conversion').time():
+            return await convert_to_base(amounts.lazy(), rates.lazy(), base, as_of).collect_async()
+
+    async def _rate_store_ready(self, *pairs: Tuple[str, str]) -> bool:
+        """
+        Checks if the rate store can serve `pairs`, stale pairs are reloaded before that
+        """
+        if self._rate_store is None or not self._rate_store.loaded:
+            return False
+        for currency_code_from, currency_code_to in self._rate_store.stale_pairs(pairs):
+            self._rate_store.replace_pair(currency_code_from,
+                                          currency_code_to,
+                                          await self._repository.get_rates(currency_code_from, currency_code_to,
+                                                                           date.min, date.max))
+        return True
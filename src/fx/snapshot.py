@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import glob
+import logging
+import os
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+import aiohttp
+import polars as pl
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.repository import FxRateRepository, FxTrackingPairRepository, rows_to_df
+from src.fx.storage import create_tracking_pair_repository, open_rate_repository
+from src.fx.stream import create_notifier
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.writer import UpsertResult
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'rates.parquet'
+
+# Pair columns aren't stored in files, they come from hive partition directories
+_HIVE_SCHEMA = {'currencyCodeFrom': pl.String, 'currencyCodeTo': pl.String}
+
+
+def pair_path(directory: str, currency_code_from: str, currency_code_to: str) -> str:
+    return os.path.join(directory,
+                        f'currencyCodeFrom={currency_code_from}',
+                        f'currencyCodeTo={currency_code_to}',
+                        SNAPSHOT_FILE)
+
+
+def scan_snapshot(directory: str, pairs: Optional[Sequence[Tuple[str, str]]] = None) -> pl.LazyFrame:
+    """
+    Lazily reads rates (SCHEMA) of `pairs` or of all pairs. Files are memory-mapped by polars,
+    filters on date are pushed down to row group statistics.
+    """
+    if pairs is None:
+        paths = sorted(glob.glob(pair_path(directory, '*', '*')))
+    else:
+        paths = [path for path in (pair_path(directory, f, t) for f, t in pairs) if os.path.exists(path)]
+    if not paths:
+        return rows_to_df([]).lazy()
+    return (pl.scan_parquet(paths, hive_partitioning=True, hive_schema=_HIVE_SCHEMA)
+            .select(SCHEMA))
+
+
+async def export_snapshot(repository: FxRateRepository,
+                          directory: str,
+                          pairs: Optional[Sequence[Tuple[str, str]]] = None,
+                          from_date: Optional[date] = None,
+                          to_date: Optional[date] = None) -> int:
+    """
+    Writes rates into `directory` partitioned by pair, one pair is loaded at a time.
+    Rates of already exported pairs are replaced within [from_date, to_date] only.
+    Returns the number of written rows.
+    """
+    pairs = pairs if pairs is not None else await repository.get_pairs()
+    window = (from_date or date.min, to_date or date.max) if from_date or to_date else None
+    written = 0
+    for currency_code_from, currency_code_to in pairs:
+        rates = await repository.get_rates(currency_code_from, currency_code_to,
+                                           from_date or date.min, to_date or date.max)
+        if rates.is_empty():
+            continue
+        await asyncio.to_thread(_write_pair, pair_path(directory, currency_code_from, currency_code_to), rates,
+                                window)
+        written += rates.height
+    return written
+
+
+async def import_snapshot(repository: FxTrackingPairRepository, directory: str) -> UpsertResult:
+    """
+    Upserts rates of the snapshot pair by pair, so only one pair is kept in memory.
+    Rates are written by the tracking pair repository, so its refreshers update aggregates, filled series
+    and notify streams about imported rates.
+    """
+    inserted, updated = 0, 0
+    for path in sorted(glob.glob(pair_path(directory, '*', '*'))):
+        rates = await (pl.scan_parquet(path, hive_partitioning=True, hive_schema=_HIVE_SCHEMA)
+                       .select(SCHEMA)
+                       .collect_async())
+        result = await repository.save_rates(rates)
+        inserted += result.inserted
+        updated += result.updated
+    return UpsertResult(inserted, updated)
+
+
+class ParquetFxRateRepository:
+    """
+    Serves reads of FxRateRepository from a local snapshot, e.g. for read-only replicas
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    async def get_pairs(self) -> List[Tuple[str, str]]:
+        df = await scan_snapshot(self._directory).select(list(_HIVE_SCHEMA)).unique().collect_async()
+        return list(df.iter_rows())
+
+    async def get_rates(self,
+                        currency_code_from: str,
+                        currency_code_to: str,
+                        from_date: date,
+                        to_date: date) -> pl.DataFrame:
+        return await (scan_snapshot(self._directory, [(currency_code_from, currency_code_to)])
+                      .filter(pl.col('date').is_between(from_date, to_date))
+                      .sort('date')
+                      .collect_async())
+
+    async def get_all_rates(self) -> pl.DataFrame:
+        return await scan_snapshot(self._directory).collect_async()
+
+    async def get_latest_rate(self,
+                              currency_code_from: str,
+                              currency_code_to: str,
+                              on_date: Optional[date] = None) -> pl.DataFrame:
+        lf = scan_snapshot(self._directory, [(currency_code_from, currency_code_to)])
+        if on_date is not None:
+            lf = lf.filter(pl.col('date') <= on_date)
+        return await lf.sort('date').tail(1).collect_async()
+
+    async def get_rates_for_pairs(self,
+                                  pairs: Sequence[Tuple[str, str]],
+                                  from_date: date,
+                                  to_date: date) -> pl.DataFrame:
+        return await (scan_snapshot(self._directory, pairs)
+                      .filter(pl.col('date').is_between(from_date, to_date))
+                      .collect_async())
+
+    async def get_rates_against(self,
+                                currency_codes: Sequence[str],
+                                base_currency_code: str,
+                                from_date: date,
+                                to_date: date) -> pl.DataFrame:
+        pairs = [pair for code in currency_codes for pair in ((code, base_currency_code), (base_currency_code, code))]
+        return await self.get_rates_for_pairs(pairs, from_date, to_date)
+
+
+def _write_pair(path: str, rates: pl.DataFrame, window: Optional[Tuple[date, date]] = None):
+    """
+    If `rates` are of a `window` only, rates of the existing file out of the window are kept
+    """
+    lf = rates.lazy().select('date', 'rate')
+    if window is not None and os.path.exists(path):
+        kept = pl.scan_parquet(path).select('date', 'rate').filter(~pl.col('date').is_between(*window))
+        lf = pl.concat([kept, lf])
+    # Readers of the snapshot see either the old or the new file of the pair
+    tmp_path = f'{path}.tmp'
+    lf.sort('date').sink_parquet(tmp_path, mkdir=True)
+    os.replace(tmp_path, path)
+
+
+def parse_pair(value: str) -> Tuple[str, str]:
+    currency_code_from, _, currency_code_to = value.upper().partition('/')
+    if not currency_code_from or not currency_code_to:
+        raise argparse.ArgumentTypeError(f"Pair '{value}' must look like USD/EUR")
+    return currency_code_from, currency_code_to
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Exports and imports Parquet snapshots of fx_rates')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Write rates into a snapshot')
+    export_parser.add_argument('directory')
+    export_parser.add_argument('--pair', type=parse_pair, action='append', help='e.g. USD/EUR, may be repeated')
+    export_parser.add_argument('--from-date', type=date.fromisoformat)
+    export_parser.add_argument('--to-date', type=date.fromisoformat)
+    import_parser = subparsers.add_parser('import', help='Upsert rates of a snapshot')
+    import_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config()
+    engine = create_db_engine(config.database_cfg())
+    try:
+        async with aiohttp.ClientSession() as client_session:
+            session_factory = create_session_factory(engine)
+            async with open_rate_repository(config, session_factory, client_session) as repository:
+                if args.command == 'export':
+                    rows = await export_snapshot(repository, args.directory, args.pair, args.from_date, args.to_date)
+                    logger.info('Exported %d rates into %s', rows, args.directory)
+                else:
+                    tracking_pair_repository = create_tracking_pair_repository(session_factory,
+                                                                               repository,
+                                                                               config.gap_fill_cfg(),
+                                                                               create_notifier(config.stream_cfg()))
+                    result = await import_snapshot(tracking_pair_repository, args.directory)
+                    logger.info('Imported rates from %s: %d inserted, %d updated',
+                                args.directory, result.inserted, result.updated)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -20,6 +20,9 @@ class AbstractExchangeRatesSource(ABC):
                                  to_date: date) -> pl.LazyFrame:
         pass
 
+    def supported_pairs(self) -> Dict[str, set[str]]:
+        return self._supported_pairs or {}
+
     def is_pair_supported(self, from_currency_code: str, to_currency_code: str) -> bool:
         fcc = from_currency_code.lower()
         tcc = to_currency_code.lower()
@@ -1,16 +1,38 @@
-from datetime import date
-from decimal import Decimal
-from typing import Dict, Any
+import re
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
 
 import polars as pl
 
 from src.config import AlphavantageConfig
 from src.fx.currency_helpers import is_crypto, is_fiat
+from src.fx.metrics import PARSE_SECONDS, PARSED_ROWS, UPSTREAM_FETCH_SECONDS
 from src.fx.source.abstract_source import AbstractExchangeRatesSource, create_empty_df, DECIMAL_MONEY_TYPE
+from src.fx.source.parsing import to_money
+from src.fx.source.response_cache import ResponseCache
+from src.fx.source.streaming import CHUNK_SIZE, ColumnarBuffer, decode_object
+from src.fx.source.upstream import RateLimiterRegistry, UpstreamClient, UpstreamError, UpstreamThrottledError, \
+    create_upstream_client
+
+PROVIDER = 'alphavantage'
+
+# Compact output contains the latest 100 data points, which covers at least 100 calendar days including today,
+# i.e. back to today - 99 days
+COMPACT_OUTPUT_MAX_DAYS = 100
+
+TIME_SERIES_KEY_PREFIX = 'Time Series'
+_TIME_SERIES_SCHEMA = {'date': pl.String, 'rate': pl.String}
+
+# e.g. "Our standard API rate limit is 25 requests per day" or "API call frequency is 5 calls per minute"
+_RATE_LIMIT_MESSAGE = re.compile(r'rate limit|call frequency', re.IGNORECASE)
 
 
 class AlphavantageFiatExchangeRatesSource(AbstractExchangeRatesSource):
-    def __init__(self, config: AlphavantageConfig, client_session):
+    def __init__(self,
+                 config: AlphavantageConfig,
+                 client_session,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None):
         super().__init__({
             'usd': {
                 'rub',
@@ -26,7 +48,8 @@ class AlphavantageFiatExchangeRatesSource(AbstractExchangeRatesSource):
             }
         })
         self._config = config
-        self._client_session = client_session
+        self._upstream = create_upstream_client(PROVIDER, config, client_session, rate_limiters,
+                                                response_cache)
 
     async def get_exchange_rates(self,
                                  from_currency_code: str,
@@ -36,12 +59,18 @@ class AlphavantageFiatExchangeRatesSource(AbstractExchangeRatesSource):
         url = (self._config.fiat_url_pattern
                .format(curr_from=from_currency_code,
                        curr_to=to_currency_code,
-                       key=self._config.api_key))
-        return await _get_fx_rates(self._client_session, url, from_currency_code, to_currency_code)
+                       key=self._config.api_key,
+                       output_size=resolve_output_size(from_date)))
+        return await _get_fx_rates(self._upstream, url, from_currency_code, to_currency_code,
+                                   from_date, to_date, self._config.stream_responses)
 
 
 class AlphavantageCryptoExchangeRatesSource(AbstractExchangeRatesSource):
-    def __init__(self, config: AlphavantageConfig, client_session):
+    def __init__(self,
+                 config: AlphavantageConfig,
+                 client_session,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None):
         super().__init__({
             'usd': {
                 'btc',
@@ -50,7 +79,8 @@ class AlphavantageCryptoExchangeRatesSource(AbstractExchangeRatesSource):
             }
         })
         self._config = config
-        self._client_session = client_session
+        self._upstream = create_upstream_client(PROVIDER, config, client_session, rate_limiters,
+                                                response_cache)
 
     async def get_exchange_rates(self,
                                  from_currency_code: str,
@@ -61,14 +91,18 @@ class AlphavantageCryptoExchangeRatesSource(AbstractExchangeRatesSource):
             url = self._config.crypto_url_pattern.format(
                 symbol=from_currency_code,
                 market=to_currency_code,
-                key=self._config.api_key)
-            return await _get_fx_rates(self._client_session, url, from_currency_code, to_currency_code)
+                key=self._config.api_key,
+                output_size=resolve_output_size(from_date))
+            return await _get_fx_rates(self._upstream, url, from_currency_code, to_currency_code,
+                                       from_date, to_date, self._config.stream_responses)
         elif is_fiat(from_currency_code) and is_crypto(to_currency_code):
             url = self._config.crypto_url_pattern.format(
                 symbol=to_currency_code,
                 market=from_currency_code,
-                key=self._config.api_key)
-            pldf: pl.LazyFrame = await _get_fx_rates(self._client_session, url, to_currency_code, from_currency_code)
+                key=self._config.api_key,
+                output_size=resolve_output_size(from_date))
+            pldf: pl.LazyFrame = await _get_fx_rates(self._upstream, url, to_currency_code, from_currency_code,
+                                                     from_date, to_date, self._config.stream_responses)
             return pldf.select(date=pl.col('date'),
                                currencyCodeFrom=pl.col('currencyCodeTo'),
                                currencyCodeTo=pl.col('currencyCodeFrom'),
@@ -76,35 +110,93 @@ class AlphavantageCryptoExchangeRatesSource(AbstractExchangeRatesSource):
         return create_empty_df()
 
 
-async def _get_fx_rates(client_session,
+def resolve_output_size(from_date: date) -> str:
+    if from_date > date.today() - timedelta(days=COMPACT_OUTPUT_MAX_DAYS):
+        return 'compact'
+    return 'full'
+
+
+async def _get_fx_rates(upstream: UpstreamClient,
                         url: str,
                         from_currency_code: str,
-                        to_currency_code: str) -> pl.LazyFrame:
-    async with client_session.get(url) as response:
-        if response.status == 200:
-            data = await response.json()
-            return _parse_response(data, from_currency_code, to_currency_code)
-        else:
-            return create_empty_df()
+                        to_currency_code: str,
+                        from_date: date,
+                        to_date: date,
+                        stream: bool = False) -> pl.LazyFrame:
+    ticker = f'{from_currency_code}{to_currency_code}'
+    with UPSTREAM_FETCH_SECONDS.labels(provider=PROVIDER, ticker=ticker).time():
+        if stream:
+            df = await upstream.get(url, lambda response: _stream_time_series(response, from_date, to_date),
+                                    to_date, ticker)
+            return _to_rates_lf(df, from_currency_code, to_currency_code)
+        data = await upstream.get(url, _read_time_series_json, to_date, ticker)
+        with PARSE_SECONDS.labels(provider=PROVIDER).time():
+            return _parse_response(data, from_currency_code, to_currency_code, from_date, to_date)
+
+
+async def _read_time_series_json(response) -> Dict[str, Any]:
+    """
+    A message instead of time series raises in the upstream client, so throttling is retried and isn't cached
+    """
+    data = await response.json()
+    _find_time_series_key(data)
+    return data
 
 
 def _parse_response(data: Dict[str, Any],
                     from_currency_code: str,
-                    to_currency_code: str) -> pl.LazyFrame:
-    key = _find_time_series_key(data)
-    converted_data = []
-    for k, v in data[key].items():
-        converted_data.append([k, Decimal(v["4. close"])])
-    return (pl.LazyFrame(data=converted_data, schema=['date', 'rate'], orient='row')
+                    to_currency_code: str,
+                    from_date: date,
+                    to_date: date) -> pl.LazyFrame:
+    time_series = data[_find_time_series_key(data)]
+    # ISO dates are compared as strings, so rows out of the window are dropped before casting
+    df = (pl.DataFrame({'date': list(time_series.keys()),
+                        'rate': [v['4. close'] for v in time_series.values()]},
+                       schema=_TIME_SERIES_SCHEMA)
+          .filter(pl.col('date').is_between(pl.lit(from_date.isoformat()), pl.lit(to_date.isoformat()))))
+    return _to_rates_lf(df, from_currency_code, to_currency_code)
+
+
+async def _stream_time_series(response, from_date: date, to_date: date) -> pl.DataFrame:
+    """
+    Decodes time series entry by entry and keeps only entries of the requested window,
+    so memory doesn't depend on the length of history returned by full output
+    """
+    buffer = ColumnarBuffer(_TIME_SERIES_SCHEMA)
+    window_start, window_end = from_date.isoformat(), to_date.isoformat()
+
+    def on_entry(day: str, values: Dict[str, str]):
+        if window_start <= day <= window_end:
+            buffer.append(day, values['4. close'])
+
+    data = await decode_object(response.content.iter_chunked(CHUNK_SIZE),
+                               lambda key: key.startswith(TIME_SERIES_KEY_PREFIX),
+                               on_entry)
+    # Raises if there is no time series, e.g. quota is exceeded
+    _find_time_series_key(data)
+    return buffer.to_frame()
+
+
+def _to_rates_lf(df: pl.DataFrame, from_currency_code: str, to_currency_code: str) -> pl.LazyFrame:
+    PARSED_ROWS.labels(provider=PROVIDER).inc(df.height)
+    return (df.with_columns(to_money(df.get_column('rate')))
+            .lazy()
             .select(pl.col('date').str.to_date('%Y-%m-%d'),
                     pl.lit(from_currency_code).alias('currencyCodeFrom'),
                     pl.lit(to_currency_code).alias('currencyCodeTo'),
-                    pl.col('rate').cast(DECIMAL_MONEY_TYPE)))
+                    pl.col('rate')))
 
 
 def _find_time_series_key(data: Dict[str, Any]) -> str:
-    expected_key = 'Time Series'
+    expected_key = TIME_SERIES_KEY_PREFIX
     for k, _ in data.items():
         if k.startswith(expected_key):
             return k
+    # Alphavantage reports errors with 200 status and a message instead of data. Exceeded quota is one of them,
+    # invalid API keys and premium endpoints are reported the same way, but they won't pass with time.
+    message = data.get('Note') or data.get('Information') or data.get('Error Message')
+    if message is not None:
+        if _RATE_LIMIT_MESSAGE.search(message):
+            raise UpstreamThrottledError(message)
+        raise UpstreamError(message)
     raise ValueError("Key, which starts with '%s' not found" % expected_key)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from datetime import date
+from typing import Callable, Dict, Tuple
+
+import polars as pl
+
+from src.fx.metrics import CACHE_REQUESTS
+from src.fx.source.abstract_source import AbstractExchangeRatesSource
+
+_RequestKey = Tuple[str, str, date, date]
+
+
+class CoalescingExchangeRatesSource(AbstractExchangeRatesSource):
+    """
+    Wraps a source, so concurrent identical requests share one upstream call and one collected frame.
+    Successful results are reused for `result_ttl_seconds`, errors are propagated to every waiter
+    and never reused. Cancellation of a waiter doesn't cancel the shared fetch.
+    """
+
+    def __init__(self,
+                 source: AbstractExchangeRatesSource,
+                 result_ttl_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(source.supported_pairs())
+        self._source = source
+        self._result_ttl_seconds = result_ttl_seconds
+        self._clock = clock
+        self._in_flight: Dict[_RequestKey, asyncio.Task] = {}
+        self._results: Dict[_RequestKey, Tuple[float, pl.DataFrame]] = {}
+
+    async def get_exchange_rates(self,
+                                 from_currency_code: str,
+                                 to_currency_code: str,
+                                 from_date: date,
+                                 to_date: date) -> pl.LazyFrame:
+        key = (from_currency_code.upper(), to_currency_code.upper(), from_date, to_date)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > self._clock():
+            CACHE_REQUESTS.labels(cache='coalescing', result='hit').inc()
+            return cached[1].lazy()
+        task = self._in_flight.get(key)
+        # Joining a fetch in flight is a hit as well, only the first caller goes upstream
+        CACHE_REQUESTS.labels(cache='coalescing', result='hit' if task is not None else 'miss').inc()
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, from_currency_code, to_currency_code, from_date, to_date))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_fetch_done(key, t))
+        df = await asyncio.shield(task)
+        return df.lazy()
+
+    async def _fetch(self,
+                     key: _RequestKey,
+                     from_currency_code: str,
+                     to_currency_code: str,
+                     from_date: date,
+                     to_date: date) -> pl.DataFrame:
+        pldf = await self._source.get_exchange_rates(from_currency_code, to_currency_code, from_date, to_date)
+        df = await pldf.collect_async()
+        if self._result_ttl_seconds > 0:
+            now = self._clock()
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            self._results[key] = (now + self._result_ttl_seconds, df)
+        return df
+
+    def _on_fetch_done(self, key: _RequestKey, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Marks the exception as retrieved, all waiters could be cancelled already
+        if not task.cancelled():
+            task.exception()
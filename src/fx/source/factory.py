@@ -0,0 +1,39 @@
+from typing import Dict
+
+from src.config import AbstractServiceConfig
+from src.fx.source.abstract_source import AbstractExchangeRatesSource
+from src.fx.source.alphavantage import AlphavantageFiatExchangeRatesSource, AlphavantageCryptoExchangeRatesSource
+from src.fx.source.coalescing import CoalescingExchangeRatesSource
+from src.fx.source.response_cache import ResponseCache
+from src.fx.source.upstream import RateLimiterRegistry
+from src.fx.source.polygon import PolygonFiatExchangeRatesSource, PolygonCryptoExchangeRatesSource
+
+ALPHAVANTAGE_FIAT = 'alphavantage_fiat'
+ALPHAVANTAGE_CRYPTO = 'alphavantage_crypto'
+POLYGON_FIAT = 'polygon_fiat'
+POLYGON_CRYPTO = 'polygon_crypto'
+
+# Sources, which fetch the whole history for any range, except one starting within the latest 100 days
+WHOLE_HISTORY_SOURCES = frozenset({ALPHAVANTAGE_FIAT, ALPHAVANTAGE_CRYPTO})
+
+
+def create_sources(config: AbstractServiceConfig,
+                   client_session,
+                   quota_share: float = 1.0) -> Dict[str, AbstractExchangeRatesSource]:
+    alphavantage_cfg = config.alphavantage_cfg()
+    polygon_cfg = config.polygon_cfg()
+    result_ttl_seconds = config.coalescing_cfg().result_ttl_seconds
+    response_cache_cfg = config.response_cache_cfg()
+    response_cache = ResponseCache(response_cache_cfg.directory, response_cache_cfg.live_ttl_seconds) \
+        if response_cache_cfg.enabled else None
+    # Fiat and crypto sources of a provider share the same quota
+    rate_limiters = RateLimiterRegistry(quota_share)
+    sources = {
+        ALPHAVANTAGE_FIAT: AlphavantageFiatExchangeRatesSource(alphavantage_cfg, client_session, rate_limiters,
+                                                               response_cache),
+        ALPHAVANTAGE_CRYPTO: AlphavantageCryptoExchangeRatesSource(alphavantage_cfg, client_session, rate_limiters,
+                                                                   response_cache),
+        POLYGON_FIAT: PolygonFiatExchangeRatesSource(polygon_cfg, client_session, rate_limiters, response_cache),
+        POLYGON_CRYPTO: PolygonCryptoExchangeRatesSource(polygon_cfg, client_session, rate_limiters, response_cache),
+    }
+    return {name: CoalescingExchangeRatesSource(source, result_ttl_seconds) for name, source in sources.items()}
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+from src.fx.metrics import FAILOVER_ATTEMPTS
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, create_empty_df
+
+logger = logging.getLogger(__name__)
+
+
+class FailoverExchangeRatesSource(AbstractExchangeRatesSource):
+    """
+    Requests named sources in order and returns the first non-empty result. A failed or empty response
+    falls through to the next source at once. If `hedge_delay_seconds` is set and the current source
+    hasn't responded in that time, the next one is requested in parallel and the first good result wins.
+    Only sources supporting the requested pair take part. If no source has returned data, then the first
+    error is raised, unless some source has responded with no data.
+    """
+
+    def __init__(self,
+                 sources: Sequence[Tuple[str, AbstractExchangeRatesSource]],
+                 hedge_delay_seconds: Optional[float] = None):
+        if not sources:
+            raise ValueError('At least one source is required')
+        supported_pairs: Dict[str, set[str]] = {}
+        for _, source in sources:
+            for code_from, codes_to in source.supported_pairs().items():
+                supported_pairs.setdefault(code_from, set()).update(codes_to)
+        super().__init__(supported_pairs)
+        self._sources = list(sources)
+        self._hedge_delay_seconds = hedge_delay_seconds
+
+    async def get_exchange_rates(self,
+                                 from_currency_code: str,
+                                 to_currency_code: str,
+                                 from_date: date,
+                                 to_date: date) -> pl.LazyFrame:
+        remaining = deque((name, source) for name, source in self._sources
+                          if source.is_pair_supported(from_currency_code, to_currency_code))
+        pending: Dict[asyncio.Task, str] = {}
+        started: List[asyncio.Task] = []
+        errors: List[BaseException] = []
+        has_empty_response = False
+
+        def request_next(trigger: str):
+            name, source = remaining.popleft()
+            FAILOVER_ATTEMPTS.labels(source=name, trigger=trigger).inc()
+            task = asyncio.create_task(_fetch(source, from_currency_code, to_currency_code, from_date, to_date))
+            pending[task] = name
+            started.append(task)
+
+        if not remaining:
+            return create_empty_df()
+        request_next('primary')
+        try:
+            while pending:
+                can_hedge = self._hedge_delay_seconds is not None and remaining
+                done, _ = await asyncio.wait(pending,
+                                             timeout=self._hedge_delay_seconds if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info('%s is slow for %s/%s, requesting the next source',
+                                ', '.join(pending.values()), from_currency_code, to_currency_code)
+                    request_next('hedge')
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is not None:
+                        logger.warning('%s failed for %s/%s', name, from_currency_code, to_currency_code,
+                                       exc_info=task.exception())
+                        errors.append(task.exception())
+                    elif not task.result().is_empty():
+                        return task.result().lazy()
+                    else:
+                        has_empty_response = True
+                    if remaining:
+                        request_next('fallback')
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Marks errors of sources, which completed together with the chosen one, as retrieved
+                    task.exception()
+        if errors and not has_empty_response:
+            raise errors[0]
+        return create_empty_df()
+
+
+async def _fetch(source: AbstractExchangeRatesSource,
+                 from_currency_code: str,
+                 to_currency_code: str,
+                 from_date: date,
+                 to_date: date) -> pl.DataFrame:
+    # Result is collected, so emptiness is known before it's chosen
+    lf = await source.get_exchange_rates(from_currency_code, to_currency_code, from_date, to_date)
+    return await lf.collect_async()
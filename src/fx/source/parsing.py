@@ -0,0 +1,18 @@
+from decimal import Decimal
+
+import polars as pl
+
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+
+
+def to_money(values: pl.Series) -> pl.Series:
+    """
+    Casts JSON numbers (floats or numeric strings) to DECIMAL_MONEY_TYPE, the result is the same
+    as of Decimal(str(value)). Polars can't cast exponent notation to decimals, so such values
+    are rewritten in positional notation one by one before the cast.
+    """
+    text = values.cast(pl.String) if values.dtype != pl.String else values.clone()
+    exponent_idx = text.str.contains('[eE]').arg_true()
+    if exponent_idx.len() > 0:
+        text = text.scatter(exponent_idx, [format(Decimal(text[i]), 'f') for i in exponent_idx])
+    return text.cast(DECIMAL_MONEY_TYPE)
@@ -1,13 +1,21 @@
-from datetime import date, datetime
-from decimal import Decimal
-from typing import Dict, Tuple
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Dict, Tuple, Optional, List
 
 import polars as pl
-import pytz
 
 from src.config import PolygonConfig
 from src.fx.currency_helpers import is_fiat, is_crypto
+from src.fx.metrics import PARSE_SECONDS, PARSED_ROWS, UPSTREAM_FETCH_SECONDS
 from src.fx.source.abstract_source import AbstractExchangeRatesSource, create_empty_df, DECIMAL_MONEY_TYPE
+from src.fx.source.parsing import to_money
+from src.fx.source.response_cache import ResponseCache
+from src.fx.source.streaming import CHUNK_SIZE, ColumnarBuffer, decode_object
+from src.fx.source.upstream import RateLimiterRegistry, create_upstream_client
+
+PROVIDER = 'polygon'
+
+_RESULTS_SCHEMA = {'t': pl.Int64, 'c': pl.Float64}
 
 
 def _build_allowed_crypto_fiat_pairs(config: PolygonConfig) -> Dict[str, set[str]]:
@@ -37,10 +45,14 @@ def _build_allowed_crypto_fiat_pairs(config: PolygonConfig) -> Dict[str, set[str
 
 class PolygonCryptoExchangeRatesSource(AbstractExchangeRatesSource):
 
-    def __init__(self, config: PolygonConfig, client_session):
+    def __init__(self,
+                 config: PolygonConfig,
+                 client_session,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None):
         super().__init__(_build_allowed_crypto_fiat_pairs(config))
         self._config = config
-        self._base_provider = _BasePolygonFxProvider(config, client_session)
+        self._base_provider = _BasePolygonFxProvider(config, client_session, rate_limiters, response_cache)
 
     async def get_exchange_rates(self,
                                  from_currency_code: str,
@@ -70,7 +82,11 @@ class PolygonCryptoExchangeRatesSource(AbstractExchangeRatesSource):
 
 class PolygonFiatExchangeRatesSource(AbstractExchangeRatesSource):
 
-    def __init__(self, conf: PolygonConfig, client_session):
+    def __init__(self,
+                 conf: PolygonConfig,
+                 client_session,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None):
         super().__init__({
             'usd': {
                 'rub',
@@ -85,7 +101,7 @@ class PolygonFiatExchangeRatesSource(AbstractExchangeRatesSource):
                 'rub'
             }
         })
-        self._base_provider = _BasePolygonFxProvider(conf, client_session)
+        self._base_provider = _BasePolygonFxProvider(conf, client_session, rate_limiters, response_cache)
 
     async def get_exchange_rates(self, from_currency_code: str, to_currency_code: str, from_date: date,
                                  to_date: date) -> pl.LazyFrame:
@@ -97,42 +113,111 @@ class PolygonFiatExchangeRatesSource(AbstractExchangeRatesSource):
 
 
 class _BasePolygonFxProvider:
-    def __init__(self, config: PolygonConfig, client_session):
+    def __init__(self,
+                 config: PolygonConfig,
+                 client_session,
+                 rate_limiters: Optional[RateLimiterRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None):
         self._config = config
-        self._client_session = client_session
+        self._upstream = create_upstream_client(PROVIDER, config, client_session, rate_limiters,
+                                                response_cache)
 
     async def get_exchange_rates(self,
                                  ticker: str,
                                  from_to_codes: Tuple[str, str],
                                  from_date: date,
                                  to_date: date) -> pl.LazyFrame:
-        from_dt_str = from_date.strftime('%Y-%m-%d')
-        to_dt_str = to_date.strftime('%Y-%m-%d')
-        formatted_url = self._config.url_pattern.format(
+        windows = split_date_range(from_date, to_date, self._config.max_days_per_request)
+        # Windows are fetched concurrently, the rate limiter of the upstream client keeps them within quota
+        pages = await asyncio.gather(*(self._fetch_window(ticker, from_to_codes, f, t) for f, t in windows))
+        frames = [frame for window_frames in pages for frame in window_frames]
+        if not frames:
+            return create_empty_df()
+        if len(frames) == 1:
+            return frames[0]
+        return (pl.concat(frames, how='vertical')
+                .unique(subset=['date'], keep='last', maintain_order=True)
+                .sort('date'))
+
+    async def _fetch_window(self,
+                            ticker: str,
+                            from_to_codes: Tuple[str, str],
+                            from_date: date,
+                            to_date: date) -> List[pl.LazyFrame]:
+        url = self._config.url_pattern.format(
             ticker=ticker,
-            from_dt=from_dt_str,
-            to_dt=to_dt_str,
+            from_dt=from_date.strftime('%Y-%m-%d'),
+            to_dt=to_date.strftime('%Y-%m-%d'),
             api_key=self._config.api_key
         )
-        async with self._client_session.get(formatted_url) as response:
-            if response.status == 200:
-                text = await response.json()
-                return self._parse_response(text, from_to_codes)
-            else:
-                return create_empty_df()
+        frames = []
+        fetch_seconds = UPSTREAM_FETCH_SECONDS.labels(provider=PROVIDER, ticker=ticker)
+        while url is not None:
+            # A failed page raises, so a range is never returned with a hole in the middle
+            with fetch_seconds.time():
+                data, frame = await self._fetch_page(url, ticker, from_to_codes, to_date)
+            if frame is not None:
+                frames.append(frame)
+            url = self._next_page_url(data)
+        return frames
+
+    async def _fetch_page(self, url: str, ticker: str, from_to_codes: Tuple[str, str], to_date: date) \
+            -> Tuple[Dict[str, Any], Optional[pl.LazyFrame]]:
+        if self._config.stream_responses:
+            data, df = await self._upstream.get(url, _stream_results, to_date, ticker)
+            return data, _to_rates_lf(df, from_to_codes) if df.height > 0 else None
+        data = await self._upstream.get_json(url, to_date, ticker)
+        if not data.get('results'):
+            return data, None
+        with PARSE_SECONDS.labels(provider=PROVIDER).time():
+            return data, self._parse_response(data, from_to_codes)
+
+    def _next_page_url(self, data) -> Optional[str]:
+        next_url = data.get('next_url')
+        if not next_url:
+            return None
+        # Polygon doesn't include API key into the next page URL
+        separator = '&' if '?' in next_url else '?'
+        return f'{next_url}{separator}apiKey={self._config.api_key}'
 
     def _parse_response(self, data, from_to_codes: Tuple[str, str]) -> pl.LazyFrame:
-        currency_code_from = from_to_codes[0]
-        currency_code_to = from_to_codes[1]
-        rows = []
         if 'results' not in data:
             return create_empty_df()
-        for item in data['results']:
-            dt = datetime.fromtimestamp(item['t'] / 1000, tz=pytz.UTC).replace(tzinfo=None).date()
-            r = [dt, Decimal(str(item['c']))]
-            rows.append(r)
-        return (pl.LazyFrame(data=rows, schema=['date', 'rate'], orient='row')
-                .select(pl.col('date'),
-                        pl.lit(currency_code_from).alias('currencyCodeFrom'),
-                        pl.lit(currency_code_to).alias('currencyCodeTo'),
-                        pl.col('rate').cast(DECIMAL_MONEY_TYPE)))
+        results = data['results']
+        df = pl.DataFrame({'t': [item['t'] for item in results],
+                           'c': [item['c'] for item in results]},
+                          schema=_RESULTS_SCHEMA)
+        return _to_rates_lf(df, from_to_codes)
+
+
+async def _stream_results(response) -> Tuple[Dict[str, Any], pl.DataFrame]:
+    """
+    Decodes results item by item, returns the rest of the page, e.g. `next_url`, and results frame
+    """
+    buffer = ColumnarBuffer(_RESULTS_SCHEMA)
+    data = await decode_object(response.content.iter_chunked(CHUNK_SIZE),
+                               lambda key: key == 'results',
+                               lambda _, item: buffer.append(item['t'], item['c']))
+    return data, buffer.to_frame()
+
+
+def _to_rates_lf(df: pl.DataFrame, from_to_codes: Tuple[str, str]) -> pl.LazyFrame:
+    PARSED_ROWS.labels(provider=PROVIDER).inc(df.height)
+    currency_code_from = from_to_codes[0]
+    currency_code_to = from_to_codes[1]
+    return (df.with_columns(to_money(df.get_column('c')))
+            .lazy()
+            .select(pl.from_epoch('t', time_unit='ms').dt.date().alias('date'),
+                    pl.lit(currency_code_from).alias('currencyCodeFrom'),
+                    pl.lit(currency_code_to).alias('currencyCodeTo'),
+                    pl.col('c').alias('rate')))
+
+
+def split_date_range(from_date: date, to_date: date, max_days: int) -> List[Tuple[date, date]]:
+    windows = []
+    window_start = from_date
+    while window_start <= to_date:
+        window_end = min(to_date, window_start + timedelta(days=max_days - 1))
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
@@ -0,0 +1,194 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from src.fx.source.streaming import CHUNK_SIZE, json_loads
+
+logger = logging.getLogger(__name__)
+
+# Query parameters with credentials, they are not a part of cache keys
+_API_KEY_PARAMS = {'apikey', 'api_key'}
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    stored_at: datetime
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Keeps gzipped bodies of provider responses on disk, keyed by URL without API key.
+    Response is fresh forever for ranges, which ended before the day it was stored,
+    otherwise it's fresh for `live_ttl_seconds` and revalidated with ETag/Last-Modified after that.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 live_ttl_seconds: float,
+                 clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)):
+        self._directory = directory
+        self._live_ttl = timedelta(seconds=live_ttl_seconds)
+        self._clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+    def is_fresh(self, cached: CachedResponse, range_end: Optional[date]) -> bool:
+        if range_end is not None and range_end < cached.stored_at.date():
+            return True
+        return self._clock() - cached.stored_at < self._live_ttl
+
+    async def load(self, url: str) -> Optional[CachedResponse]:
+        return await asyncio.to_thread(self._load, self._path(url))
+
+    async def store(self, url: str, body: bytes, headers) -> CachedResponse:
+        cached = CachedResponse(body, self._clock(), headers.get('ETag'), headers.get('Last-Modified'))
+        await asyncio.to_thread(self._store, self._path(url), cache_key(url), cached)
+        return cached
+
+    async def store_recorded(self, url: str, response: 'RecordingResponse'):
+        """
+        Stores the body, which `response` has gzipped while it was read, the rest of it is read first
+        """
+        gzipped_body = await response.gzipped_body()
+        cached = CachedResponse(b'', self._clock(), response.headers.get('ETag'),
+                                response.headers.get('Last-Modified'))
+        await asyncio.to_thread(self._store, self._path(url), cache_key(url), cached, gzipped_body)
+
+    async def touch(self, url: str, cached: CachedResponse) -> CachedResponse:
+        """
+        Marks revalidated response as stored now, the body isn't rewritten
+        """
+        touched = CachedResponse(cached.body, self._clock(), cached.etag, cached.last_modified)
+        await asyncio.to_thread(self._write_meta, self._path(url), cache_key(url), touched)
+        return touched
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self._directory, hashlib.sha256(cache_key(url).encode()).hexdigest())
+
+    def _load(self, path: str) -> Optional[CachedResponse]:
+        try:
+            with open(f'{path}.json', 'rb') as f:
+                meta = json.load(f)
+            with open(f'{path}.gz', 'rb') as f:
+                body = gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            logger.warning("Cached response '%s' is broken, it will be fetched again", path, exc_info=True)
+            return None
+        return CachedResponse(body, datetime.fromisoformat(meta['stored_at']), meta.get('etag'),
+                              meta.get('last_modified'))
+
+    def _store(self, path: str, key: str, cached: CachedResponse, gzipped_body: Optional[bytes] = None):
+        _write_atomically(f'{path}.gz', gzipped_body if gzipped_body is not None else gzip.compress(cached.body))
+        self._write_meta(path, key, cached)
+
+    @staticmethod
+    def _write_meta(path: str, key: str, cached: CachedResponse):
+        meta = {
+            'url': key,
+            'stored_at': cached.stored_at.isoformat(),
+            'etag': cached.etag,
+            'last_modified': cached.last_modified
+        }
+        _write_atomically(f'{path}.json', json.dumps(meta).encode())
+
+
+class BufferedResponse:
+    """
+    Response with already read body, it's passed to the same readers as aiohttp responses
+    """
+
+    def __init__(self, body: bytes):
+        self.status = 200
+        self.body = body
+        self.content = self
+
+    async def read(self) -> bytes:
+        return self.body
+
+    async def json(self) -> Any:
+        return json_loads(self.body)
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        for i in range(0, len(self.body), size):
+            yield self.body[i:i + size]
+
+
+class RecordingResponse:
+    """
+    Passes the body of an aiohttp response to the same readers as the response itself and gzips it on the way,
+    so a streamed body is cached without keeping it in memory uncompressed
+    """
+
+    def __init__(self, response):
+        self.status = response.status
+        self.headers = response.headers
+        self.content = self
+        self._response = response
+        self._compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        self._gzipped: List[bytes] = []
+        self._complete = False
+
+    async def read(self) -> bytes:
+        body = await self._response.read()
+        self._record(body)
+        self._complete = True
+        return body
+
+    async def json(self) -> Any:
+        return json_loads(await self.read())
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        async for chunk in self._response.content.iter_chunked(size):
+            self._record(chunk)
+            yield chunk
+        self._complete = True
+
+    async def gzipped_body(self) -> bytes:
+        # A reader may stop at the end of the document, e.g. before trailing whitespace
+        if not self._complete:
+            async for chunk in self._response.content.iter_chunked(CHUNK_SIZE):
+                self._record(chunk)
+            self._complete = True
+        return b''.join(self._gzipped) + self._compressor.flush()
+
+    def _record(self, chunk: bytes):
+        self._gzipped.append(self._compressor.compress(chunk))
+
+
+def cache_key(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in _API_KEY_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _write_atomically(path: str, data: bytes):
+    # Concurrent readers see either the old or the new file, never a partially written one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
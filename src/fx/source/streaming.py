@@ -0,0 +1,189 @@
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import polars as pl
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:  # orjson comes with the fast-json extra, the standard decoder is used without it
+    json_loads = json.loads
+
+# Responses are read by chunks of this size, so the buffer holds a chunk plus a value being decoded
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = b' \t\r\n'
+_STRING_PATTERN = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STRING = re.compile(_STRING_PATTERN, re.DOTALL)
+# Complete strings are skipped as one token, a bare quote means a string is cut by the chunk end
+_CONTAINER_TOKEN = re.compile(_STRING_PATTERN + rb'|["{}\[\]]', re.DOTALL)
+_SCALAR_END = re.compile(rb'[,}\]\s]')
+
+MemberListener = Callable[[Optional[str], Any], None]
+
+
+class ColumnarBuffer:
+    """
+    Collects decoded rows into polars chunks, only the last `chunk_rows` rows are kept as Python objects
+    """
+
+    def __init__(self, schema: Dict[str, pl.DataType], chunk_rows: int = 10_000):
+        self._schema = schema
+        self._chunk_rows = chunk_rows
+        self._columns: List[List[Any]] = [[] for _ in schema]
+        self._chunks: List[pl.DataFrame] = []
+
+    def append(self, *values):
+        for column, value in zip(self._columns, values):
+            column.append(value)
+        if len(self._columns[0]) >= self._chunk_rows:
+            self._flush()
+
+    def to_frame(self) -> pl.DataFrame:
+        self._flush()
+        if not self._chunks:
+            return pl.DataFrame(schema=self._schema)
+        return pl.concat(self._chunks, rechunk=True)
+
+    def _flush(self):
+        if self._columns[0]:
+            self._chunks.append(pl.DataFrame(dict(zip(self._schema, self._columns)), schema=self._schema))
+            self._columns = [[] for _ in self._schema]
+
+
+async def decode_object(chunks: AsyncIterator[bytes],
+                        is_streamed_key: Callable[[str], bool],
+                        on_member: MemberListener) -> Dict[str, Any]:
+    """
+    Decodes top-level JSON object from `chunks` without materializing values of streamed keys:
+    each member of such object is passed to `on_member` as (key, value) and each item of such array
+    as (None, value) once it's decoded. Streamed keys are returned with None values, other keys
+    are returned decoded.
+    """
+    scanner = _Scanner(chunks)
+    document = {}
+    async for key in scanner.members():
+        if is_streamed_key(key) and await scanner.peek() in b'{[':
+            document[key] = None
+            await scanner.stream(on_member)
+        else:
+            document[key] = await scanner.value()
+    return document
+
+
+class _Scanner:
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self._pos = 0
+
+    async def members(self) -> AsyncIterator[str]:
+        """
+        Iterates keys of the object at the current position, the caller must consume each value
+        """
+        await self._expect(b'{')
+        if await self.peek() == ord('}'):
+            self._pos += 1
+            return
+        while True:
+            key = await self.value()
+            await self._expect(b':')
+            yield key
+            if not await self._next_item(b'}'):
+                return
+
+    async def stream(self, on_member: MemberListener):
+        if await self.peek() == ord('{'):
+            async for key in self.members():
+                on_member(key, await self.value())
+            return
+        await self._expect(b'[')
+        if await self.peek() == ord(']'):
+            self._pos += 1
+            return
+        while True:
+            on_member(None, await self.value())
+            if not await self._next_item(b']'):
+                return
+
+    async def value(self) -> Any:
+        end = await self._value_end()
+        value = json_loads(bytes(self._buffer[self._pos:end]))
+        self._pos = end
+        return value
+
+    async def peek(self) -> int:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    async def _next_item(self, closing: bytes) -> bool:
+        separator = await self.peek()
+        self._pos += 1
+        if separator == ord(','):
+            return True
+        if separator == closing[0]:
+            return False
+        raise ValueError(f"Expected ',' or '{closing.decode()}' in JSON document, got '{chr(separator)}'")
+
+    async def _expect(self, char: bytes):
+        actual = await self.peek()
+        if actual != char[0]:
+            raise ValueError(f"Expected '{char.decode()}' in JSON document, got '{chr(actual)}'")
+        self._pos += 1
+
+    async def _value_end(self) -> int:
+        first = await self.peek()
+        # Scan of a container is resumed where it stopped once more data is read
+        state = {'offset': 0, 'depth': 0}
+        while True:
+            if first in b'{[':
+                end = self._container_end(state)
+            elif first == ord('"'):
+                match = _STRING.match(self._buffer, self._pos)
+                end = match.end() if match else None
+            else:
+                match = _SCALAR_END.search(self._buffer, self._pos)
+                end = match.start() if match else None
+            if end is not None:
+                return end
+            if not await self._fill():
+                if first in b'{["':
+                    raise ValueError('Unexpected end of JSON document')
+                return len(self._buffer)
+
+    def _container_end(self, state: dict) -> Optional[int]:
+        idx = self._pos + state['offset']
+        while True:
+            match = _CONTAINER_TOKEN.search(self._buffer, idx)
+            if match is None or match.group() == b'"':
+                # Either no more tokens or a string isn't complete yet
+                state['offset'] = (len(self._buffer) if match is None else match.start()) - self._pos
+                return None
+            idx = match.end()
+            token = match.group()
+            if token[0] == ord('"'):
+                continue
+            if token in b'{[':
+                state['depth'] += 1
+                continue
+            state['depth'] -= 1
+            if state['depth'] == 0:
+                return idx
+
+    async def _fill(self) -> bool:
+        # Consumed bytes are dropped, so the buffer doesn't grow with the document
+        del self._buffer[:self._pos]
+        self._pos = 0
+        chunk = await anext(self._chunks, None)
+        if chunk is None:
+            return False
+        self._buffer += chunk
+        return True
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+
+from src.fx.metrics import RESPONSE_CACHE_REQUESTS, UPSTREAM_RATE_LIMIT_WAIT_SECONDS, UPSTREAM_REQUEST_SECONDS
+from src.fx.source.response_cache import BufferedResponse, RecordingResponse, ResponseCache, cache_key
+
+logger = logging.getLogger(__name__)
+
+_THROTTLED_STATUS = 429
+_NOT_MODIFIED_STATUS = 304
+
+T = TypeVar('T')
+
+
+class UpstreamError(Exception):
+    """
+    Provider failed to return data, e.g. rejected the API key or kept failing after retries.
+    It's not the same as absence of data, so the requested range has to be fetched again.
+    """
+
+
+class UpstreamThrottledError(UpstreamError):
+    """
+    Provider kept rejecting requests because of its quota
+    """
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int = 3
+    backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        # Exponential backoff with jitter, so retries of concurrent requests don't hit provider together
+        capped = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** attempt))
+        return capped * (0.5 + random.random() / 2)
+
+
+class TokenBucket:
+    """
+    Allows `calls_per_minute` calls with bursts up to `burst` calls. Waiters are served in FIFO order.
+    A fractional burst, e.g. a share of one, is what the bucket starts with, but it holds at least one call.
+    """
+
+    def __init__(self,
+                 calls_per_minute: float,
+                 burst: float = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        if calls_per_minute <= 0 or burst <= 0:
+            raise ValueError('Calls per minute and burst must be positive')
+        self._rate = calls_per_minute / 60
+        self._capacity = max(1.0, float(burst))
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await self._sleep((1 - self._tokens) / self._rate)
+
+
+class RateLimiterRegistry:
+    """
+    Keeps one bucket per provider and API key, so all sources of a provider share its quota.
+    `quota_share` is the part of every quota available to this process, e.g. to one of backfill workers.
+    The burst is split the same way, so processes sharing a quota don't start with a whole burst each.
+    """
+
+    def __init__(self, quota_share: float = 1.0):
+        if not 0 < quota_share <= 1:
+            raise ValueError('Quota share must be in (0, 1]')
+        self._quota_share = quota_share
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def get(self, provider: str, api_key: str, calls_per_minute: Optional[float], burst: int = 1) \
+            -> Optional[TokenBucket]:
+        if not calls_per_minute:
+            return None
+        key = (provider, api_key)
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(calls_per_minute * self._quota_share, burst * self._quota_share)
+        return self._buckets[key]
+
+
+class UpstreamClient:
+
+    def __init__(self,
+                 client_session,
+                 bucket: Optional[TokenBucket] = None,
+                 retry_policy: RetryPolicy = RetryPolicy(),
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+                 response_cache: Optional[ResponseCache] = None,
+                 provider: str = 'unknown'):
+        self._client_session = client_session
+        self._bucket = bucket
+        self._retry_policy = retry_policy
+        self._sleep = sleep
+        self._response_cache = response_cache
+        self._provider = provider
+
+    async def get_json(self, url: str, range_end: Optional[date] = None, ticker: str = 'unknown') -> Any:
+        """
+        Returns parsed body of 200 response. Throttled and 5xx responses are retried, exhausted throttling
+        raises UpstreamThrottledError, other exhausted or non-retryable statuses raise UpstreamError.
+        `range_end` is the last date of requested data, it tells the response cache if data can still change.
+        `ticker` labels request durations, so a slow or failing pair stands out of its provider.
+        """
+        return await self.get(url, _read_json, range_end, ticker)
+
+    async def get(self,
+                  url: str,
+                  read: Callable[[Any], Awaitable[T]],
+                  range_end: Optional[date] = None,
+                  ticker: str = 'unknown') -> T:
+        """
+        Same as `get_json`, but body of 200 response is read by `read`, e.g. streamed.
+        `read` may raise UpstreamThrottledError for a body reporting throttling, it's retried the same way as 429,
+        so `read` mustn't keep state between calls. A body is cached only if `read` has accepted it.
+        """
+        cached = None
+        if self._response_cache is not None:
+            cached = await self._response_cache.load(url)
+            if cached is not None and self._response_cache.is_fresh(cached, range_end):
+                RESPONSE_CACHE_REQUESTS.labels(provider=self._provider, result='fresh').inc()
+                return await read(BufferedResponse(cached.body))
+        headers = cached.conditional_headers() if cached is not None else None
+        attempt = 0
+        while True:
+            if self._bucket is not None:
+                with UPSTREAM_RATE_LIMIT_WAIT_SECONDS.labels(provider=self._provider).time():
+                    await self._bucket.acquire()
+            started_at = time.perf_counter()
+            try:
+                async with self._client_session.get(url, headers=headers) as response:
+                    UPSTREAM_REQUEST_SECONDS.labels(provider=self._provider, ticker=ticker, status=response.status) \
+                        .observe(time.perf_counter() - started_at)
+                    if response.status == _NOT_MODIFIED_STATUS and cached is not None:
+                        RESPONSE_CACHE_REQUESTS.labels(provider=self._provider, result='revalidated').inc()
+                        await self._response_cache.touch(url, cached)
+                        return await read(BufferedResponse(cached.body))
+                    if response.status == 200:
+                        try:
+                            return await self._read_ok(url, response, read)
+                        except UpstreamThrottledError:
+                            # Some providers, e.g. Alphavantage, throttle with 200 and a message instead of 429
+                            if attempt >= self._retry_policy.max_retries:
+                                raise
+                            delay = self._retry_policy.delay(attempt)
+                            logger.warning('Upstream throttled request in its body, retrying in %.1fs', delay)
+                    else:
+                        delay = self._retry_delay(response, attempt)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                UPSTREAM_REQUEST_SECONDS.labels(provider=self._provider, ticker=ticker, status='error') \
+                    .observe(time.perf_counter() - started_at)
+                if attempt >= self._retry_policy.max_retries:
+                    raise
+                delay = self._retry_policy.delay(attempt)
+                logger.warning('Upstream connection failed, retrying in %.1fs', delay)
+            attempt += 1
+            await self._sleep(delay)
+
+    async def _read_ok(self, url: str, response, read: Callable[[Any], Awaitable[T]]) -> T:
+        if self._response_cache is None:
+            return await read(response)
+        RESPONSE_CACHE_REQUESTS.labels(provider=self._provider, result='miss').inc()
+        recording = RecordingResponse(response)
+        # Body is stored after `read` has accepted it, so e.g. quota notes aren't cached
+        result = await read(recording)
+        await self._store(url, recording)
+        return result
+
+    def _retry_delay(self, response, attempt: int) -> float:
+        """
+        Raises for a status, which isn't retried, or once retries are exhausted
+        """
+        retryable = response.status == _THROTTLED_STATUS or response.status >= 500
+        if not retryable:
+            raise UpstreamError(f'Provider responded with {response.status}')
+        if attempt >= self._retry_policy.max_retries:
+            if response.status == _THROTTLED_STATUS:
+                raise UpstreamThrottledError(f'Provider throttled request after {attempt} retries')
+            raise UpstreamError(f'Provider responded with {response.status} after {attempt} retries')
+        delay = _retry_after(response) or self._retry_policy.delay(attempt)
+        logger.warning('Upstream responded with %d, retrying in %.1fs', response.status, delay)
+        return delay
+
+    async def _store(self, url: str, response: RecordingResponse):
+        try:
+            await self._response_cache.store_recorded(url, response)
+        except Exception:
+            # The response has been read already, so a failing cache, e.g. a full disk, doesn't fail it
+            logger.warning("Failed to cache the response of '%s'", cache_key(url), exc_info=True)
+
+
+async def _read_json(response) -> Any:
+    return await response.json()
+
+
+def _retry_after(response) -> Optional[float]:
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def create_upstream_client(provider: str,
+                           config,
+                           client_session,
+                           rate_limiters: Optional[RateLimiterRegistry] = None,
+                           response_cache: Optional[ResponseCache] = None) -> UpstreamClient:
+    """
+    `config` is a provider config with `api_key` and upstream limits, e.g. PolygonConfig
+    """
+    rate_limiters = rate_limiters or RateLimiterRegistry()
+    return UpstreamClient(client_session,
+                          rate_limiters.get(provider, config.api_key, config.calls_per_minute, config.burst),
+                          RetryPolicy(config.max_retries, config.backoff_seconds),
+                          response_cache=response_cache,
+                          provider=provider)
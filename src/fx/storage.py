@@ -0,0 +1,56 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import AbstractServiceConfig, GapFillConfig
+from src.fx.aggregates import FxRateAggregator
+from src.fx.gap_fill import FxFilledRateRefresher
+from src.fx.memory_repository import InMemoryFxRateRepository
+from src.fx.questdb import QuestDbFxRateRepository
+from src.fx.repository import FxRateRepository, FxTrackingPairRepository
+from src.fx.stream import FxRateNotifier
+
+BACKEND_POSTGRES = 'postgres'
+BACKEND_QUESTDB = 'questdb'
+BACKEND_MEMORY = 'memory'
+
+
+@asynccontextmanager
+async def open_rate_repository(config: AbstractServiceConfig,
+                               session_factory: async_sessionmaker[AsyncSession],
+                               client_session) -> AsyncIterator:
+    """
+    Yields the repository of rates of the configured backend. Tracking pairs always stay in Postgres.
+    """
+    backend = config.rate_storage_cfg().backend
+    if backend == BACKEND_POSTGRES:
+        yield FxRateRepository(session_factory)
+    elif backend == BACKEND_MEMORY:
+        yield InMemoryFxRateRepository()
+    elif backend == BACKEND_QUESTDB:
+        repository = await QuestDbFxRateRepository.connect(config.questdb_cfg(), client_session)
+        try:
+            yield repository
+        finally:
+            await repository.close()
+    else:
+        raise ValueError(f'Unknown rate storage backend: {backend}')
+
+
+def create_tracking_pair_repository(session_factory: async_sessionmaker[AsyncSession],
+                                    rate_repository,
+                                    gap_fill_cfg: GapFillConfig = GapFillConfig(),
+                                    notifier: Optional[FxRateNotifier] = None) -> FxTrackingPairRepository:
+    """
+    Rates written by syncs go to `rate_repository`, unless it's the Postgres one sharing the transaction.
+    Aggregates and persisted filled series are kept in Postgres for every backend.
+    If `notifier` is set, streams of every replica are notified about written rates on commit.
+    """
+    external = None if isinstance(rate_repository, FxRateRepository) else rate_repository
+    refreshers = [FxRateAggregator(external)]
+    if gap_fill_cfg.persist:
+        refreshers.append(FxFilledRateRefresher(gap_fill_cfg, external))
+    if notifier is not None:
+        refreshers.append(notifier)
+    return FxTrackingPairRepository(session_factory, external, refreshers)
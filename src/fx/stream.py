@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import suppress
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import asyncpg
+import polars as pl
+from fastapi import WebSocket
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import StreamConfig
+from src.database import to_asyncpg_dsn
+from src.fx.metrics import STREAM_DROPPED_SUBSCRIBERS, STREAM_NOTIFICATIONS, STREAM_SUBSCRIBERS
+from src.fx.schemas import to_fx_rate_dtos
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+from src.fx.sync import RatesWrittenListener
+
+logger = logging.getLogger(__name__)
+
+SSE_MEDIA_TYPE = 'text/event-stream'
+
+# Tells a WebSocket client to reconnect later, e.g. after it has been dropped for lagging behind
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+_PAIR_COLUMNS = ['currencyCodeFrom', 'currencyCodeTo']
+
+# A row takes at most ~70 bytes, so a notification stays below the 8000 bytes payload limit of Postgres
+_NOTIFICATION_ROWS = 64
+
+_RECONNECT_SECONDS = 5
+
+_KEEPALIVE_SECONDS = 30
+
+
+def parse_pairs(values: Iterable[str]) -> Set[Tuple[str, str]]:
+    pairs = set()
+    for value in values:
+        currency_code_from, _, currency_code_to = value.upper().partition('/')
+        if len(currency_code_from) != 3 or len(currency_code_to) != 3:
+            raise ValueError(f"Pair '{value}' must look like USD/EUR")
+        pairs.add((currency_code_from, currency_code_to))
+    return pairs
+
+
+class FxRateSubscription:
+    """
+    Written rates of `pairs` as JSON of FxRateDto. `get` returns None, when the subscriber has been
+    dropped for lagging more than the queue size behind, then the client is expected to reconnect.
+    """
+
+    def __init__(self, broker: 'FxRateBroker', pairs: Set[Tuple[str, str]], queue_size: int):
+        self.pairs = frozenset(pairs)
+        self.dropped = False
+        self._broker = broker
+        self._queue: asyncio.Queue[Optional[str]] = asyncio.Queue(queue_size)
+
+    async def get(self) -> Optional[str]:
+        return await self._queue.get()
+
+    def offer(self, event: str) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self._drop()
+            return False
+
+    def _drop(self):
+        # Pending events are of no use to a reader, which will be disconnected, they give way to the end marker
+        self.dropped = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def __enter__(self) -> 'FxRateSubscription':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._broker.unsubscribe(self)
+
+
+class FxRateBroker:
+    """
+    Fans written rates out to subscribers of their pairs. Publishing never waits for subscribers,
+    every one has a bounded queue and a full one is dropped, so a slow client can't hold back others.
+    Each rate is serialized once, however many subscribers it has.
+    """
+
+    def __init__(self, config: StreamConfig = StreamConfig()):
+        self.heartbeat_seconds = config.heartbeat_seconds
+        self._queue_size = config.queue_size
+        self._subscriptions: Dict[Tuple[str, str], Set[FxRateSubscription]] = {}
+
+    def subscribe(self, pairs: Set[Tuple[str, str]]) -> FxRateSubscription:
+        subscription = FxRateSubscription(self, pairs, self._queue_size)
+        for pair in subscription.pairs:
+            self._subscriptions.setdefault(pair, set()).add(subscription)
+        STREAM_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: FxRateSubscription):
+        removed = False
+        for pair in subscription.pairs:
+            subscribers = self._subscriptions.get(pair)
+            if subscribers is not None and subscription in subscribers:
+                removed = True
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[pair]
+        if removed:
+            STREAM_SUBSCRIBERS.dec()
+
+    def on_rates_written(self, pairs: Iterable[Tuple[str, str]], rates: Optional[pl.DataFrame] = None):
+        if rates is None or rates.is_empty() or not self._subscriptions:
+            return
+        subscribed = pl.DataFrame(list(self._subscriptions), schema=_PAIR_COLUMNS, orient='row')
+        rates = (rates.with_columns(pl.col(_PAIR_COLUMNS).str.to_uppercase())
+                 .join(subscribed, on=_PAIR_COLUMNS, how='semi')
+                 .sort('date'))
+        for dto in to_fx_rate_dtos(rates):
+            event = dto.model_dump_json(exclude_none=True)
+            for subscription in list(self._subscriptions.get((dto.currency_code_from, dto.currency_code_to), ())):
+                if not subscription.offer(event):
+                    self.unsubscribe(subscription)
+                    STREAM_DROPPED_SUBSCRIBERS.inc()
+
+
+async def sse_events(broker: FxRateBroker, pairs: Set[Tuple[str, str]]) -> AsyncIterator[str]:
+    """
+    Comments are sent when there are no rates, so proxies don't close an idle stream
+    """
+    with broker.subscribe(pairs) as subscription:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), broker.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            if event is None:
+                return
+            yield f'event: rate\ndata: {event}\n\n'
+
+
+async def serve_websocket(websocket: WebSocket, broker: FxRateBroker, pairs: Set[Tuple[str, str]]):
+    """
+    Sends rates until the client disconnects. Messages of the client aren't expected, but they're read,
+    so a disconnect is noticed without waiting for the next rate.
+    """
+    await websocket.accept()
+    with broker.subscribe(pairs) as subscription:
+        sender = asyncio.create_task(_send_events(websocket, subscription))
+        receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (sender, receiver):
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+    if subscription.dropped:
+        await websocket.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason='Subscriber lagged behind')
+
+
+async def _send_events(websocket: WebSocket, subscription: FxRateSubscription):
+    while (event := await subscription.get()) is not None:
+        await websocket.send_text(event)
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    while (await websocket.receive())['type'] != 'websocket.disconnect':
+        pass
+
+
+def notification_payloads(origin: str, rates: pl.DataFrame) -> Iterator[str]:
+    rows = rates.select(pl.col('date').cast(pl.String),
+                        *_PAIR_COLUMNS,
+                        pl.col('rate').cast(pl.String)).rows()
+    for offset in range(0, len(rows), _NOTIFICATION_ROWS):
+        yield json.dumps({'origin': origin, 'rates': rows[offset:offset + _NOTIFICATION_ROWS]},
+                         separators=(',', ':'))
+
+
+def rates_from_payload(rows: List[list]) -> pl.DataFrame:
+    return (pl.DataFrame(rows,
+                         schema={'date': pl.String, 'currencyCodeFrom': pl.String, 'currencyCodeTo': pl.String,
+                                 'rate': pl.String},
+                         orient='row')
+            .with_columns(pl.col('date').str.to_date(), pl.col('rate').cast(DECIMAL_MONEY_TYPE)))
+
+
+class FxRateNotifier:
+    """
+    Notifies listeners of `channel`, e.g. PgNotifyRelay of every replica, about written rates.
+    As a refresher of FxTrackingPairRepository it notifies in the writing transaction, so notifications are
+    delivered on commit, only if it commits, whichever process has written the rates.
+    """
+
+    def __init__(self, channel: str, origin: Optional[str] = None):
+        self.origin = origin or uuid.uuid4().hex
+        self._channel = channel
+
+    async def refresh(self, session: AsyncSession, rates: pl.DataFrame):
+        for payload in notification_payloads(self.origin, rates):
+            await session.execute(select(func.pg_notify(self._channel, payload)))
+            STREAM_NOTIFICATIONS.labels(direction='sent').inc()
+
+
+def create_notifier(config: StreamConfig, origin: Optional[str] = None) -> Optional[FxRateNotifier]:
+    return FxRateNotifier(config.channel, origin) if config.pg_notify else None
+
+
+class PgNotifyRelay:
+    """
+    Passes rates, which other processes have notified about with FxRateNotifier, to `on_rates_received`.
+    Notifications of `origin`, i.e. of this process, are skipped, since its listeners already got the rates.
+    They're received on a dedicated connection, which is reopened if it's lost.
+    """
+
+    def __init__(self, url: str, channel: str, on_rates_received: RatesWrittenListener, origin: Optional[str] = None):
+        self.origin = origin or uuid.uuid4().hex
+        self._dsn = to_asyncpg_dsn(url)
+        self._channel = channel
+        self._on_rates_received = on_rates_received
+
+    async def run_forever(self):
+        while True:
+            try:
+                connection = await asyncpg.connect(self._dsn)
+            except Exception:
+                logger.exception('Failed to connect for notifications on %s', self._channel)
+                await asyncio.sleep(_RECONNECT_SECONDS)
+                continue
+            try:
+                await connection.add_listener(self._channel, self._on_notification)
+                # A query fails on a dead connection, which otherwise would wait for notifications forever
+                while True:
+                    await asyncio.sleep(_KEEPALIVE_SECONDS)
+                    await connection.execute('SELECT 1')
+            except Exception:
+                logger.exception('Lost the connection listening on %s', self._channel)
+            finally:
+                with suppress(Exception):
+                    await connection.close(timeout=_RECONNECT_SECONDS)
+            await asyncio.sleep(_RECONNECT_SECONDS)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        message = json.loads(payload)
+        if message['origin'] == self.origin:
+            return
+        STREAM_NOTIFICATIONS.labels(direction='received').inc()
+        rates = rates_from_payload(message['rates'])
+        pairs = rates.select(_PAIR_COLUMNS).unique(maintain_order=True).rows()
+        self._on_rates_received(pairs, rates)
@@ -0,0 +1,114 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Optional, Callable, Iterable, Tuple
+
+import polars as pl
+
+from src.fx.metrics import COLLECT_SECONDS
+from src.fx.models import FxTrackingPair
+from src.fx.repository import FxTrackingPairRepository, rows_to_df
+from src.fx.source.abstract_source import AbstractExchangeRatesSource
+from src.fx.source.upstream import UpstreamThrottledError
+from src.fx.writer import UpsertResult
+
+SYNC_STATUS_OK = 'OK'
+SYNC_STATUS_NO_DATA = 'NO_DATA'
+SYNC_STATUS_FAILED = 'FAILED'
+SYNC_STATUS_THROTTLED = 'THROTTLED'
+
+logger = logging.getLogger(__name__)
+
+# Receives written pairs and their written rates
+RatesWrittenListener = Callable[[Iterable[Tuple[str, str]], pl.DataFrame], None]
+
+
+def notify_all(*listeners: RatesWrittenListener) -> RatesWrittenListener:
+    def on_rates_written(pairs: Iterable[Tuple[str, str]], rates: pl.DataFrame):
+        pairs = list(pairs)
+        for listener in listeners:
+            listener(pairs, rates)
+    return on_rates_written
+
+
+@dataclass(frozen=True)
+class SyncWindow:
+    from_date: date
+    to_date: date
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    currency_code_from: str
+    currency_code_to: str
+    status: str
+    rows: int
+    inserted: int = 0
+    updated: int = 0
+
+
+def incremental_window(tracking_pair: FxTrackingPair, today: date) -> Optional[SyncWindow]:
+    """
+    The last known rate date is fetched again, because the rate of the current day
+    may be changed by the provider until the day is closed
+    """
+    from_date = tracking_pair.last_rate_date.date()
+    if from_date > today:
+        return None
+    return SyncWindow(from_date, today)
+
+
+class PairSynchronizer:
+
+    def __init__(self,
+                 tracking_pair_repository: FxTrackingPairRepository,
+                 on_rates_written: Optional[RatesWrittenListener] = None):
+        self._tracking_pair_repository = tracking_pair_repository
+        self._on_rates_written = on_rates_written
+
+    async def sync_pair(self,
+                        source: AbstractExchangeRatesSource,
+                        tracking_pair: FxTrackingPair,
+                        today: Optional[date] = None) -> SyncResult:
+        window = incremental_window(tracking_pair, today or date.today())
+        if window is None:
+            return self._result(tracking_pair, SYNC_STATUS_NO_DATA, 0)
+        synced_at = datetime.now(timezone.utc)
+        try:
+            pldf = await source.get_exchange_rates(tracking_pair.currency_code_from,
+                                                   tracking_pair.currency_code_to,
+                                                   window.from_date,
+                                                   window.to_date)
+            with COLLECT_SECONDS.labels(stage='sync').time():
+                rates = await pldf.collect_async()
+        except UpstreamThrottledError:
+            logger.warning('Provider throttled rates of %s/%s',
+                           tracking_pair.currency_code_from, tracking_pair.currency_code_to)
+            await self._tracking_pair_repository.save_sync_result(tracking_pair, rows_to_df([]), SYNC_STATUS_THROTTLED,
+                                                                 synced_at)
+            return self._result(tracking_pair, SYNC_STATUS_THROTTLED, 0)
+        except Exception:
+            logger.exception('Failed to fetch rates for %s/%s',
+                             tracking_pair.currency_code_from, tracking_pair.currency_code_to)
+            await self._tracking_pair_repository.save_sync_result(tracking_pair, rows_to_df([]), SYNC_STATUS_FAILED,
+                                                                 synced_at)
+            return self._result(tracking_pair, SYNC_STATUS_FAILED, 0)
+        status = SYNC_STATUS_OK if not rates.is_empty() else SYNC_STATUS_NO_DATA
+        upsert_result = await self._tracking_pair_repository.save_sync_result(tracking_pair, rates, status, synced_at)
+        if self._on_rates_written is not None and upsert_result.inserted + upsert_result.updated > 0:
+            self._on_rates_written([(tracking_pair.currency_code_from, tracking_pair.currency_code_to)],
+                                   upsert_result.changed_rates(rates))
+        return self._result(tracking_pair, status, rates.height, upsert_result)
+
+    @staticmethod
+    def _result(tracking_pair: FxTrackingPair,
+                status: str,
+                rows: int,
+                upsert_result: Optional[UpsertResult] = None) -> SyncResult:
+        upsert_result = upsert_result or UpsertResult(0, 0)
+        return SyncResult(tracking_pair.currency_code_from,
+                          tracking_pair.currency_code_to,
+                          status,
+                          rows,
+                          upsert_result.inserted,
+                          upsert_result.updated)
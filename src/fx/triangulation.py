@@ -0,0 +1,115 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import polars as pl
+
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, DECIMAL_MONEY_TYPE
+
+
+@dataclass(frozen=True)
+class Hop:
+    currency_code_from: str
+    currency_code_to: str
+    # If true, the rate is stored as to->from and has to be calculated as 1 / rate
+    inverted: bool
+
+    def stored_pair(self) -> Tuple[str, str]:
+        if self.inverted:
+            return self.currency_code_to, self.currency_code_from
+        return self.currency_code_from, self.currency_code_to
+
+
+class CurrencyGraph:
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]], allow_inversion: bool = True):
+        self._edges: Dict[str, Dict[str, Hop]] = {}
+        direct = {(f.upper(), t.upper()) for f, t in pairs}
+        for f, t in direct:
+            self._edges.setdefault(f, {})[t] = Hop(f, t, False)
+        if allow_inversion:
+            for f, t in direct:
+                if (t, f) not in direct:
+                    self._edges.setdefault(t, {})[f] = Hop(t, f, True)
+
+    @classmethod
+    def from_sources(cls,
+                     sources: Iterable[AbstractExchangeRatesSource],
+                     allow_inversion: bool = True) -> 'CurrencyGraph':
+        pairs = [(f, t)
+                 for source in sources
+                 for f, codes in source.supported_pairs().items()
+                 for t in codes]
+        return cls(pairs, allow_inversion)
+
+    def currencies(self) -> Set[str]:
+        return set(self._edges) | {t for hops in self._edges.values() for t in hops}
+
+    def hops_from(self, currency_code: str) -> List[Hop]:
+        # Direct hops go first, so BFS prefers stored orientation among paths of the same length
+        hops = self._edges.get(currency_code, {}).values()
+        return sorted(hops, key=lambda h: (h.inverted, h.currency_code_to))
+
+
+class TriangulationEngine:
+    """
+    Precomputes the shortest conversion path between every pair of currencies of the graph
+    and derives cross rates from already stored rates of the path legs.
+    """
+
+    def __init__(self, graph: CurrencyGraph):
+        self._paths: Dict[Tuple[str, str], List[Hop]] = {}
+        for currency_code in graph.currencies():
+            self._paths.update(_shortest_paths_from(graph, currency_code))
+        self._dependent_pairs: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+        for pair, path in self._paths.items():
+            for hop in path:
+                self._dependent_pairs.setdefault(hop.stored_pair(), set()).add(pair)
+
+    def find_path(self, currency_code_from: str, currency_code_to: str) -> Optional[List[Hop]]:
+        return self._paths.get((currency_code_from.upper(), currency_code_to.upper()))
+
+    def dependent_pairs(self, currency_code_from: str, currency_code_to: str) -> Set[Tuple[str, str]]:
+        """
+        Returns pairs, which cross rates are derived from the stored pair
+        """
+        return self._dependent_pairs.get((currency_code_from.upper(), currency_code_to.upper()), set())
+
+    def derive_rates(self, path: List[Hop], rates: pl.LazyFrame) -> pl.LazyFrame:
+        """
+        Chains legs of the path by `date`, `rates` should contain stored rates of every leg.
+        Only dates, for which all legs have a rate, are returned.
+        """
+        result = None
+        for i, hop in enumerate(path):
+            stored_from, stored_to = hop.stored_pair()
+            leg_rate = pl.col('rate')
+            if hop.inverted:
+                leg_rate = pl.lit(1).truediv(leg_rate).cast(DECIMAL_MONEY_TYPE)
+            leg = (rates.filter(pl.col('currencyCodeFrom') == stored_from, pl.col('currencyCodeTo') == stored_to)
+                   .select('date', leg_rate.alias(f'rate{i}')))
+            if result is None:
+                result = leg.rename({'rate0': 'rate'})
+            else:
+                result = (result.join(leg, on='date', how='inner')
+                          .select('date', (pl.col('rate') * pl.col(f'rate{i}')).cast(DECIMAL_MONEY_TYPE).alias('rate')))
+        return result.select('date',
+                             pl.lit(path[0].currency_code_from).alias('currencyCodeFrom'),
+                             pl.lit(path[-1].currency_code_to).alias('currencyCodeTo'),
+                             'rate')
+
+
+def _shortest_paths_from(graph: CurrencyGraph, start: str) -> Dict[Tuple[str, str], List[Hop]]:
+    paths = {}
+    visited = {start}
+    queue = deque([(start, [])])
+    while queue:
+        currency_code, path = queue.popleft()
+        for hop in graph.hops_from(currency_code):
+            if hop.currency_code_to in visited:
+                continue
+            visited.add(hop.currency_code_to)
+            hop_path = path + [hop]
+            paths[(start, hop.currency_code_to)] = hop_path
+            queue.append((hop.currency_code_to, hop_path))
+    return paths
@@ -0,0 +1,79 @@
+import io
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+import polars as pl
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.fx.metrics import COLLECT_SECONDS, DB_WRITE_SECONDS, DB_WRITTEN_ROWS
+from src.fx.partitions import ensure_partitions
+
+_STAGING_TABLE = 'fx_rates_staging'
+_KEY_COLUMNS = ['date', 'currencyCodeFrom', 'currencyCodeTo']
+
+_CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE}
+(LIKE fx_rates INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+"""
+
+_STAGING_COLUMNS = ['date', 'currency_code_from', 'currency_code_to', 'rate']
+
+# xmax is 0 only for freshly inserted tuples, so it tells inserts from updates.
+# Rows with unchanged rate are neither inserted nor updated, so they aren't returned.
+_MERGE_SQL = f"""
+INSERT INTO fx_rates (date, currency_code_from, currency_code_to, rate)
+SELECT date, currency_code_from, currency_code_to, rate FROM {_STAGING_TABLE}
+ON CONFLICT ON CONSTRAINT fx_rates_unique_idx
+DO UPDATE SET rate = EXCLUDED.rate
+WHERE fx_rates.rate IS DISTINCT FROM EXCLUDED.rate
+RETURNING date::date, currency_code_from, currency_code_to, rate, (xmax = 0) AS inserted
+"""
+
+
+@dataclass(frozen=True)
+class UpsertResult:
+    inserted: int
+    updated: int
+    # Inserted and updated rows, if the writer tells them from unchanged ones
+    changed: Optional[pl.DataFrame] = field(default=None, compare=False, repr=False)
+
+    def changed_rates(self, rates: pl.DataFrame) -> pl.DataFrame:
+        """
+        Rows of `rates`, which were inserted or updated, or all of them, if the writer doesn't tell
+        """
+        return self.changed if self.changed is not None else rates
+
+
+async def bulk_upsert_rates(session: AsyncSession, rates: Union[pl.LazyFrame, pl.DataFrame]) -> UpsertResult:
+    """
+    Streams rates (SCHEMA columns) via COPY into a temp staging table and merges them into `fx_rates`
+    with one statement. Must be called inside a transaction, the staging table is emptied on commit.
+    Yearly partitions of the written dates are created on demand.
+    Inserted and updated rows are returned as `changed`.
+    """
+    with COLLECT_SECONDS.labels(stage='upsert').time():
+        df = await rates.lazy().unique(subset=_KEY_COLUMNS, keep='last').collect_async()
+    if df.is_empty():
+        return UpsertResult(0, 0)
+    buffer = io.BytesIO()
+    df.select(_KEY_COLUMNS + ['rate']).write_csv(buffer, include_header=False)
+    buffer.seek(0)
+
+    with DB_WRITE_SECONDS.labels(stage='copy').time():
+        await session.execute(text(_CREATE_STAGING_SQL))
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_to_table(_STAGING_TABLE,
+                                                             source=buffer,
+                                                             columns=_STAGING_COLUMNS,
+                                                             format='csv')
+    with DB_WRITE_SECONDS.labels(stage='merge').time():
+        await ensure_partitions(session, df.get_column('date').dt.year().unique().to_list())
+        rows = (await session.execute(text(_MERGE_SQL))).all()
+    inserted = sum(1 for row in rows if row.inserted)
+    DB_WRITTEN_ROWS.labels(result='inserted').inc(inserted)
+    DB_WRITTEN_ROWS.labels(result='updated').inc(len(rows) - inserted)
+    changed = pl.DataFrame([tuple(row[:4]) for row in rows], schema=df.select(_KEY_COLUMNS + ['rate']).schema,
+                           orient='row')
+    return UpsertResult(inserted=inserted, updated=len(rows) - inserted, changed=changed)
@@ -1,7 +1,96 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 
+import aiohttp
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from src.config import load_config
+from src.database import create_db_engine, create_session_factory
+from src.fx.aggregates import FxRateAggregateRepository
+from src.fx.cache import FxRatesCache
+from src.fx.gap_fill import FxFilledRateRepository
+from src.fx.rate_store import FxRateStore
 from src.fx.router import router as fx_router
+from src.fx.scraper import FxScraper
+from src.fx.service import FxRatesService
+from src.fx.snapshot import ParquetFxRateRepository
+from src.fx.source.factory import create_sources
+from src.fx.storage import create_tracking_pair_repository, open_rate_repository
+from src.fx.stream import FxRateBroker, PgNotifyRelay, create_notifier
+from src.fx.sync import PairSynchronizer, notify_all
+from src.fx.triangulation import TriangulationEngine, CurrencyGraph
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config = load_config()
+    engine = create_db_engine(config.database_cfg())
+    session_factory = create_session_factory(engine)
+    client_session = aiohttp.ClientSession()
+    exit_stack = AsyncExitStack()
+    rate_repository = await exit_stack.enter_async_context(open_rate_repository(config,
+                                                                                session_factory,
+                                                                                client_session))
+    sources = create_sources(config, client_session)
+    # Inversion rule is the same one sources apply, when spread is ignored
+    triangulation = TriangulationEngine(CurrencyGraph.from_sources(sources.values(),
+                                                                   config.polygon_cfg().ignore_spread))
+    snapshot_cfg = config.snapshot_cfg()
+    fx_rate_repository = ParquetFxRateRepository(snapshot_cfg.directory) if snapshot_cfg.serve_reads \
+        else rate_repository
+    gap_fill_cfg = config.gap_fill_cfg()
+    fx_rates_service = FxRatesService(fx_rate_repository,
+                                      FxRatesCache(config.fx_cache_cfg().max_size),
+                                      triangulation,
+                                      FxRateStore() if config.rate_store_cfg().enabled else None,
+                                      gap_fill_cfg,
+                                      FxFilledRateRepository(session_factory) if gap_fill_cfg.persist else None)
+    await fx_rates_service.load_rate_store()
+    app.state.fx_sources = sources
+    app.state.fx_rates_service = fx_rates_service
+    app.state.fx_rate_aggregate_repository = FxRateAggregateRepository(session_factory)
+    stream_cfg = config.stream_cfg()
+    broker = FxRateBroker(stream_cfg)
+    app.state.fx_rate_broker = broker
+    on_rates_written = notify_all(fx_rates_service.on_rates_written, broker.on_rates_written)
+
+    relay_task = None
+    notifier = create_notifier(stream_cfg)
+    if notifier is not None:
+        # Rates written by other replicas and CLIs invalidate caches and reach streams of this one as well
+        relay = PgNotifyRelay(config.database_cfg().url, stream_cfg.channel, on_rates_written, notifier.origin)
+        relay_task = asyncio.create_task(relay.run_forever())
+
+    scraper_task = None
+    scraper_cfg = config.scraper_cfg()
+    if scraper_cfg.enabled:
+        tracking_pair_repository = create_tracking_pair_repository(session_factory,
+                                                                   rate_repository,
+                                                                   gap_fill_cfg,
+                                                                   notifier)
+        scraper = FxScraper(sources,
+                            tracking_pair_repository,
+                            PairSynchronizer(tracking_pair_repository, on_rates_written),
+                            scraper_cfg.concurrency,
+                            config.failover_cfg().hedge_delay_seconds)
+        scraper_task = asyncio.create_task(scraper.run_forever(scraper_cfg.interval_seconds))
+    yield
+    for task in (scraper_task, relay_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await exit_stack.aclose()
+    await client_session.close()
+    await engine.dispose()
+
+
+app = FastAPI(title="InFinViz Rate Service", lifespan=lifespan)
+
+app.include_router(fx_router)
 
-app = FastAPI(title="InFinViz Rate Service")
 
-app.include_router(fx_router)
\ No newline at end of file
+@app.get('/metrics', include_in_schema=False)
+def metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
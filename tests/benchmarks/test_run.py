@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks.compare import find_regressions
+from benchmarks.run import Options, Scenario, run_scenario
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize('provider', ['polygon', 'alphavantage'])
+async def test_that_scenario_fetches_all_rows_of_all_pairs(provider):
+    result = await run_scenario(Scenario(provider, pairs=3, rows_per_pair=400), Options(api_requests=20))
+
+    assert result['fetch']['rows'] == 1200
+    assert result['persist'] is None
+    assert result['api']['requests'] == 20
+    assert result['api']['p50_ms'] <= result['api']['p99_ms']
+
+
+def test_that_only_metrics_worse_than_threshold_are_regressions():
+    def result(rows_per_second, p99_ms):
+        return {'scenarios': [{'provider': 'polygon', 'pairs': 1, 'rows_per_pair': 10,
+                               'fetch': {'rows_per_second': rows_per_second}, 'persist': None,
+                               'api': {'p50_ms': 1.0, 'p99_ms': p99_ms}, 'peak_rss_mb': 100}]}
+
+    regressions = find_regressions(result(1000, 2.0), result(950, 2.5), threshold=0.1)
+
+    assert [(metric, change) for _, metric, _, _, change in regressions] == [('api.p99_ms', 0.25)]
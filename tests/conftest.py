@@ -2,10 +2,15 @@ import os
 import shutil
 
 import pytest
+from sqlalchemy import create_engine
+from testcontainers.postgres import PostgresContainer
 from wiremock.constants import Config
 from wiremock.resources.mappings.resource import Mappings
 from wiremock.testing.testcontainer import wiremock_container
 
+from src import models
+import src.fx.models  # registers fx tables in Base.metadata
+
 
 @pytest.fixture(scope="module")
 def wm_server():
@@ -15,6 +20,16 @@ def wm_server():
         Mappings.delete_all_mappings()
 
 
+@pytest.fixture(scope="module")
+def pg_url():
+    with PostgresContainer('postgres:17') as pg:
+        url = pg.get_connection_url()
+        engine = create_engine(url)
+        models.Base.metadata.create_all(engine)
+        engine.dispose()
+        yield url
+
+
 @pytest.fixture
 def datadir(tmpdir, request):
     """
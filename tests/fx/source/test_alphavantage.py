@@ -1,4 +1,5 @@
-from datetime import date
+import json
+from datetime import date, timedelta
 from decimal import Decimal
 
 import aiohttp
@@ -9,7 +10,10 @@ import polars as pl
 
 from src.config import AlphavantageConfig
 from src.fx.source.abstract_source import SCHEMA
-from src.fx.source.alphavantage import AlphavantageFiatExchangeRatesSource, AlphavantageCryptoExchangeRatesSource
+from src.fx.source.alphavantage import AlphavantageFiatExchangeRatesSource, AlphavantageCryptoExchangeRatesSource, \
+    resolve_output_size
+from src.fx.source.response_cache import ResponseCache
+from src.fx.source.upstream import UpstreamError, UpstreamThrottledError
 from tests import util
 
 
@@ -32,16 +36,14 @@ async def test_that_fiat_response_with_3_records_will_be_parsed(wm_server, datad
 
 
 @pytest.mark.asyncio(loop_scope="session")
-async def test_that_500_status_code_will_be_converted_to_empty_df(wm_server):
+async def test_that_500_status_code_will_raise_error_instead_of_empty_df(wm_server):
     async with aiohttp.ClientSession() as session:
         payload = '{}'
         url = util.create_mock_random_uri(wm_server, payload, http_status_code=500)
-        conf = AlphavantageConfig(fiat_url_pattern=url, crypto_url_pattern='', api_key='123')
+        conf = AlphavantageConfig(fiat_url_pattern=url, crypto_url_pattern='', api_key='123', max_retries=0)
         source = AlphavantageFiatExchangeRatesSource(conf, session)
-        pldf = await source.get_exchange_rates('EUR', 'USD',
-                                               date(2025, 4, 9), date(2025, 4, 11))
-        actual = await pldf.collect_async()
-        assert actual.is_empty()
+        with pytest.raises(UpstreamError):
+            await source.get_exchange_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 11))
 
 
 @pytest.mark.asyncio(loop_scope="session")
@@ -79,3 +81,102 @@ async def test_that_fiat_to_crypto_with_3_records_will_be_parsed(wm_server, data
         ], schema=SCHEMA, orient='row')
         assert_frame_equal(actual, util.cast_rate(expected))
 
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_records_out_of_requested_window_will_be_skipped(wm_server, datadir):
+    async with aiohttp.ClientSession() as session:
+        payload = await util.read_file(f'{datadir}/fiat_3_records.json')
+        url = util.create_mock_random_uri(wm_server, payload)
+        conf = AlphavantageConfig(fiat_url_pattern=url, crypto_url_pattern='', api_key='123')
+        source = AlphavantageFiatExchangeRatesSource(conf, session)
+        pldf = await source.get_exchange_rates('EUR', 'USD',
+                                               date(2025, 4, 10), date(2025, 4, 10))
+        actual = await pldf.collect_async()
+        expected = pl.DataFrame([
+            [date(2025, 4, 10), 'EUR', 'USD', Decimal('17')],
+        ], schema=SCHEMA, orient='row')
+        assert_frame_equal(actual, util.cast_rate(expected))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_streamed_response_will_be_parsed_within_requested_window(wm_server, datadir):
+    async with aiohttp.ClientSession() as session:
+        payload = await util.read_file(f'{datadir}/fiat_3_records.json')
+        url = util.create_mock_random_uri(wm_server, payload)
+        conf = AlphavantageConfig(fiat_url_pattern=url, crypto_url_pattern='', api_key='123', stream_responses=True)
+        source = AlphavantageFiatExchangeRatesSource(conf, session)
+        pldf = await source.get_exchange_rates('EUR', 'USD',
+                                               date(2025, 4, 10), date(2025, 4, 11))
+        actual = await pldf.sort('date').collect_async()
+        expected = pl.DataFrame([
+            [date(2025, 4, 10), 'EUR', 'USD', Decimal('17')],
+            [date(2025, 4, 11), 'EUR', 'USD', Decimal('13')],
+        ], schema=SCHEMA, orient='row')
+        assert_frame_equal(actual, util.cast_rate(expected))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_only_rate_limit_message_will_be_reported_as_throttling(wm_server):
+    async with aiohttp.ClientSession() as session:
+        messages = {
+            'Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day.':
+                UpstreamThrottledError,
+            'Thank you for using Alpha Vantage! This is a premium endpoint.': UpstreamError,
+        }
+        for message, error in messages.items():
+            url = util.create_mock_random_uri(wm_server, json.dumps({'Information': message}))
+            conf = AlphavantageConfig(fiat_url_pattern=url, crypto_url_pattern='', api_key='123', max_retries=0)
+            source = AlphavantageFiatExchangeRatesSource(conf, session)
+            with pytest.raises(error) as e:
+                await source.get_exchange_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 11))
+            assert e.type is error
+
+
+class _Response:
+    def __init__(self, body):
+        self.status = 200
+        self.body = json.dumps(body).encode()
+        self.headers = {}
+
+    async def read(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, headers=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_quota_note_will_not_be_cached(tmp_path):
+    session = _Session([
+        _Response({'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute.'}),
+        _Response({'Time Series FX (Daily)': {'2025-04-09': {'4. close': '1.1'}}}),
+    ])
+    conf = AlphavantageConfig(fiat_url_pattern='http://test/query', crypto_url_pattern='', api_key='123',
+                              max_retries=0)
+    source = AlphavantageFiatExchangeRatesSource(conf, session, response_cache=ResponseCache(str(tmp_path), 300))
+
+    with pytest.raises(UpstreamThrottledError):
+        await source.get_exchange_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 11))
+    df = await (await source.get_exchange_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 11))).collect_async()
+
+    assert session.calls == 2
+    assert df.get_column('rate').to_list() == [Decimal('1.1')]
+
+
+def test_that_compact_output_will_be_requested_only_within_100_days():
+    today = date.today()
+    assert resolve_output_size(today - timedelta(days=99)) == 'compact'
+    assert resolve_output_size(today - timedelta(days=100)) == 'full'
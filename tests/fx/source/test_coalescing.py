@@ -0,0 +1,85 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, SCHEMA
+from src.fx.source.coalescing import CoalescingExchangeRatesSource
+from tests import util
+
+
+class _SlowSource(AbstractExchangeRatesSource):
+    def __init__(self, error: Exception = None):
+        super().__init__({'usd': {'eur'}})
+        self.calls = 0
+        self.error = error
+
+    async def get_exchange_rates(self, from_currency_code, to_currency_code, from_date, to_date):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return util.cast_rate(pl.LazyFrame([[from_date, from_currency_code, to_currency_code, Decimal('0.9')]],
+                                           schema=SCHEMA, orient='row'))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _request(source: AbstractExchangeRatesSource, from_date: date = date(2025, 4, 9)):
+    return source.get_exchange_rates('USD', 'EUR', from_date, date(2025, 4, 10))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_concurrent_identical_requests_will_share_one_call():
+    source = _SlowSource()
+    coalescing = CoalescingExchangeRatesSource(source, 0)
+    results = await asyncio.gather(_request(coalescing), _request(coalescing), _request(coalescing, date(2025, 4, 8)))
+    assert source.calls == 2
+    assert [r.collect().height for r in results] == [1, 1, 1]
+    assert coalescing.is_pair_supported('USD', 'EUR')
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_result_will_be_reused_until_ttl_expires():
+    source = _SlowSource()
+    clock = _Clock()
+    coalescing = CoalescingExchangeRatesSource(source, 5, clock)
+    await _request(coalescing)
+    clock.now = 4
+    await _request(coalescing)
+    assert source.calls == 1
+    clock.now = 6
+    await _request(coalescing)
+    assert source.calls == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_error_will_be_propagated_to_all_waiters_and_not_reused():
+    source = _SlowSource(RuntimeError('Upstream is down'))
+    coalescing = CoalescingExchangeRatesSource(source, 5)
+    results = await asyncio.gather(_request(coalescing), _request(coalescing), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    with pytest.raises(RuntimeError):
+        await _request(coalescing)
+    assert source.calls == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_cancelled_waiter_will_not_cancel_shared_fetch():
+    source = _SlowSource()
+    coalescing = CoalescingExchangeRatesSource(source, 0)
+    cancelled = asyncio.create_task(_request(coalescing))
+    other = asyncio.create_task(_request(coalescing))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    assert (await other).collect().height == 1
+    assert cancelled.cancelled()
+    assert source.calls == 1
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, SCHEMA, create_empty_df
+from src.fx.source.failover import FailoverExchangeRatesSource
+from src.fx.source.upstream import UpstreamThrottledError
+from tests import util
+
+
+class _Source(AbstractExchangeRatesSource):
+    def __init__(self, rate: Decimal = None, delay: float = 0, error: Exception = None, supported_pairs=None):
+        super().__init__(supported_pairs or {'usd': {'eur'}})
+        self.rate = rate
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def get_exchange_rates(self, from_currency_code, to_currency_code, from_date, to_date):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        if self.rate is None:
+            return create_empty_df()
+        return util.cast_rate(pl.LazyFrame([[from_date, from_currency_code, to_currency_code, self.rate]],
+                                           schema=SCHEMA, orient='row'))
+
+
+async def _get_rate(source: FailoverExchangeRatesSource):
+    df = await (await source.get_exchange_rates('USD', 'EUR', date(2025, 4, 1), date(2025, 4, 1))).collect_async()
+    return df.get_column('rate').to_list()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_secondary_source_wont_be_requested_when_primary_returns_rates():
+    primary, secondary = _Source(Decimal('0.9')), _Source(Decimal('0.8'))
+    source = FailoverExchangeRatesSource([('primary', primary), ('secondary', secondary)], hedge_delay_seconds=1)
+
+    assert await _get_rate(source) == [Decimal('0.9')]
+    assert secondary.calls == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize('primary', [_Source(error=RuntimeError('Provider is down')), _Source(rate=None)])
+async def test_that_failed_or_empty_primary_falls_through_to_secondary(primary):
+    source = FailoverExchangeRatesSource([('primary', primary), ('secondary', _Source(Decimal('0.8')))])
+
+    assert await _get_rate(source) == [Decimal('0.8')]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_slow_primary_will_be_hedged_and_cancelled():
+    primary, secondary = _Source(Decimal('0.9'), delay=10), _Source(Decimal('0.8'))
+    source = FailoverExchangeRatesSource([('primary', primary), ('secondary', secondary)], hedge_delay_seconds=0.01)
+
+    assert await _get_rate(source) == [Decimal('0.8')]
+    await asyncio.sleep(0)
+    assert primary.cancelled
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_hedged_primary_result_is_used_when_secondary_fails():
+    primary, secondary = _Source(Decimal('0.9'), delay=0.05), _Source(error=RuntimeError('Provider is down'))
+    source = FailoverExchangeRatesSource([('primary', primary), ('secondary', secondary)], hedge_delay_seconds=0.01)
+
+    assert await _get_rate(source) == [Decimal('0.9')]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_first_error_is_raised_when_all_sources_fail():
+    source = FailoverExchangeRatesSource([('primary', _Source(error=UpstreamThrottledError('Quota'))),
+                                          ('secondary', _Source(error=RuntimeError('Provider is down')))])
+
+    with pytest.raises(UpstreamThrottledError):
+        await _get_rate(source)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_sources_not_supporting_pair_are_skipped():
+    crypto = _Source(Decimal('0.9'), supported_pairs={'btc': {'usd'}})
+    source = FailoverExchangeRatesSource([('crypto', crypto), ('fiat', _Source(Decimal('0.8')))])
+
+    assert await _get_rate(source) == [Decimal('0.8')]
+    assert crypto.calls == 0
+    assert source.is_pair_supported('BTC', 'USD')
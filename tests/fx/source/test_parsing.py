@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import polars as pl
+
+from src.fx.source.abstract_source import DECIMAL_MONEY_TYPE
+from src.fx.source.parsing import to_money
+
+
+def test_that_numeric_strings_are_cast_to_money():
+    actual = to_money(pl.Series('rate', ['1.0842', '0.00000123', '65000']))
+
+    assert actual.dtype == DECIMAL_MONEY_TYPE
+    assert actual.to_list() == [Decimal('1.0842'), Decimal('0.00000123'), Decimal('65000')]
+
+
+def test_that_exponent_notation_is_cast_to_money():
+    actual = to_money(pl.Series('rate', ['2.1e-6', '1E+3', '0.5']))
+
+    assert actual.to_list() == [Decimal('0.0000021'), Decimal('1000'), Decimal('0.5')]
+
+
+def test_that_floats_are_cast_as_their_shortest_representation():
+    values = [1.0842, 2.1e-06, 0.1, 12345.6789, 7.0]
+
+    actual = to_money(pl.Series('c', values, dtype=pl.Float64))
+
+    assert actual.to_list() == [Decimal(str(v)).quantize(Decimal('1E-10')) for v in values]
+    assert actual.name == 'c'
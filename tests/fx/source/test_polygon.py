@@ -1,3 +1,5 @@
+import json
+import uuid
 from datetime import date
 from decimal import Decimal
 
@@ -8,7 +10,8 @@ from polars.testing import assert_frame_equal
 
 from src.config import PolygonConfig
 from src.fx.source.abstract_source import SCHEMA
-from src.fx.source.polygon import PolygonFiatExchangeRatesSource, PolygonCryptoExchangeRatesSource
+from src.fx.source.polygon import PolygonFiatExchangeRatesSource, PolygonCryptoExchangeRatesSource, split_date_range
+from src.fx.source.upstream import UpstreamError, UpstreamThrottledError
 from tests import util
 
 
@@ -88,4 +91,83 @@ async def test_crypto_source_that_empty_df_will_be_returned_if_spread_is_not_all
         pldf = await source.get_exchange_rates('USD', 'BTC',
                                                date(2025, 11, 30), date(2025, 12, 2))
         actual = await pldf.sort('date').collect_async()
-        assert actual.is_empty()
\ No newline at end of file
+        assert actual.is_empty()
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_throttled_request_will_raise_error_instead_of_empty_df(wm_server):
+    async with aiohttp.ClientSession() as session:
+        url = util.create_mock_random_uri(wm_server, '{}', http_status_code=429)
+        conf = PolygonConfig(url, '123', True, max_retries=0)
+        source = PolygonFiatExchangeRatesSource(conf, session)
+        with pytest.raises(UpstreamThrottledError):
+            await source.get_exchange_rates('USD', 'EUR', date(2025, 12, 1), date(2025, 12, 2))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_next_pages_will_be_followed_and_deduplicated(wm_server):
+    async with aiohttp.ClientSession() as session:
+        page_2_uri = f'/{str(uuid.uuid4())}'
+        util.create_mock(f'{page_2_uri}?apiKey=123', json.dumps({
+            'results': [{'t': 1764547200000, 'c': 0.86152}, {'t': 1764633600000, 'c': 0.85993}]
+        }))
+        url = util.create_mock_random_uri(wm_server, json.dumps({
+            'results': [{'t': 1764547200000, 'c': 0.86152}],
+            'next_url': wm_server.get_url(page_2_uri)
+        }))
+        conf = PolygonConfig(url, '123', True)
+        source = PolygonFiatExchangeRatesSource(conf, session)
+        pldf = await source.get_exchange_rates('USD', 'EUR',
+                                               date(2025, 12, 1), date(2025, 12, 2))
+        actual = await pldf.sort('date').collect_async()
+        expected = pl.DataFrame([
+            [date(2025, 12, 1), 'USD', 'EUR', Decimal('0.86152')],
+            [date(2025, 12, 2), 'USD', 'EUR', Decimal('0.85993')],
+        ], schema=SCHEMA, orient='row')
+        assert_frame_equal(actual, util.cast_rate(expected))
+
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_failed_next_page_will_raise_error_instead_of_partial_range(wm_server):
+    async with aiohttp.ClientSession() as session:
+        page_2_uri = f'/{str(uuid.uuid4())}'
+        util.create_mock(f'{page_2_uri}?apiKey=123', '{}', http_status_code=503)
+        url = util.create_mock_random_uri(wm_server, json.dumps({
+            'results': [{'t': 1764547200000, 'c': 0.86152}],
+            'next_url': wm_server.get_url(page_2_uri)
+        }))
+        conf = PolygonConfig(url, '123', True, max_retries=0)
+        source = PolygonFiatExchangeRatesSource(conf, session)
+        with pytest.raises(UpstreamError):
+            await source.get_exchange_rates('USD', 'EUR', date(2025, 12, 1), date(2025, 12, 2))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_streamed_pages_will_be_parsed(wm_server):
+    async with aiohttp.ClientSession() as session:
+        page_2_uri = f'/{str(uuid.uuid4())}'
+        util.create_mock(f'{page_2_uri}?apiKey=123', json.dumps({
+            'results': [{'t': 1764633600000, 'c': 0.85993}]
+        }))
+        url = util.create_mock_random_uri(wm_server, json.dumps({
+            'ticker': 'C:USDEUR',
+            'results': [{'t': 1764547200000, 'c': 0.86152}],
+            'next_url': wm_server.get_url(page_2_uri)
+        }))
+        conf = PolygonConfig(url, '123', True, stream_responses=True)
+        source = PolygonFiatExchangeRatesSource(conf, session)
+        pldf = await source.get_exchange_rates('USD', 'EUR',
+                                               date(2025, 12, 1), date(2025, 12, 2))
+        actual = await pldf.sort('date').collect_async()
+        expected = pl.DataFrame([
+            [date(2025, 12, 1), 'USD', 'EUR', Decimal('0.86152')],
+            [date(2025, 12, 2), 'USD', 'EUR', Decimal('0.85993')],
+        ], schema=SCHEMA, orient='row')
+        assert_frame_equal(actual, util.cast_rate(expected))
+
+def test_that_long_range_will_be_split_into_windows():
+    assert split_date_range(date(2024, 1, 1), date(2024, 1, 10), 4) == [
+        (date(2024, 1, 1), date(2024, 1, 4)),
+        (date(2024, 1, 5), date(2024, 1, 8)),
+        (date(2024, 1, 9), date(2024, 1, 10)),
+    ]
@@ -0,0 +1,46 @@
+from datetime import date, datetime, timezone, timedelta
+
+import pytest
+
+from src.fx.source.response_cache import ResponseCache, cache_key
+
+
+class _Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_that_api_key_will_be_stripped_from_cache_key():
+    assert cache_key('https://www.alphavantage.co/query?function=FX_DAILY&apikey=secret&outputsize=full') == \
+           'https://www.alphavantage.co/query?function=FX_DAILY&outputsize=full'
+    assert cache_key('https://api.polygon.io/v2/aggs/ticker/C:USDEUR/range/1/day/2024-01-01/2024-12-31?apiKey=1') == \
+           'https://api.polygon.io/v2/aggs/ticker/C:USDEUR/range/1/day/2024-01-01/2024-12-31'
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_stored_response_will_be_loaded_by_url_with_another_key(tmp_path):
+    cache = ResponseCache(str(tmp_path), 300)
+    await cache.store('http://test/rates?apiKey=1', b'{"results": []}', {'ETag': '"v1"'})
+
+    actual = await cache.load('http://test/rates?apiKey=2')
+
+    assert actual.body == b'{"results": []}'
+    assert actual.conditional_headers() == {'If-None-Match': '"v1"'}
+    assert await cache.load('http://test/other?apiKey=1') is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_only_ranges_ended_before_storing_will_be_fresh_forever(tmp_path):
+    clock = _Clock(datetime(2025, 4, 10, 12, tzinfo=timezone.utc))
+    cache = ResponseCache(str(tmp_path), 300, clock)
+    cached = await cache.store('http://test', b'{}', {})
+
+    clock.now += timedelta(days=30)
+
+    assert cache.is_fresh(cached, date(2025, 4, 9))
+    assert not cache.is_fresh(cached, date(2025, 4, 10))
+    assert not cache.is_fresh(await cache.load('http://test'), None)
+    assert cache.is_fresh(await cache.touch('http://test', cached), date(2025, 5, 10))
@@ -0,0 +1,63 @@
+import json
+
+import polars as pl
+import pytest
+
+from src.fx.source.streaming import ColumnarBuffer, decode_object
+
+
+async def _chunks(payload: bytes, size: int):
+    for i in range(0, len(payload), size):
+        yield payload[i:i + size]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+async def test_that_members_of_streamed_key_will_be_passed_one_by_one(chunk_size):
+    document = {
+        'Meta Data': {'1. Information': 'Forex Daily "quoted" {braces}', '2. From Symbol': 'EUR'},
+        'Time Series FX (Daily)': {
+            '2025-04-11': {'1. open': '1.1', '4. close': '13'},
+            '2025-04-10': {'1. open': '1.2\\', '4. close': '17'}
+        },
+        'count': 2
+    }
+    members = []
+
+    actual = await decode_object(_chunks(json.dumps(document, indent=2).encode(), chunk_size),
+                                 lambda key: key.startswith('Time Series'),
+                                 lambda key, value: members.append((key, value)))
+
+    assert members == list(document['Time Series FX (Daily)'].items())
+    assert actual == {'Meta Data': document['Meta Data'], 'Time Series FX (Daily)': None, 'count': 2}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_items_of_streamed_array_will_be_passed_without_keys():
+    document = {'results': [{'t': 1, 'c': 0.5}, {'t': 2, 'c': 1e-7}], 'next_url': None}
+    members = []
+
+    actual = await decode_object(_chunks(json.dumps(document).encode(), 5),
+                                 lambda key: key == 'results',
+                                 lambda key, value: members.append((key, value)))
+
+    assert members == [(None, {'t': 1, 'c': 0.5}), (None, {'t': 2, 'c': 1e-7})]
+    assert actual == {'results': None, 'next_url': None}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_truncated_document_will_raise_error():
+    with pytest.raises(ValueError):
+        await decode_object(_chunks(b'{"results": [{"t": 1', 4), lambda key: True, lambda key, value: None)
+
+
+def test_that_buffered_rows_will_be_collected_into_one_frame():
+    buffer = ColumnarBuffer({'date': pl.String, 'rate': pl.String}, chunk_rows=2)
+    for i in range(5):
+        buffer.append(f'2025-01-0{i + 1}', str(i))
+
+    actual = buffer.to_frame()
+
+    assert actual.height == 5
+    assert actual.get_column('rate').to_list() == ['0', '1', '2', '3', '4']
+    assert ColumnarBuffer({'t': pl.Int64}).to_frame().schema == pl.Schema({'t': pl.Int64})
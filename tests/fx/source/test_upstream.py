@@ -0,0 +1,195 @@
+import json
+from datetime import date
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.fx.source.response_cache import ResponseCache
+from src.fx.source.upstream import TokenBucket, UpstreamClient, RetryPolicy, UpstreamThrottledError, \
+    RateLimiterRegistry, UpstreamError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Response:
+    def __init__(self, status: int, body=None, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def json(self):
+        return self.body
+
+    async def read(self):
+        return json.dumps(self.body).encode()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.headers = []
+
+    def get(self, url, headers=None):
+        self.calls += 1
+        self.headers.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_bucket_will_space_calls_to_fit_rate():
+    clock = _Clock()
+    bucket = TokenBucket(calls_per_minute=6, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(4):
+        await bucket.acquire()
+    assert clock.sleeps == [pytest.approx(10), pytest.approx(10)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_buckets_of_quota_shares_will_not_start_with_whole_burst_each():
+    clock = _Clock()
+    buckets = [TokenBucket(calls_per_minute=60 / 4, burst=1 / 4, clock=clock, sleep=clock.sleep) for _ in range(4)]
+    for bucket in buckets:
+        await bucket.acquire()
+    assert clock.sleeps[0] == pytest.approx(3)
+
+def test_that_bucket_will_be_shared_by_provider_and_key():
+    registry = RateLimiterRegistry()
+    assert registry.get('polygon', 'key', 5) is registry.get('polygon', 'key', 5)
+    assert registry.get('polygon', 'key', 5) is not registry.get('polygon', 'other', 5)
+    assert registry.get('polygon', 'key', None) is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_throttled_and_failed_responses_will_be_retried():
+    clock = _Clock()
+    session = _Session([_Response(429, headers={'Retry-After': '7'}), _Response(503), _Response(200, {'a': 1})])
+    client = UpstreamClient(session, retry_policy=RetryPolicy(max_retries=3, backoff_seconds=1), sleep=clock.sleep)
+    assert await client.get_json('http://test') == {'a': 1}
+    assert session.calls == 3
+    assert clock.sleeps[0] == 7
+    assert 1 <= clock.sleeps[1] <= 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_exhausted_retries_and_rejections_will_be_reported_separately_from_no_data():
+    clock = _Clock()
+    client = UpstreamClient(_Session([_Response(429), _Response(429)]),
+                            retry_policy=RetryPolicy(max_retries=1), sleep=clock.sleep)
+    with pytest.raises(UpstreamThrottledError):
+        await client.get_json('http://test')
+    client = UpstreamClient(_Session([_Response(500), _Response(500)]),
+                            retry_policy=RetryPolicy(max_retries=1), sleep=clock.sleep)
+    with pytest.raises(UpstreamError) as e:
+        await client.get_json('http://test')
+    assert not isinstance(e.value, UpstreamThrottledError)
+    session = _Session([_Response(401)])
+    client = UpstreamClient(session, sleep=clock.sleep)
+    with pytest.raises(UpstreamError):
+        await client.get_json('http://test')
+    assert session.calls == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_cached_response_will_be_reused_and_revalidated(tmp_path):
+    clock = _Clock()
+    cache = ResponseCache(str(tmp_path), live_ttl_seconds=0)
+    session = _Session([_Response(200, {'a': 1}, headers={'ETag': '"v1"'}), _Response(304)])
+    client = UpstreamClient(session, sleep=clock.sleep, response_cache=cache)
+
+    assert await client.get_json('http://test?apiKey=1', date(2000, 1, 1)) == {'a': 1}
+    assert await client.get_json('http://test?apiKey=1', date(2000, 1, 1)) == {'a': 1}
+    assert session.calls == 1
+    assert await client.get_json('http://test?apiKey=1') == {'a': 1}
+    assert session.calls == 2
+    assert session.headers == [None, {'If-None-Match': '"v1"'}]
+
+
+class _StreamedResponse(_Response):
+    def __init__(self, chunks):
+        super().__init__(200)
+        self.chunks = list(chunks)
+        self.content = self
+
+    async def iter_chunked(self, size):
+        while self.chunks:
+            yield self.chunks.pop(0)
+
+
+async def _read_first_chunk(response):
+    return await anext(response.content.iter_chunked(1024))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_streamed_response_will_be_cached_whole(tmp_path):
+    clock = _Clock()
+    cache = ResponseCache(str(tmp_path), live_ttl_seconds=0)
+    client = UpstreamClient(_Session([_StreamedResponse([b'{"a": ', b'1}', b'\n'])]), sleep=clock.sleep,
+                            response_cache=cache)
+
+    assert await client.get('http://test', _read_first_chunk) == b'{"a": '
+
+    assert (await cache.load('http://test')).body == b'{"a": 1}\n'
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_failing_cache_will_not_fail_read_response(tmp_path):
+    clock = _Clock()
+    cache = ResponseCache(str(tmp_path), live_ttl_seconds=0)
+
+    async def store_recorded(url, response):
+        raise OSError('No space left on device')
+
+    cache.store_recorded = store_recorded
+    client = UpstreamClient(_Session([_Response(200, {'a': 1})]), sleep=clock.sleep, response_cache=cache)
+
+    assert await client.get_json('http://test') == {'a': 1}
+
+
+async def _read_unless_throttled(response):
+    body = await response.json()
+    if 'Note' in body:
+        raise UpstreamThrottledError(body['Note'])
+    return body
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_throttling_reported_in_body_will_be_retried():
+    clock = _Clock()
+    session = _Session([_Response(200, {'Note': 'limit'}), _Response(200, {'a': 1})])
+    client = UpstreamClient(session, retry_policy=RetryPolicy(max_retries=1, backoff_seconds=1), sleep=clock.sleep)
+
+    assert await client.get('http://test', _read_unless_throttled) == {'a': 1}
+    assert session.calls == 2
+    assert 0.5 <= clock.sleeps[0] <= 1
+
+    client = UpstreamClient(_Session([_Response(200, {'Note': 'limit'}), _Response(200, {'Note': 'limit'})]),
+                            retry_policy=RetryPolicy(max_retries=1), sleep=clock.sleep)
+    with pytest.raises(UpstreamThrottledError):
+        await client.get('http://test', _read_unless_throttled)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_request_durations_will_be_labelled_by_ticker():
+    labels = {'provider': 'polygon', 'ticker': 'C:USDTHB', 'status': '200'}
+    before = REGISTRY.get_sample_value('fx_upstream_request_duration_seconds_count', labels) or 0
+    client = UpstreamClient(_Session([_Response(200, {'a': 1})]), provider='polygon')
+    await client.get_json('http://test', ticker='C:USDTHB')
+    assert REGISTRY.get_sample_value('fx_upstream_request_duration_seconds_count', labels) == before + 1
@@ -0,0 +1,93 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.config import DatabaseConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.aggregates import FxRateAggregateRepository, FxRateAggregator, affected_aggregates, affected_range, \
+    aggregate_rates
+from src.fx.models import FxTrackingPair
+from src.fx.memory_repository import InMemoryFxRateRepository
+from src.fx.repository import FxTrackingPairRepository, read_locked_history
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+_HISTORY = _rates([
+    [date(2024, 12, 30), 'USD', 'EUR', Decimal('1.1')],
+    [date(2024, 12, 31), 'USD', 'EUR', Decimal('1.3')],
+    [date(2025, 1, 2), 'USD', 'EUR', Decimal('1.2')],
+    [date(2025, 1, 6), 'USD', 'EUR', Decimal('1.0')],
+])
+
+
+def test_that_rates_will_be_aggregated_per_calendar_month():
+    df = aggregate_rates(_HISTORY.lazy(), 'month').collect()
+
+    assert df.select('periodStart', 'open', 'high', 'low', 'close', 'mean', 'count').rows() == [
+        (date(2024, 12, 1), Decimal('1.1'), Decimal('1.3'), Decimal('1.1'), Decimal('1.3'), Decimal('1.2'), 2),
+        (date(2025, 1, 1), Decimal('1.2'), Decimal('1.2'), Decimal('1.0'), Decimal('1.0'), Decimal('1.1'), 2)]
+
+
+def test_that_affected_range_covers_week_started_in_previous_year():
+    assert affected_range(date(2025, 1, 2), date(2025, 1, 2)) == (date(2024, 12, 30), date(2025, 12, 31))
+
+
+def test_that_only_periods_of_written_dates_will_be_recomputed():
+    df = affected_aggregates(_HISTORY, pl.Series([date(2025, 1, 2)]))
+
+    assert df.select('period', 'periodStart', 'count').rows() == [('week', date(2024, 12, 30), 3),
+                                                                   ('month', date(2025, 1, 1), 2),
+                                                                   ('year', date(2025, 1, 1), 2)]
+
+
+class _Session:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_history_will_be_read_under_pair_lock_and_include_rates_not_yet_visible_in_store():
+    session = _Session()
+    rate_repository = InMemoryFxRateRepository()
+    await rate_repository.save_rates(_HISTORY.filter(pl.col('date') < date(2025, 1, 6)))
+
+    history = await read_locked_history(session, rate_repository, _HISTORY.filter(pl.col('date') >= date(2025, 1, 2)),
+                                        date(2024, 12, 30), date(2025, 12, 31))
+
+    assert session.statements == [('SELECT pg_advisory_xact_lock(hashtext(:key))', {'key': 'fx_rates:USD/EUR'})]
+    assert history.equals(_HISTORY)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_aggregates_will_follow_written_rates(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    async with session_factory.begin() as session:
+        session.add(FxTrackingPair(currency_code_from='USD', currency_code_to='KZT',
+                                   sources_config={'sources': ['polygon_fiat']}, last_sync_date=datetime(2025, 4, 1),
+                                   last_sync_status='OK', last_rate_date=datetime(2025, 3, 3)))
+    tracking_pair_repository = FxTrackingPairRepository(session_factory, refreshers=[FxRateAggregator()])
+    await tracking_pair_repository.save_backfill_result('USD', 'KZT', _rates([
+        [date(2025, 3, 3), 'USD', 'KZT', Decimal('490')],
+        [date(2025, 3, 4), 'USD', 'KZT', Decimal('500')],
+    ]), None)
+    await tracking_pair_repository.save_backfill_result('USD', 'KZT', _rates([
+        [date(2025, 3, 4), 'USD', 'KZT', Decimal('510')],
+        [date(2025, 4, 1), 'USD', 'KZT', Decimal('505')],
+    ]), None)
+    aggregates = await FxRateAggregateRepository(session_factory).get_aggregates('USD', 'KZT', 'month',
+                                                                                 date(2025, 3, 15), date(2025, 4, 30))
+    await engine.dispose()
+    assert aggregates.select('periodStart', 'open', 'high', 'close', 'mean', 'count').rows() == [
+        (date(2025, 3, 1), Decimal('490'), Decimal('510'), Decimal('510'), Decimal('500'), 2),
+        (date(2025, 4, 1), Decimal('505'), Decimal('505'), Decimal('505'), Decimal('505'), 1)]
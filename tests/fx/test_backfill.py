@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.backfill import BackfillProgress, BackfillRunner, BackfillUnitResult, plan_units
+from src.fx.models import FxTrackingPair
+from src.fx.repository import rows_to_df
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.sync import SYNC_STATUS_FAILED, SYNC_STATUS_OK
+from src.fx.writer import UpsertResult
+from tests import util
+
+
+class _TrackingPairRepository:
+    def __init__(self):
+        self.saved = []
+
+    async def save_backfill_result(self, currency_code_from, currency_code_to, rates, backfilled):
+        self.saved.append((currency_code_from, currency_code_to, rates.height, backfilled))
+        return UpsertResult(rates.height, 0)
+
+
+def _tracking_pair(curr_from: str,
+                   curr_to: str,
+                   backfilled_from: datetime = None,
+                   backfilled_to: datetime = None,
+                   sources=('polygon_fiat',)) -> FxTrackingPair:
+    return FxTrackingPair(currency_code_from=curr_from,
+                          currency_code_to=curr_to,
+                          sources_config={'sources': list(sources)},
+                          last_rate_date=datetime(2025, 4, 1),
+                          backfilled_from=backfilled_from,
+                          backfilled_to=backfilled_to)
+
+
+def _fetch_unit(unit) -> BackfillUnitResult:
+    if unit.currency_code_to == 'RUB' and unit.from_date == date(2024, 1, 11):
+        return BackfillUnitResult(unit, SYNC_STATUS_FAILED, rows_to_df([]))
+    rates = util.cast_rate(pl.DataFrame([[unit.from_date, unit.currency_code_from, unit.currency_code_to,
+                                          Decimal('0.9')]], schema=SCHEMA, orient='row'))
+    return BackfillUnitResult(unit, SYNC_STATUS_OK, rates)
+
+
+def test_that_windows_before_checkpoint_will_be_skipped_on_resume():
+    tracking_pairs = [_tracking_pair('USD', 'EUR', datetime(2024, 1, 1), datetime(2024, 1, 10)),
+                      _tracking_pair('USD', 'RUB')]
+
+    units = plan_units(tracking_pairs, date(2024, 1, 1), date(2024, 1, 25), window_days=10)
+
+    assert [(u.currency_code_to, u.from_date, u.to_date) for u in units] == [
+        ('RUB', date(2024, 1, 1), date(2024, 1, 10)),
+        ('EUR', date(2024, 1, 11), date(2024, 1, 20)),
+        ('RUB', date(2024, 1, 11), date(2024, 1, 20)),
+        ('EUR', date(2024, 1, 21), date(2024, 1, 25)),
+        ('RUB', date(2024, 1, 21), date(2024, 1, 25))]
+    assert units[0].source_names == ('polygon_fiat',)
+    assert len(plan_units(tracking_pairs, date(2024, 1, 1), date(2024, 1, 25), 10, resume=False)) == 6
+
+
+def test_that_checkpoint_starting_after_from_date_will_not_be_resumed():
+    tracking_pairs = [_tracking_pair('USD', 'EUR', datetime(2024, 1, 11), datetime(2024, 1, 20)),
+                      _tracking_pair('USD', 'RUB', None, datetime(2024, 1, 20))]
+
+    units = plan_units(tracking_pairs, date(2024, 1, 1), date(2024, 1, 25), window_days=10)
+
+    assert len(units) == 6
+
+
+def test_that_pair_with_whole_history_source_will_be_loaded_as_one_unit():
+    tracking_pairs = [_tracking_pair('USD', 'EUR', sources=('polygon_fiat', 'alphavantage_fiat')),
+                      _tracking_pair('USD', 'RUB', datetime(2024, 1, 1), datetime(2024, 1, 25),
+                                     sources=('alphavantage_fiat',))]
+
+    units = plan_units(tracking_pairs, date(2024, 1, 1), date(2024, 1, 25), window_days=10)
+
+    assert [(u.currency_code_to, u.from_date, u.to_date) for u in units] == [
+        ('EUR', date(2024, 1, 1), date(2024, 1, 25))]
+
+
+def test_that_checkpoint_moves_only_over_completed_windows_without_gaps():
+    units = plan_units([_tracking_pair('USD', 'EUR')], date(2024, 1, 1), date(2024, 1, 30), window_days=10)
+    progress = BackfillProgress(units)
+
+    assert progress.complete(units[1]) is None
+    assert progress.complete(units[0]) == (date(2024, 1, 1), date(2024, 1, 20))
+    assert progress.complete(units[2]) == (date(2024, 1, 1), date(2024, 1, 30))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_failed_window_stops_checkpoint_of_its_pair_only():
+    repository = _TrackingPairRepository()
+    units = plan_units([_tracking_pair('USD', 'EUR'), _tracking_pair('USD', 'RUB')],
+                       date(2024, 1, 1), date(2024, 1, 30), window_days=10)
+
+    with ThreadPoolExecutor(2) as executor:
+        summary = await BackfillRunner(repository, executor, 3, _fetch_unit).run(units)
+
+    assert (summary.units, summary.failed, summary.rows, summary.inserted) == (6, 1, 5, 5)
+    checkpoints = {}
+    for _, curr_to, _, backfilled in repository.saved:
+        if backfilled is not None:
+            checkpoints[curr_to] = max(backfilled, checkpoints.get(curr_to, backfilled))
+    assert checkpoints == {'EUR': (date(2024, 1, 1), date(2024, 1, 30)), 'RUB': (date(2024, 1, 1), date(2024, 1, 10))}
@@ -0,0 +1,52 @@
+from datetime import date
+
+import polars as pl
+
+from src.fx.cache import FxRatesCache, FxRatesCacheKey
+
+
+def _key(curr_from: str, curr_to: str, day: int) -> FxRatesCacheKey:
+    return FxRatesCacheKey(curr_from, curr_to, date(2025, 4, day), date(2025, 4, day))
+
+
+def _df(value: int) -> pl.DataFrame:
+    return pl.DataFrame({'value': [value]})
+
+
+def test_that_least_recently_used_entry_will_be_evicted():
+    cache = FxRatesCache(2)
+    cache.put(_key('USD', 'EUR', 1), _df(1))
+    cache.put(_key('USD', 'EUR', 2), _df(2))
+    assert cache.get(_key('USD', 'EUR', 1)) is not None
+    cache.put(_key('USD', 'EUR', 3), _df(3))
+    assert len(cache) == 2
+    assert cache.get(_key('USD', 'EUR', 2)) is None
+    assert cache.get(_key('USD', 'EUR', 1)) is not None
+    assert cache.get(_key('USD', 'EUR', 3)) is not None
+
+
+def test_that_only_entries_of_invalidated_pair_will_be_removed():
+    cache = FxRatesCache(10)
+    cache.put(_key('USD', 'EUR', 1), _df(1))
+    cache.put(_key('USD', 'EUR', 2), _df(2))
+    cache.put(_key('USD', 'RUB', 1), _df(3))
+    cache.put(_key('EUR', 'USD', 1), _df(4))
+    cache.invalidate_pair('USD', 'EUR')
+    assert len(cache) == 2
+    assert cache.get(_key('USD', 'RUB', 1)) is not None
+    assert cache.get(_key('EUR', 'USD', 1)) is not None
+
+
+def test_that_range_read_before_invalidation_will_not_be_cached():
+    cache = FxRatesCache(10)
+    generation = cache.generation('USD', 'EUR')
+    other_generation = cache.generation('USD', 'RUB')
+    cache.invalidate_pair('USD', 'EUR')
+
+    cache.put(_key('USD', 'EUR', 1), _df(1), generation)
+    cache.put(_key('USD', 'RUB', 1), _df(2), other_generation)
+
+    assert cache.get(_key('USD', 'EUR', 1)) is None
+    assert cache.get(_key('USD', 'RUB', 1)) is not None
+    cache.put(_key('USD', 'EUR', 1), _df(1), cache.generation('USD', 'EUR'))
+    assert cache.get(_key('USD', 'EUR', 1)) is not None
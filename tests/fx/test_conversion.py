@@ -0,0 +1,53 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from src.fx.conversion import convert_to_base, CONVERSION_SCHEMA
+from src.fx.source.abstract_source import SCHEMA, DECIMAL_MONEY_TYPE
+from tests import util
+
+
+def _rates() -> pl.LazyFrame:
+    return util.cast_rate(pl.LazyFrame([
+        [date(2025, 4, 9), 'EUR', 'USD', Decimal('1.1')],
+        [date(2025, 4, 10), 'EUR', 'USD', Decimal('1.2')],
+        [date(2025, 4, 9), 'USD', 'RUB', Decimal('80')],
+    ], schema=SCHEMA, orient='row'))
+
+
+def test_that_amounts_will_be_converted_in_input_order():
+    amounts = pl.LazyFrame({
+        'amount': [Decimal('10'), Decimal('4'), Decimal('10'), Decimal('2')],
+        'currencyCode': ['EUR', 'rub', 'EUR', 'USD'],
+        'date': [date(2025, 4, 10), date(2025, 4, 9), date(2025, 4, 9), date(2025, 4, 9)]
+    }, schema=CONVERSION_SCHEMA)
+    actual = convert_to_base(amounts, _rates(), 'USD').select('currencyCode', 'convertedAmount').collect()
+    expected = pl.DataFrame({
+        'currencyCode': ['EUR', 'RUB', 'EUR', 'USD'],
+        'convertedAmount': [Decimal('12'), Decimal('0.05'), Decimal('11'), Decimal('2')]
+    }, schema={'currencyCode': pl.String, 'convertedAmount': DECIMAL_MONEY_TYPE})
+    assert_frame_equal(actual, expected)
+
+
+def test_that_amount_without_rate_will_be_converted_to_null():
+    amounts = pl.LazyFrame({
+        'amount': [Decimal('10')],
+        'currencyCode': ['THB'],
+        'date': [date(2025, 4, 9)]
+    }, schema=CONVERSION_SCHEMA)
+    actual = convert_to_base(amounts, _rates(), 'USD').collect()
+    assert actual.height == 1
+    assert actual.get_column('convertedAmount').is_null().all()
+
+
+def test_that_as_of_conversion_will_use_last_known_rate():
+    amounts = pl.LazyFrame({
+        'amount': [Decimal('10'), Decimal('4'), Decimal('10')],
+        'currencyCode': ['EUR', 'RUB', 'EUR'],
+        'date': [date(2025, 4, 13), date(2025, 4, 12), date(2025, 4, 8)]
+    }, schema=CONVERSION_SCHEMA)
+    actual = convert_to_base(amounts, _rates(), 'USD', as_of=True).collect()
+    assert actual.get_column('convertedAmount').to_list() == [Decimal('12'), Decimal('0.05'), None]
+    assert actual.get_column('date').to_list() == [date(2025, 4, 13), date(2025, 4, 12), date(2025, 4, 8)]
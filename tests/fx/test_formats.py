@@ -0,0 +1,55 @@
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.fx import formats
+from src.fx.formats import negotiate_media_type, frame_response, ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+def _rates(days: int) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame([[date(2025, 1, 1) + timedelta(days=i), 'USD', 'EUR', Decimal('0.9')]
+                                        for i in range(days)], schema=SCHEMA, orient='row'))
+
+
+async def _read_body(response) -> bytes:
+    return b''.join([chunk async for chunk in response.body_iterator])
+
+
+def test_that_json_will_be_default_media_type():
+    assert negotiate_media_type(None) is None
+    assert negotiate_media_type('application/json, */*') is None
+    assert negotiate_media_type('application/json;q=0.5, application/vnd.apache.arrow.stream') == \
+           ARROW_STREAM_MEDIA_TYPE
+    assert negotiate_media_type('Application/Vnd.Apache.Parquet; q=0.9') == PARQUET_MEDIA_TYPE
+
+
+def test_that_media_type_will_be_chosen_by_quality():
+    assert negotiate_media_type('application/json, application/vnd.apache.arrow.stream;q=0.1') is None
+    assert negotiate_media_type('application/vnd.apache.arrow.stream;q=0') is None
+    assert negotiate_media_type('*/*, application/vnd.apache.arrow.stream') is None
+    assert negotiate_media_type('application/vnd.apache.arrow.stream;q=0.5, application/vnd.apache.parquet;q=0.8, '
+                                '*/*;q=0.1') == PARQUET_MEDIA_TYPE
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_arrow_stream_will_be_sent_by_record_batches(monkeypatch):
+    monkeypatch.setattr(formats, 'BATCH_ROWS', 10)
+    df = _rates(35)
+    response = frame_response(df, ARROW_STREAM_MEDIA_TYPE)
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert len(chunks) > 4
+    assert_frame_equal(pl.read_ipc_stream(io.BytesIO(b''.join(chunks))), df)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_parquet_body_will_be_read_back_as_the_same_frame():
+    df = _rates(3)
+    assert_frame_equal(pl.read_parquet(io.BytesIO(await _read_body(frame_response(df, PARQUET_MEDIA_TYPE)))), df)
+    empty = await _read_body(frame_response(df.clear(), ARROW_STREAM_MEDIA_TYPE))
+    assert pl.read_ipc_stream(io.BytesIO(empty)).schema == df.schema
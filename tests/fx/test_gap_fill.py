@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.config import DatabaseConfig, GapFillConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.gap_fill import FxFilledRateRefresher, FxFilledRateRepository, fill_gaps, lookback_start
+from src.fx.models import FxTrackingPair
+from src.fx.repository import FxTrackingPairRepository
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+_CONFIG = GapFillConfig(fiat_max_staleness_days=3, crypto_max_staleness_days=1)
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+def test_that_weekend_will_be_filled_with_friday_rate():
+    rates = _rates([
+        [date(2025, 3, 7), 'USD', 'EUR', Decimal('0.92')],
+        [date(2025, 3, 10), 'USD', 'EUR', Decimal('0.93')],
+    ])
+
+    df = fill_gaps(rates.lazy(), date(2025, 3, 7), date(2025, 3, 10), _CONFIG).collect()
+
+    assert df.select('date', 'rate', 'filled').rows() == [
+        (date(2025, 3, 7), Decimal('0.92'), False),
+        (date(2025, 3, 8), Decimal('0.92'), True),
+        (date(2025, 3, 9), Decimal('0.92'), True),
+        (date(2025, 3, 10), Decimal('0.93'), False)]
+
+
+def test_that_first_days_will_be_filled_from_lookback():
+    rates = _rates([[date(2025, 3, 7), 'USD', 'EUR', Decimal('0.92')]])
+
+    assert lookback_start(date(2025, 3, 9), _CONFIG) == date(2025, 3, 6)
+    df = fill_gaps(rates.lazy(), date(2025, 3, 9), date(2025, 3, 9), _CONFIG).collect()
+
+    assert df.select('date', 'rate', 'filled').rows() == [(date(2025, 3, 9), Decimal('0.92'), True)]
+
+
+def test_that_stale_days_will_stay_missing_with_crypto_pairs_limited_stricter():
+    rates = _rates([
+        [date(2025, 3, 1), 'USD', 'EUR', Decimal('0.92')],
+        [date(2025, 3, 1), 'BTC', 'USD', Decimal('85000')],
+    ])
+
+    df = fill_gaps(rates.lazy(), date(2025, 3, 1), date(2025, 3, 6), _CONFIG).collect()
+
+    assert df.group_by('currencyCodeFrom').agg(pl.col('date').max()).sort('currencyCodeFrom').rows() == [
+        ('BTC', date(2025, 3, 2)),
+        ('USD', date(2025, 3, 4))]
+
+
+def test_that_gap_filling_stays_lazy():
+    rates = _rates([[date(2025, 3, 7), 'USD', 'EUR', Decimal('0.92')]])
+
+    assert isinstance(fill_gaps(rates.lazy(), date(2025, 3, 7), date(2025, 3, 9), _CONFIG), pl.LazyFrame)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_persisted_filled_series_will_follow_written_rates(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    async with session_factory.begin() as session:
+        session.add(FxTrackingPair(currency_code_from='USD', currency_code_to='GEL',
+                                   sources_config={'sources': ['polygon_fiat']}, last_sync_date=datetime(2025, 4, 1),
+                                   last_sync_status='OK', last_rate_date=datetime(2025, 3, 7)))
+    tracking_pair_repository = FxTrackingPairRepository(session_factory,
+                                                        refreshers=[FxFilledRateRefresher(_CONFIG)])
+    await tracking_pair_repository.save_backfill_result('USD', 'GEL', _rates([
+        [date(2025, 3, 7), 'USD', 'GEL', Decimal('2.77')],
+    ]), None)
+    await tracking_pair_repository.save_backfill_result('USD', 'GEL', _rates([
+        [date(2025, 3, 9), 'USD', 'GEL', Decimal('2.78')],
+    ]), None)
+    df = await FxFilledRateRepository(session_factory).get_rates('USD', 'GEL', date(2025, 3, 7), date(2025, 3, 31))
+    await engine.dispose()
+    assert df.select('date', 'rate', 'filled').rows() == [
+        (date(2025, 3, 7), Decimal('2.77'), False),
+        (date(2025, 3, 8), Decimal('2.77'), True),
+        (date(2025, 3, 9), Decimal('2.78'), False),
+        (date(2025, 3, 10), Decimal('2.78'), True),
+        (date(2025, 3, 11), Decimal('2.78'), True),
+        (date(2025, 3, 12), Decimal('2.78'), True)]
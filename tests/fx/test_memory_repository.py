@@ -0,0 +1,45 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.memory_repository import InMemoryFxRateRepository
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_saved_rates_will_be_upserted():
+    repository = InMemoryFxRateRepository()
+    await repository.save_rates(_rates([[date(2024, 1, 1), 'USD', 'EUR', Decimal('0.9')],
+                                        [date(2024, 1, 2), 'USD', 'EUR', Decimal('0.91')]]))
+
+    result = await repository.save_rates(_rates([[date(2024, 1, 1), 'USD', 'EUR', Decimal('0.9')],
+                                                 [date(2024, 1, 2), 'USD', 'EUR', Decimal('0.92')],
+                                                 [date(2024, 1, 3), 'USD', 'EUR', Decimal('0.93')]]))
+
+    assert (result.inserted, result.updated) == (1, 1)
+    assert result.changed.sort('date').equals(_rates([[date(2024, 1, 2), 'USD', 'EUR', Decimal('0.92')],
+                                                      [date(2024, 1, 3), 'USD', 'EUR', Decimal('0.93')]]))
+    assert (await repository.get_rates('USD', 'EUR', date(2024, 1, 2), date(2024, 1, 3))).equals(
+        _rates([[date(2024, 1, 2), 'USD', 'EUR', Decimal('0.92')],
+                [date(2024, 1, 3), 'USD', 'EUR', Decimal('0.93')]]))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_latest_rate_will_be_taken_on_or_before_date():
+    repository = InMemoryFxRateRepository()
+    await repository.save_rates(_rates([[date(2024, 1, 1), 'USD', 'EUR', Decimal('0.9')],
+                                        [date(2024, 1, 5), 'USD', 'EUR', Decimal('0.91')],
+                                        [date(2024, 1, 6), 'EUR', 'RUB', Decimal('100')]]))
+
+    assert (await repository.get_latest_rate('USD', 'EUR', date(2024, 1, 4))).get_column('date').to_list() == \
+           [date(2024, 1, 1)]
+    assert (await repository.get_latest_rate('USD', 'EUR')).get_column('date').to_list() == [date(2024, 1, 5)]
+    against = await repository.get_rates_against(['USD', 'RUB'], 'EUR', date(2024, 1, 1), date(2024, 1, 31))
+    assert against.height == 3
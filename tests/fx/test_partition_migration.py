@@ -0,0 +1,65 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, make_url, text
+
+from src.config import DatabaseConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.partition_migration import PartitionMigrationError, copy_rates, swap_tables
+from src.fx.repository import FxRateRepository
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+@pytest.fixture(scope="module")
+def legacy_url(pg_url):
+    """
+    Separate database migrated by alembic up to the revision before partitioning
+    """
+    engine = create_engine(pg_url, isolation_level='AUTOCOMMIT')
+    with engine.connect() as connection:
+        connection.execute(text('CREATE DATABASE partition_migration'))
+    engine.dispose()
+    url = make_url(pg_url).set(database='partition_migration').render_as_string(hide_password=False)
+    command.upgrade(_alembic_config(url), '4c7d2a9e61f3')
+    return url
+
+
+def _alembic_config(url: str) -> Config:
+    config = Config('alembic.ini')
+    config.set_main_option('sqlalchemy.url', url)
+    return config
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_rates_will_be_moved_into_partitioned_table_online(legacy_url):
+    engine = create_engine(legacy_url)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO fx_rates VALUES ('2023-05-02', 'USD', 'EUR', 0.91), "
+                                "('2024-05-02', 'USD', 'EUR', 0.92), ('2024-05-03', 'USD', 'EUR', 0.93)"))
+    engine.dispose()
+    command.upgrade(_alembic_config(legacy_url), 'head')
+
+    async_engine = create_db_engine(DatabaseConfig(legacy_url))
+    session_factory = create_session_factory(async_engine)
+    repository = FxRateRepository(session_factory)
+    # Written during the migration, so it's mirrored by the trigger
+    await repository.save_rates(util.cast_rate(pl.DataFrame([
+        [date(2024, 5, 3), 'USD', 'EUR', Decimal('0.94')],
+    ], schema=SCHEMA, orient='row')))
+    with pytest.raises(PartitionMigrationError):
+        await swap_tables(session_factory)
+    copied = await copy_rates(session_factory, batch_days=200)
+    await swap_tables(session_factory)
+    rates = await repository.get_rates('USD', 'EUR', date(2023, 1, 1), date(2024, 12, 31))
+    async with session_factory() as session:
+        partitioned = (await session.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'fx_rates'::regclass)"))).scalar()
+    await async_engine.dispose()
+    assert copied == 2
+    assert partitioned
+    assert rates.get_column('rate').to_list() == [Decimal('0.91'), Decimal('0.92'), Decimal('0.94')]
@@ -0,0 +1,129 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.questdb import IlpHttpWriter, IlpWriteError, QuestDbFxRateRepository, daily_rates_query, to_ilp_lines
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+class _Response:
+    def __init__(self, status: int):
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self) -> str:
+        return 'error'
+
+
+class _ClientSession:
+    def __init__(self, status: int = 204):
+        self.status = status
+        self.bodies = []
+
+    def post(self, url, data, params):
+        self.bodies.append((url, data.decode(), params))
+        return _Response(self.status)
+
+
+class _Connection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.rows
+
+
+class _Pool:
+    def __init__(self, rows):
+        self.connection = _Connection(rows)
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+def test_that_rates_will_be_encoded_as_ilp_lines_with_positional_rates():
+    lines = to_ilp_lines(_rates([[date(2024, 1, 2), 'USD', 'BTC', Decimal('0.0000001')]]))
+
+    assert lines == ['fx_rates,currency_code_from=USD,currency_code_to=BTC rate="0.0000001000" 1704153600000000000']
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_writer_will_send_lines_in_batches():
+    client_session = _ClientSession()
+
+    await IlpHttpWriter(client_session, 'http://questdb:9000/', batch_rows=2).write(['a', 'b', 'c'])
+
+    assert client_session.bodies == [('http://questdb:9000/write', 'a\nb\n', {'precision': 'n'}),
+                                     ('http://questdb:9000/write', 'c\n', {'precision': 'n'})]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_rejected_batch_will_raise_error():
+    with pytest.raises(IlpWriteError):
+        await IlpHttpWriter(_ClientSession(status=400), 'http://questdb:9000', batch_rows=2).write(['a'])
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_duplicated_rates_will_be_written_once():
+    client_session = _ClientSession()
+    repository = QuestDbFxRateRepository(_Pool([]), IlpHttpWriter(client_session, 'http://questdb:9000', 10))
+
+    result = await repository.save_rates(_rates([[date(2024, 1, 2), 'USD', 'EUR', Decimal('0.9')],
+                                                 [date(2024, 1, 2), 'USD', 'EUR', Decimal('0.91')]]))
+
+    assert result.inserted == 1
+    assert client_session.bodies[0][1] == \
+           'fx_rates,currency_code_from=USD,currency_code_to=EUR rate="0.9100000000" 1704153600000000000\n'
+
+
+def test_that_daily_rates_query_will_match_pairs_and_clamp_dates():
+    sql, args = daily_rates_query([('USD', 'EUR'), ('EUR', 'USD')], date.min, date(2024, 1, 2))
+
+    assert '((currency_code_from = $1 AND currency_code_to = $2) OR ' \
+           '(currency_code_from = $3 AND currency_code_to = $4)) AND ts >= $5 AND ts < $6' in sql
+    assert 'SAMPLE BY 1d ALIGN TO CALENDAR' in sql
+    assert args == ['USD', 'EUR', 'EUR', 'USD', datetime(1970, 1, 1), datetime(2024, 1, 3)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_rates_will_be_read_as_money_exactly():
+    pool = _Pool([(datetime(2024, 1, 2), 'USD', 'EUR', '1234567.0123456789')])
+    repository = QuestDbFxRateRepository(pool, IlpHttpWriter(_ClientSession(), 'http://questdb:9000', 10))
+
+    df = await repository.get_latest_rate('USD', 'EUR', date(2024, 1, 5))
+
+    assert df.equals(_rates([[date(2024, 1, 2), 'USD', 'EUR', Decimal('1234567.0123456789')]]))
+    sql, args = pool.connection.queries[0]
+    assert 'LATEST ON ts PARTITION BY' in sql
+    assert args == ('USD', 'EUR', datetime(2024, 1, 6))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_no_pairs_will_not_be_queried():
+    pool = _Pool([])
+    repository = QuestDbFxRateRepository(pool, IlpHttpWriter(_ClientSession(), 'http://questdb:9000', 10))
+
+    df = await repository.get_rates_for_pairs([], date(2024, 1, 1), date(2024, 1, 5))
+
+    assert df.is_empty()
+    assert pool.connection.queries == []
@@ -0,0 +1,50 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+
+from src.fx.rate_store import FxRateStore
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+def _store() -> FxRateStore:
+    store = FxRateStore()
+    store.load(_rates([
+        [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.91')],
+        [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+        [date(2025, 4, 9), 'USD', 'RUB', Decimal('80')],
+    ]))
+    return store
+
+
+def test_that_last_known_rate_will_be_returned_for_date_without_rate():
+    store = _store()
+    assert store.get_rate_as_of('USD', 'EUR', date(2025, 4, 10)).get_column('rate').to_list() == [Decimal('0.9')]
+    assert store.get_rate_as_of('USD', 'EUR', date(2025, 4, 13)).get_column('rate').to_list() == [Decimal('0.91')]
+    assert store.get_rate_as_of('USD', 'EUR', date(2025, 4, 8)).is_empty()
+    assert store.get_rate_as_of('USD', 'THB', date(2025, 4, 10)).is_empty()
+
+
+def test_that_range_will_be_sliced_from_sorted_partition():
+    store = _store()
+    actual = store.get_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 10))
+    assert actual.get_column('date').to_list() == [date(2025, 4, 9)]
+    assert store.get_rates('USD', 'EUR', date(2025, 4, 12), date(2025, 4, 20)).is_empty()
+
+
+def test_that_written_rates_will_replace_rates_of_same_dates():
+    store = _store()
+    store.upsert(_rates([
+        [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.95')],
+        [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.92')],
+        [date(2025, 4, 10), 'USD', 'THB', Decimal('34')],
+    ]))
+    actual = store.get_rates('USD', 'EUR', date(2025, 4, 1), date(2025, 4, 30))
+    assert actual.get_column('rate').to_list() == [Decimal('0.9'), Decimal('0.95'), Decimal('0.92')]
+    assert store.get_rate_as_of('USD', 'THB', date(2025, 4, 12)).height == 1
+    assert len(store) == 5
@@ -0,0 +1,78 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+import pytest
+from sqlalchemy import text
+
+from src.config import DatabaseConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.models import FxTrackingPair
+from src.fx.repository import FxRateRepository, FxTrackingPairRepository, rows_to_df
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_range_and_latest_rates_will_be_read(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    repository = FxRateRepository(create_session_factory(engine))
+    await repository.save_rates(util.cast_rate(pl.DataFrame([
+        [date(2025, 4, 9), 'USD', 'THB', Decimal('33')],
+        [date(2025, 4, 10), 'USD', 'THB', Decimal('34')],
+        [date(2025, 4, 14), 'USD', 'THB', Decimal('35')],
+    ], schema=SCHEMA, orient='row')))
+    in_range = await repository.get_rates('USD', 'THB', date(2025, 4, 10), date(2025, 4, 14))
+    latest = await repository.get_latest_rate('USD', 'THB')
+    as_of = await repository.get_latest_rate('USD', 'THB', date(2025, 4, 12))
+    all_rates = await repository.get_all_rates()
+    await engine.dispose()
+    assert in_range.get_column('date').to_list() == [date(2025, 4, 10), date(2025, 4, 14)]
+    assert latest.get_column('rate').to_list() == [Decimal('35')]
+    assert as_of.get_column('date').to_list() == [date(2025, 4, 10)]
+    assert all_rates.filter(pl.col('currencyCodeTo') == 'THB').height == 3
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_backfill_result_moves_checkpoint_with_rates(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    async with session_factory.begin() as session:
+        session.add(FxTrackingPair(currency_code_from='USD', currency_code_to='AED',
+                                   sources_config={'sources': ['polygon_fiat']}, last_sync_date=datetime(2025, 4, 1),
+                                   last_sync_status='OK', last_rate_date=datetime(2025, 4, 1)))
+    repository = FxTrackingPairRepository(session_factory)
+    result = await repository.save_backfill_result('USD', 'AED', util.cast_rate(pl.DataFrame([
+        [date(2020, 1, 1), 'USD', 'AED', Decimal('3.67')],
+        [date(2020, 1, 2), 'USD', 'AED', Decimal('3.68')],
+    ], schema=SCHEMA, orient='row')), (date(2020, 1, 1), date(2020, 1, 10)))
+    await repository.save_backfill_result('USD', 'AED', rows_to_df([]), (date(2019, 1, 1), date(2019, 12, 31)))
+    merged = next(p for p in await repository.get_all() if p.currency_code_to == 'AED')
+    await repository.save_backfill_result('USD', 'AED', rows_to_df([]), (date(2010, 1, 1), date(2010, 12, 31)))
+    tracking_pair = next(p for p in await repository.get_all() if p.currency_code_to == 'AED')
+    await engine.dispose()
+    assert result.inserted == 2
+    assert (merged.backfilled_from, merged.backfilled_to) == (datetime(2019, 1, 1), datetime(2020, 1, 10))
+    assert (tracking_pair.backfilled_from, tracking_pair.backfilled_to) == (datetime(2010, 1, 1),
+                                                                            datetime(2010, 12, 31))
+    assert tracking_pair.last_rate_date == datetime(2025, 4, 1)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_rates_will_be_written_into_yearly_partitions(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    repository = FxRateRepository(session_factory)
+    await repository.save_rates(util.cast_rate(pl.DataFrame([
+        [date(2019, 12, 31), 'EUR', 'GEL', Decimal('3.21')],
+        [date(2021, 1, 4), 'EUR', 'GEL', Decimal('4.02')],
+    ], schema=SCHEMA, orient='row')))
+    async with session_factory() as session:
+        partitions = (await session.execute(text(
+            "SELECT tableoid::regclass::text FROM fx_rates WHERE currency_code_to = 'GEL' ORDER BY date"))).scalars()
+        partitions = list(partitions)
+    pairs = await repository.get_pairs()
+    await engine.dispose()
+    assert partitions == ['fx_rates_y2019', 'fx_rates_y2021']
+    assert ('EUR', 'GEL') in pairs
+    assert len(pairs) == len(set(pairs))
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from src.fx.models import FxTrackingPair
+from src.fx.scraper import FxScraper, resolve_source
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, create_empty_df
+from src.fx.source.failover import FailoverExchangeRatesSource
+from src.fx.sync import SyncResult, SYNC_STATUS_OK, SYNC_STATUS_FAILED
+
+
+class _Source(AbstractExchangeRatesSource):
+    def __init__(self, supported_pairs):
+        super().__init__(supported_pairs)
+
+    async def get_exchange_rates(self, from_currency_code, to_currency_code, from_date, to_date):
+        return create_empty_df()
+
+
+class _TrackingPairRepository:
+    def __init__(self, tracking_pairs):
+        self.tracking_pairs = tracking_pairs
+
+    async def get_all(self):
+        return self.tracking_pairs
+
+
+class _SlowSynchronizer:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def sync_pair(self, source, tracking_pair, today=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SyncResult(tracking_pair.currency_code_from, tracking_pair.currency_code_to, SYNC_STATUS_OK, 1)
+
+
+def _tracking_pair(curr_from: str, curr_to: str, sources) -> FxTrackingPair:
+    return FxTrackingPair(currency_code_from=curr_from,
+                          currency_code_to=curr_to,
+                          sources_config={'sources': sources},
+                          last_rate_date=datetime(2025, 4, 1))
+
+
+def test_that_first_source_supporting_pair_will_be_resolved():
+    fiat = _Source({'usd': {'eur'}})
+    crypto = _Source({'btc': {'usd'}})
+    sources = {'crypto': crypto, 'fiat': fiat}
+    assert resolve_source(sources, _tracking_pair('USD', 'EUR', ['crypto', 'fiat'])) is fiat
+    assert resolve_source(sources, _tracking_pair('USD', 'EUR', ['unknown', 'crypto'])) is None
+
+
+def test_that_several_sources_supporting_pair_will_be_chained():
+    primary = _Source({'usd': {'eur'}})
+    secondary = _Source({'usd': {'eur', 'rub'}})
+    sources = {'primary': primary, 'secondary': secondary}
+    assert isinstance(resolve_source(sources, _tracking_pair('USD', 'EUR', ['primary', 'secondary'])),
+                      FailoverExchangeRatesSource)
+    assert resolve_source(sources, _tracking_pair('USD', 'RUB', ['primary', 'secondary'])) is secondary
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_pairs_will_be_synced_with_bounded_concurrency():
+    sources = {'fiat': _Source({'usd': {'eur', 'rub', 'thb'}})}
+    tracking_pairs = [_tracking_pair('USD', code, ['fiat']) for code in ['EUR', 'RUB', 'THB']]
+    tracking_pairs.append(_tracking_pair('EUR', 'RUB', ['fiat']))
+    synchronizer = _SlowSynchronizer()
+    scraper = FxScraper(sources, _TrackingPairRepository(tracking_pairs), synchronizer, 2)
+    results = await scraper.run_once(date(2025, 4, 10))
+    assert synchronizer.max_in_flight == 2
+    assert [r.status for r in results] == [SYNC_STATUS_OK, SYNC_STATUS_OK, SYNC_STATUS_OK, SYNC_STATUS_FAILED]
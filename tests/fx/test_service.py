@@ -0,0 +1,162 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.fx.cache import FxRatesCache
+from src.fx.conversion import CONVERSION_SCHEMA
+from src.fx.rate_store import FxRateStore
+from src.fx.service import FxRatesService
+from src.fx.triangulation import TriangulationEngine, CurrencyGraph
+from src.fx.source.abstract_source import SCHEMA
+from tests import util
+
+
+class _CountingRepository:
+    def __init__(self, df: pl.DataFrame):
+        self.df = df
+        self.calls = 0
+        self.from_dates = []
+
+    async def get_rates(self, currency_code_from, currency_code_to, from_date, to_date):
+        self.calls += 1
+        return self.df.filter(pl.col('currencyCodeFrom') == currency_code_from,
+                              pl.col('currencyCodeTo') == currency_code_to,
+                              pl.col('date').is_between(from_date, to_date))
+
+    async def get_all_rates(self):
+        self.calls += 1
+        return self.df
+
+    async def get_latest_rate(self, currency_code_from, currency_code_to, on_date):
+        self.calls += 1
+        return (self.df.filter(pl.col('currencyCodeFrom') == currency_code_from,
+                               pl.col('currencyCodeTo') == currency_code_to,
+                               pl.col('date') <= on_date)
+                .sort('date')
+                .tail(1))
+
+    async def get_rates_against(self, currency_codes, base_currency_code, from_date, to_date):
+        self.calls += 1
+        self.from_dates.append(from_date)
+        return self.df.filter(pl.col('currencyCodeFrom').is_in(currency_codes)
+                              | pl.col('currencyCodeTo').is_in(currency_codes),
+                              pl.col('date').is_between(from_date, to_date))
+
+    async def get_rates_for_pairs(self, pairs, from_date, to_date):
+        self.calls += 1
+        return self.df.filter(pl.concat_str('currencyCodeFrom', 'currencyCodeTo').is_in([f + t for f, t in pairs]),
+                              pl.col('date').is_between(from_date, to_date))
+
+
+def _rates() -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame([
+        [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+        [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.91')],
+    ], schema=SCHEMA, orient='row'))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_repeated_range_query_will_be_served_from_cache():
+    repository = _CountingRepository(_rates())
+    service = FxRatesService(repository, FxRatesCache(10))
+    first = await service.get_rates('usd', 'eur', date(2025, 4, 9), date(2025, 4, 10))
+    second = await service.get_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 10))
+    assert repository.calls == 1
+    assert first.height == 2
+    assert second is first
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_written_pair_will_be_reloaded_from_repository():
+    repository = _CountingRepository(_rates())
+    service = FxRatesService(repository, FxRatesCache(10))
+    await service.get_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 10))
+    service.on_rates_written([('USD', 'EUR')])
+    await service.get_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 10))
+    assert repository.calls == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_missing_rate_will_be_returned_as_none():
+    service = FxRatesService(_CountingRepository(_rates()), FxRatesCache(10))
+    assert await service.get_rate('USD', 'EUR', date(2025, 4, 11)) is None
+    assert (await service.get_rate('USD', 'EUR', date(2025, 4, 10))).height == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_missing_pair_will_be_triangulated_from_stored_rates():
+    repository = _CountingRepository(_rates())
+    triangulation = TriangulationEngine(CurrencyGraph([('USD', 'EUR')]))
+    service = FxRatesService(repository, FxRatesCache(10), triangulation)
+    df = await service.get_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 10))
+    assert df.get_column('rate').to_list() == [Decimal('1.1111111111'), Decimal('1.0989010989')]
+    service.on_rates_written([('USD', 'EUR')])
+    await service.get_rates('EUR', 'USD', date(2025, 4, 9), date(2025, 4, 10))
+    assert repository.calls == 4
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_as_of_rate_will_be_served_from_rate_store_once_it_is_loaded():
+    repository = _CountingRepository(_rates())
+    service = FxRatesService(repository, FxRatesCache(10), rate_store=FxRateStore())
+    assert (await service.get_rate_as_of('usd', 'eur', date(2025, 4, 13))).get_column('rate').to_list() == \
+           [Decimal('0.91')]
+    await service.load_rate_store()
+    calls = repository.calls
+    assert (await service.get_rate_as_of('usd', 'eur', date(2025, 4, 13))).get_column('rate').to_list() == \
+           [Decimal('0.91')]
+    assert await service.get_rate_as_of('USD', 'EUR', date(2025, 4, 8)) is None
+    assert repository.calls == calls
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_written_rates_will_be_merged_into_rate_store():
+    repository = _CountingRepository(_rates())
+    service = FxRatesService(repository, FxRatesCache(10), rate_store=FxRateStore())
+    await service.load_rate_store()
+    service.on_rates_written([('USD', 'EUR')], util.cast_rate(pl.DataFrame([
+        [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.93')],
+    ], schema=SCHEMA, orient='row')))
+    assert (await service.get_rate_as_of('USD', 'EUR', date(2025, 4, 12))).get_column('rate').to_list() == \
+           [Decimal('0.93')]
+    service.on_rates_written([('USD', 'EUR')])
+    await service.get_rate_as_of('USD', 'EUR', date(2025, 4, 12))
+    assert repository.calls == 2
+
+
+class _PersistedFilledRates:
+    def __init__(self, df: pl.DataFrame):
+        self.df = df
+
+    async def get_rates(self, currency_code_from, currency_code_to, from_date, to_date):
+        return self.df.filter(pl.col('date').is_between(from_date, to_date))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_filled_rates_will_be_filled_on_the_fly_unless_persisted_series_has_every_day():
+    persisted = _rates().head(1).with_columns(filled=pl.lit(False))
+    service = FxRatesService(_CountingRepository(_rates()), FxRatesCache(10),
+                             filled_rate_repository=_PersistedFilledRates(persisted))
+
+    assert (await service.get_filled_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 9))).equals(persisted)
+    df = await service.get_filled_rates('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 11))
+
+    assert df.select('date', 'rate', 'filled').rows() == [
+        (date(2025, 4, 9), Decimal('0.9'), False),
+        (date(2025, 4, 10), Decimal('0.91'), False),
+        (date(2025, 4, 11), Decimal('0.91'), True)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_as_of_conversion_will_not_read_history_before_batch():
+    repository = _CountingRepository(_rates())
+    service = FxRatesService(repository, FxRatesCache(10))
+    amounts = pl.DataFrame([[Decimal('10'), 'usd', date(2025, 4, 12)], [Decimal('20'), 'USD', date(2025, 4, 13)]],
+                           schema=CONVERSION_SCHEMA, orient='row')
+
+    df = await service.convert_batch(amounts, 'EUR', as_of=True)
+
+    assert repository.from_dates == [date(2025, 4, 12)]
+    assert df.get_column('rate').to_list() == [Decimal('0.91'), Decimal('0.91')]
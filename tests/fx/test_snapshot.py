@@ -0,0 +1,110 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.fx.repository import FxTrackingPairRepository
+from src.fx.snapshot import export_snapshot, import_snapshot, pair_path, ParquetFxRateRepository, scan_snapshot
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.writer import UpsertResult
+from tests import util
+
+
+def _rates() -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame([
+        [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+        [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.91')],
+        [date(2025, 4, 9), 'USD', 'THB', Decimal('33')],
+    ], schema=SCHEMA, orient='row'))
+
+
+class _InMemoryRepository:
+    def __init__(self, df: pl.DataFrame):
+        self.df = df
+        self.saved = []
+
+    async def get_pairs(self):
+        return [('USD', 'EUR'), ('USD', 'THB')]
+
+    async def get_rates(self, currency_code_from, currency_code_to, from_date, to_date):
+        return self.df.filter(pl.col('currencyCodeFrom') == currency_code_from,
+                              pl.col('currencyCodeTo') == currency_code_to,
+                              pl.col('date').is_between(from_date, to_date))
+
+    async def save_rates(self, rates):
+        self.saved.append(rates)
+        return UpsertResult(rates.height, 0)
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class _SessionFactory:
+    def begin(self):
+        return _Session()
+
+
+class _Refresher:
+    def __init__(self):
+        self.refreshed = []
+
+    async def refresh(self, session, rates):
+        self.refreshed.append(rates)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_exported_snapshot_will_be_partitioned_by_pair_and_imported_back(tmp_path):
+    directory = str(tmp_path)
+    repository = _InMemoryRepository(_rates())
+    assert await export_snapshot(repository, directory) == 3
+    assert os.path.exists(pair_path(directory, 'USD', 'THB'))
+
+    refresher = _Refresher()
+    result = await import_snapshot(FxTrackingPairRepository(_SessionFactory(), repository, [refresher]), directory)
+
+    assert result == UpsertResult(3, 0)
+    assert_frame_equal(pl.concat(repository.saved), _rates(), check_row_order=False)
+    assert_frame_equal(pl.concat(refresher.refreshed), _rates(), check_row_order=False)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_export_will_be_filtered_by_pair_and_dates(tmp_path):
+    directory = str(tmp_path)
+    written = await export_snapshot(_InMemoryRepository(_rates()), directory, [('USD', 'EUR')],
+                                    date(2025, 4, 10), date(2025, 4, 30))
+    assert written == 1
+    assert scan_snapshot(directory).collect().get_column('rate').to_list() == [Decimal('0.91')]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_filtered_export_will_keep_exported_rates_out_of_its_dates(tmp_path):
+    directory = str(tmp_path)
+    await export_snapshot(_InMemoryRepository(_rates()), directory, [('USD', 'EUR')])
+    changed = _rates().with_columns(pl.col('rate') * 2)
+
+    await export_snapshot(_InMemoryRepository(changed), directory, [('USD', 'EUR')], date(2025, 4, 10))
+
+    assert scan_snapshot(directory).collect().get_column('rate').to_list() == [Decimal('0.9'), Decimal('1.82')]
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_reads_will_be_served_from_snapshot(tmp_path):
+    directory = str(tmp_path)
+    await export_snapshot(_InMemoryRepository(_rates()), directory)
+    repository = ParquetFxRateRepository(directory)
+
+    as_of = await repository.get_latest_rate('USD', 'EUR', date(2025, 4, 10))
+    in_range = await repository.get_rates('USD', 'EUR', date(2025, 4, 1), date(2025, 4, 30))
+    against = await repository.get_rates_against(['EUR', 'THB'], 'USD', date(2025, 4, 9), date(2025, 4, 9))
+
+    assert as_of.get_column('rate').to_list() == [Decimal('0.9')]
+    assert in_range.get_column('date').to_list() == [date(2025, 4, 9), date(2025, 4, 11)]
+    assert against.height == 2
+    assert (await repository.get_rates('USD', 'RUB', date(2025, 4, 1), date(2025, 4, 30))).is_empty()
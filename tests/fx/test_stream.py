@@ -0,0 +1,129 @@
+import asyncio
+import json
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+
+from src.config import DatabaseConfig, StreamConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.stream import FxRateBroker, FxRateNotifier, PgNotifyRelay, notification_payloads, parse_pairs, \
+    rates_from_payload, sse_events
+from tests import util
+
+
+def _rates(rows) -> pl.DataFrame:
+    return util.cast_rate(pl.DataFrame(rows, schema=SCHEMA, orient='row'))
+
+
+_RATES = _rates([
+    [date(2025, 3, 7), 'USD', 'EUR', Decimal('0.92')],
+    [date(2025, 3, 7), 'BTC', 'USD', Decimal('85000')],
+])
+
+
+def test_that_pairs_will_be_parsed_case_insensitively():
+    assert parse_pairs(['usd/eur', 'BTC/USD']) == {('USD', 'EUR'), ('BTC', 'USD')}
+    with pytest.raises(ValueError):
+        parse_pairs(['USDEUR'])
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_subscriber_will_get_rates_of_its_pairs_only():
+    broker = FxRateBroker()
+    with broker.subscribe({('USD', 'EUR')}) as subscription:
+        broker.on_rates_written([('USD', 'EUR'), ('BTC', 'USD')], _RATES)
+
+        event = json.loads(await subscription.get())
+        assert (event['currency_code_from'], event['currency_code_to'], event['rate']) == ('USD', 'EUR',
+                                                                                           '0.9200000000')
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(subscription.get(), 0.01)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_lagging_subscriber_will_be_dropped_without_holding_back_others():
+    broker = FxRateBroker(StreamConfig(queue_size=1))
+    with broker.subscribe({('USD', 'EUR')}) as slow, broker.subscribe({('USD', 'EUR')}) as fast:
+        broker.on_rates_written([('USD', 'EUR')], _RATES)
+        assert await fast.get() is not None
+        broker.on_rates_written([('USD', 'EUR')], _RATES)
+
+        assert await slow.get() is None
+        assert slow.dropped
+        assert await fast.get() is not None
+        assert not fast.dropped
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_sse_events_will_carry_rates_and_heartbeats():
+    broker = FxRateBroker(StreamConfig(heartbeat_seconds=0.01))
+    events = sse_events(broker, {('BTC', 'USD')})
+
+    assert await anext(events) == ': heartbeat\n\n'
+    broker.on_rates_written([('BTC', 'USD')], _RATES)
+    event = await anext(events)
+    await events.aclose()
+
+    assert event.startswith('event: rate\ndata: {"date":"2025-03-07","currency_code_from":"BTC"')
+
+
+def test_that_rates_will_survive_notification_payloads():
+    rates = pl.concat([_RATES] * 100)
+
+    payloads = list(notification_payloads('origin', rates))
+
+    assert len(payloads) == 4
+    assert all(len(payload.encode()) < 8000 for payload in payloads)
+    assert pl.concat([rates_from_payload(json.loads(payload)['rates']) for payload in payloads]).equals(rates)
+
+
+class _Session:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement.compile().params)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_notifier_will_notify_in_writing_transaction():
+    session = _Session()
+
+    await FxRateNotifier('fx_rates', 'origin').refresh(session, _RATES)
+
+    assert len(session.statements) == 1
+    channel, payload = session.statements[0].values()
+    assert channel == 'fx_rates'
+    assert json.loads(payload)['origin'] == 'origin'
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_rates_will_be_relayed_to_other_processes(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    received = asyncio.Queue()
+    echoed = []
+    notifier = FxRateNotifier('fx_rates_test')
+    relays = [PgNotifyRelay(pg_url, 'fx_rates_test', lambda pairs, rates: echoed.append(pairs), notifier.origin),
+              PgNotifyRelay(pg_url, 'fx_rates_test', lambda pairs, rates: received.put_nowait((pairs, rates)))]
+    tasks = [asyncio.create_task(relay.run_forever()) for relay in relays]
+    try:
+        # Relays start listening in the background, so rates are sent until they arrive
+        async def publish_until_received():
+            while received.empty():
+                async with session_factory.begin() as session:
+                    await notifier.refresh(session, _RATES)
+                await asyncio.sleep(0.2)
+        await asyncio.wait_for(publish_until_received(), 10)
+        pairs, rates = received.get_nowait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await engine.dispose()
+    assert not echoed
+    assert pairs == [('USD', 'EUR'), ('BTC', 'USD')]
+    assert rates.equals(_RATES)
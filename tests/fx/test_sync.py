@@ -0,0 +1,99 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import polars as pl
+from polars.testing import assert_frame_equal
+import pytest
+
+from src.fx.models import FxTrackingPair
+from src.fx.source.abstract_source import AbstractExchangeRatesSource, SCHEMA
+from src.fx.source.upstream import UpstreamThrottledError
+from src.fx.sync import incremental_window, SyncWindow, PairSynchronizer, SYNC_STATUS_OK, SYNC_STATUS_FAILED, \
+    SYNC_STATUS_THROTTLED
+from src.fx.writer import UpsertResult
+from tests import util
+
+
+class _StaticSource(AbstractExchangeRatesSource):
+    def __init__(self, df: pl.DataFrame = None, error: Exception = RuntimeError('Source is down')):
+        super().__init__({'usd': {'eur'}})
+        self.df = df
+        self.error = error
+        self.requested_windows = []
+
+    async def get_exchange_rates(self, from_currency_code, to_currency_code, from_date, to_date):
+        self.requested_windows.append(SyncWindow(from_date, to_date))
+        if self.df is None:
+            raise self.error
+        return self.df.lazy()
+
+
+class _InMemoryTrackingPairRepository:
+    def __init__(self, unchanged_rows: int = 0):
+        self.saved = []
+        self.unchanged_rows = unchanged_rows
+
+    async def save_sync_result(self, tracking_pair, rates, status, synced_at):
+        self.saved.append((rates.height, status))
+        changed = rates.slice(self.unchanged_rows)
+        return UpsertResult(inserted=changed.height, updated=0, changed=changed)
+
+
+def _tracking_pair(last_rate_date: datetime) -> FxTrackingPair:
+    return FxTrackingPair(currency_code_from='USD', currency_code_to='EUR', last_rate_date=last_rate_date)
+
+
+def test_that_window_will_start_from_last_rate_date():
+    window = incremental_window(_tracking_pair(datetime(2025, 4, 9)), date(2025, 4, 11))
+    assert window == SyncWindow(date(2025, 4, 9), date(2025, 4, 11))
+
+
+def test_that_window_will_be_empty_if_last_rate_date_is_in_future():
+    assert incremental_window(_tracking_pair(datetime(2025, 4, 12)), date(2025, 4, 11)) is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_fetched_rates_will_be_saved_and_listener_notified():
+    df = util.cast_rate(pl.DataFrame([[date(2025, 4, 10), 'USD', 'EUR', Decimal('0.9')]], schema=SCHEMA, orient='row'))
+    source = _StaticSource(df)
+    repository = _InMemoryTrackingPairRepository()
+    written = []
+    synchronizer = PairSynchronizer(repository, lambda pairs, rates: written.append((list(pairs), rates)))
+    result = await synchronizer.sync_pair(source, _tracking_pair(datetime(2025, 4, 9)), date(2025, 4, 11))
+    assert result.status == SYNC_STATUS_OK
+    assert result.inserted == 1
+    assert source.requested_windows == [SyncWindow(date(2025, 4, 9), date(2025, 4, 11))]
+    assert repository.saved == [(1, SYNC_STATUS_OK)]
+    assert written[0][0] == [('USD', 'EUR')]
+    assert_frame_equal(written[0][1], df)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_listener_will_get_changed_rates_only():
+    df = util.cast_rate(pl.DataFrame([[date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+                                      [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.91')]], schema=SCHEMA, orient='row'))
+    written = []
+    synchronizer = PairSynchronizer(_InMemoryTrackingPairRepository(unchanged_rows=1),
+                                    lambda pairs, rates: written.append(rates))
+    await synchronizer.sync_pair(_StaticSource(df), _tracking_pair(datetime(2025, 4, 9)), date(2025, 4, 11))
+    assert len(written) == 1
+    assert_frame_equal(written[0], df.tail(1))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_failed_fetch_will_be_recorded_without_rates():
+    repository = _InMemoryTrackingPairRepository()
+    synchronizer = PairSynchronizer(repository)
+    result = await synchronizer.sync_pair(_StaticSource(), _tracking_pair(datetime(2025, 4, 9)), date(2025, 4, 11))
+    assert result.status == SYNC_STATUS_FAILED
+    assert repository.saved == [(0, SYNC_STATUS_FAILED)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_throttling_will_be_recorded_separately_from_failure():
+    repository = _InMemoryTrackingPairRepository()
+    synchronizer = PairSynchronizer(repository)
+    source = _StaticSource(error=UpstreamThrottledError())
+    result = await synchronizer.sync_pair(source, _tracking_pair(datetime(2025, 4, 9)), date(2025, 4, 11))
+    assert result.status == SYNC_STATUS_THROTTLED
+    assert repository.saved == [(0, SYNC_STATUS_THROTTLED)]
@@ -0,0 +1,46 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.triangulation import CurrencyGraph, TriangulationEngine, Hop
+from tests import util
+
+
+def _engine(allow_inversion: bool = True) -> TriangulationEngine:
+    return TriangulationEngine(CurrencyGraph([('usd', 'eur'), ('usd', 'thb'), ('btc', 'usd')], allow_inversion))
+
+
+def test_that_shortest_path_will_use_inverted_legs():
+    assert _engine().find_path('EUR', 'THB') == [Hop('EUR', 'USD', True), Hop('USD', 'THB', False)]
+    assert _engine().find_path('btc', 'eur') == [Hop('BTC', 'USD', False), Hop('USD', 'EUR', False)]
+
+
+def test_that_path_will_not_be_found_if_inversion_is_not_allowed():
+    assert _engine(False).find_path('EUR', 'THB') is None
+
+
+def test_that_pairs_depending_on_stored_pair_will_be_returned():
+    dependent = _engine().dependent_pairs('USD', 'THB')
+    assert ('EUR', 'THB') in dependent
+    assert ('THB', 'BTC') in dependent
+    assert ('BTC', 'EUR') not in dependent
+
+
+def test_that_cross_rates_will_be_derived_for_common_dates():
+    engine = _engine()
+    rates = util.cast_rate(pl.LazyFrame([
+        [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.8')],
+        [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.5')],
+        [date(2025, 4, 9), 'USD', 'THB', Decimal('30')],
+        [date(2025, 4, 10), 'USD', 'THB', Decimal('32')],
+        [date(2025, 4, 11), 'USD', 'THB', Decimal('33')],
+    ], schema=SCHEMA, orient='row'))
+    actual = engine.derive_rates(engine.find_path('EUR', 'THB'), rates).sort('date').collect()
+    expected = pl.DataFrame([
+        [date(2025, 4, 9), 'EUR', 'THB', Decimal('37.5')],
+        [date(2025, 4, 10), 'EUR', 'THB', Decimal('64')],
+    ], schema=SCHEMA, orient='row')
+    assert_frame_equal(actual, util.cast_rate(expected))
@@ -0,0 +1,56 @@
+from datetime import date
+from decimal import Decimal
+
+import polars as pl
+import pytest
+from sqlalchemy import text
+
+from src.config import DatabaseConfig
+from src.database import create_db_engine, create_session_factory
+from src.fx.source.abstract_source import SCHEMA
+from src.fx.writer import bulk_upsert_rates, UpsertResult
+from tests import util
+
+
+def _rates(rows) -> pl.LazyFrame:
+    return util.cast_rate(pl.LazyFrame(rows, schema=SCHEMA, orient='row'))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_new_and_changed_rates_will_be_counted_separately(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    session_factory = create_session_factory(engine)
+    async with session_factory.begin() as session:
+        first = await bulk_upsert_rates(session, _rates([
+            [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+            [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.91')],
+        ]))
+    async with session_factory.begin() as session:
+        second = await bulk_upsert_rates(session, _rates([
+            [date(2025, 4, 9), 'USD', 'EUR', Decimal('0.9')],
+            [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.92')],
+            [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.93')],
+        ]))
+    async with session_factory() as session:
+        rates = (await session.execute(
+            text("SELECT rate FROM fx_rates WHERE currency_code_to = 'EUR' ORDER BY date"))).scalars().all()
+    await engine.dispose()
+    assert first == UpsertResult(inserted=2, updated=0)
+    assert second == UpsertResult(inserted=1, updated=1)
+    assert second.changed.sort('date').equals(_rates([
+        [date(2025, 4, 10), 'USD', 'EUR', Decimal('0.92')],
+        [date(2025, 4, 11), 'USD', 'EUR', Decimal('0.93')],
+    ]).collect())
+    assert rates == [Decimal('0.9'), Decimal('0.92'), Decimal('0.93')]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_duplicated_rows_of_batch_will_be_merged(pg_url):
+    engine = create_db_engine(DatabaseConfig(pg_url))
+    async with create_session_factory(engine).begin() as session:
+        result = await bulk_upsert_rates(session, _rates([
+            [date(2025, 4, 9), 'USD', 'RUB', Decimal('80')],
+            [date(2025, 4, 9), 'USD', 'RUB', Decimal('81')],
+        ]))
+    await engine.dispose()
+    assert result == UpsertResult(inserted=1, updated=0)
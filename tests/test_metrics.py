@@ -0,0 +1,27 @@
+from datetime import date
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from src.fx.cache import FxRatesCache, FxRatesCacheKey
+from src.main import app
+
+
+def _cache_misses() -> float:
+    return REGISTRY.get_sample_value('fx_cache_requests_total', {'cache': 'rates', 'result': 'miss'}) or 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_that_instrumented_lookup_will_be_exposed_on_metrics_endpoint():
+    misses = _cache_misses()
+
+    assert FxRatesCache(10).get(FxRatesCacheKey('USD', 'EUR', date(2025, 4, 9), date(2025, 4, 10))) is None
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert _cache_misses() == misses + 1
+    assert f'fx_cache_requests_total{{cache="rates",result="miss"}} {misses + 1}' in response.text
+    assert '# TYPE fx_upstream_request_duration_seconds histogram' in response.text